@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+热点查询执行计划对比 - 迁移前后各执行一次
+
+用法：
+    python examples/explain_hot_queries.py             # 只打印当前执行计划和耗时
+    python examples/explain_hot_queries.py --upgrade   # 打印迁移前计划，执行迁移后再打印一次
+"""
+
+import argparse
+import datetime
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from src.settings.config import settings
+from src.utils.db_tools import std_db
+from src.utils.migrations import MigrationRunner
+
+table_name = settings.CRAWL_TABLE_NAME
+
+# 迁移前 is_translated 为 'no'/'yes' 字符串，迁移后为 BOOLEAN
+HOT_QUERIES = {
+    "领取未翻译条目": """
+        SELECT article_id FROM {table}
+        WHERE is_translated = {untranslated}
+        AND (detail_title IS NOT NULL OR detail_title_cn IS NOT NULL)
+        AND (claimed_at IS NULL OR claimed_at < :expired_before)
+        ORDER BY update_time
+        LIMIT 50
+    """,
+    "按发布日期查询": """
+        SELECT article_id, detail_title, detail_title_cn FROM {table}
+        WHERE detail_date >= :since
+        ORDER BY detail_date DESC
+        LIMIT 100
+    """,
+    "按主键查询": """
+        SELECT 1 FROM {table} WHERE article_id = :article_id
+    """,
+}
+
+
+def _untranslated_literal(conn) -> str:
+    """根据当前字段类型选择 is_translated 的比较值"""
+    if std_db._engine.dialect.name == "postgresql":
+        schema, _, name = table_name.rpartition('.')
+        data_type = conn.execute(text("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = :name AND column_name = 'is_translated'
+            AND (:schema = '' OR table_schema = :schema)
+        """), {'name': name, 'schema': schema}).scalar()
+        return "FALSE" if data_type == "boolean" else "'no'"
+    data_type = conn.execute(text(f"SHOW COLUMNS FROM {table_name} LIKE 'is_translated'")).fetchone()[1]
+    return "FALSE" if data_type.lower().startswith("tinyint") else "'no'"
+
+
+def explain_all(title: str, repeat: int = 20):
+    """打印每个热点查询的执行计划和平均耗时"""
+    params = {
+        'expired_before': datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.TRANSLATE_CLAIM_LEASE),
+        'since': datetime.date.today() - datetime.timedelta(days=7),
+        'article_id': 'benchmark_missing_id',
+    }
+    is_postgres = std_db._engine.dialect.name == "postgresql"
+    explain = "EXPLAIN (ANALYZE, BUFFERS)" if is_postgres else "EXPLAIN"
+    print(f"\n========== {title} ==========")
+    with std_db._engine.connect() as conn:
+        untranslated = _untranslated_literal(conn)
+        for name, sql in HOT_QUERIES.items():
+            sql = sql.format(table=table_name, untranslated=untranslated)
+            plan = conn.execute(text(f"{explain} {sql}"), params).fetchall()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+            print(f"\n--- {name}: 平均 {elapsed_ms:.2f} ms ({repeat} 次) ---")
+            for row in plan:
+                print("  " + " | ".join(str(col) for col in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点查询执行计划对比')
+    parser.add_argument('--upgrade', action='store_true', help='对比迁移前后的执行计划')
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询计时的执行次数')
+    args = parser.parse_args()
+
+    explain_all("当前执行计划" if not args.upgrade else "迁移前", args.repeat)
+    if args.upgrade:
+        MigrationRunner().upgrade()
+        explain_all("迁移后", args.repeat)
+
+
+if __name__ == "__main__":
+    main()
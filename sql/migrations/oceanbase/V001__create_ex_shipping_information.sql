@@ -1,4 +1,5 @@
-CREATE TABLE ex_shipping_information
+-- 初始表结构（与历史手工建表脚本一致，已有表执行 baseline 1 跳过本脚本）
+CREATE TABLE IF NOT EXISTS ${table}
 (
     uuid               CHAR(36)      DEFAULT (UUID()) NOT NULL,
     img_parse_url      TEXT,
@@ -7,7 +8,7 @@ CREATE TABLE ex_shipping_information
     detail_date        DATE,
     detail_timestamptz VARCHAR(30),
     detail_contents    TEXT,
-    article_id         VARCHAR(50)  NOT NULL          NOT NULL,
+    article_id         VARCHAR(50)   NOT NULL,
     update_time        TIMESTAMP,
     class_level_1      VARCHAR(100),
     class_level_2      VARCHAR(100),
@@ -22,4 +23,4 @@ CREATE TABLE ex_shipping_information
     PRIMARY KEY (article_id)
 );
 
-CREATE INDEX idx_article_id ON ex_shipping_information (article_id);
\ No newline at end of file
+CREATE INDEX idx_article_id ON ${table} (article_id);
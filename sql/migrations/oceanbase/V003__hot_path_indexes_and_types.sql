@@ -0,0 +1,12 @@
+-- 主键已自带唯一索引，idx_article_id 冗余
+DROP INDEX idx_article_id ON ${table};
+
+-- is_translated 改为 BOOLEAN（'yes' -> TRUE，其余 -> FALSE）
+UPDATE ${table} SET is_translated = CASE WHEN is_translated = 'yes' THEN '1' ELSE '0' END;
+ALTER TABLE ${table} MODIFY COLUMN is_translated BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- OceanBase(MySQL模式)不支持部分索引，用 (is_translated, update_time) 组合索引覆盖领取查询的过滤和排序
+CREATE INDEX idx_${table_name}_untranslated ON ${table} (is_translated, update_time);
+
+-- 按发布日期查询
+CREATE INDEX idx_${table_name}_detail_date ON ${table} (detail_date);
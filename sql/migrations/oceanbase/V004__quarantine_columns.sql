@@ -0,0 +1,6 @@
+-- 高风险文章隔离：标记后不再被领取，保留期过后由定时任务分批删除
+ALTER TABLE ${table} ADD COLUMN quarantined_at TIMESTAMP NULL;
+ALTER TABLE ${table} ADD COLUMN quarantine_reason VARCHAR(50);
+
+-- 清理任务按隔离时间查找过期的行
+CREATE INDEX idx_${table_name}_quarantined ON ${table} (quarantined_at);
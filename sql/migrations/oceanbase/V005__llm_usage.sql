@@ -0,0 +1,18 @@
+-- 大模型调用账本：每次调用的模型、调用阶段、文章、token数和耗时，按时间范围汇总成本与延迟
+CREATE TABLE IF NOT EXISTS ${schema_prefix}llm_usage
+(
+    call_id           CHAR(32)     NOT NULL,
+    created_at        TIMESTAMP    NOT NULL,
+    model             VARCHAR(100) NOT NULL,
+    stage             VARCHAR(100) NOT NULL,
+    article_id        VARCHAR(50),
+    prompt_tokens     INT          DEFAULT 0 NOT NULL,
+    completion_tokens INT          DEFAULT 0 NOT NULL,
+    total_tokens      INT          DEFAULT 0 NOT NULL,
+    latency_ms        INT          DEFAULT 0 NOT NULL,
+    cached            BOOLEAN      DEFAULT FALSE NOT NULL,
+    status            VARCHAR(20)  NOT NULL,
+    PRIMARY KEY (call_id)
+);
+
+CREATE INDEX idx_llm_usage_created_at ON ${schema_prefix}llm_usage (created_at);
@@ -0,0 +1,3 @@
+-- 翻译任务领取租约字段
+ALTER TABLE ${table} ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100);
+ALTER TABLE ${table} ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
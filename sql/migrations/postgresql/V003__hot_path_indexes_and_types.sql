@@ -0,0 +1,18 @@
+-- 主键已自带唯一索引，idx_article_id 冗余
+DROP INDEX IF EXISTS ${schema_prefix}idx_article_id;
+
+-- is_translated 改为 BOOLEAN（'yes' -> TRUE，其余 -> FALSE）
+ALTER TABLE ${table} ALTER COLUMN is_translated DROP DEFAULT;
+ALTER TABLE ${table} ALTER COLUMN is_translated TYPE BOOLEAN USING (is_translated = 'yes');
+ALTER TABLE ${table} ALTER COLUMN is_translated SET DEFAULT FALSE;
+
+-- 时间字段改为带时区类型
+ALTER TABLE ${table} ALTER COLUMN detail_timestamptz TYPE TIMESTAMPTZ USING NULLIF(detail_timestamptz, '')::timestamptz;
+ALTER TABLE ${table} ALTER COLUMN update_time TYPE TIMESTAMPTZ;
+
+-- 未翻译条目的部分索引：只索引待翻译的行，领取查询按 update_time 排序取前N条
+CREATE INDEX IF NOT EXISTS idx_${table_name}_untranslated ON ${table} (update_time) INCLUDE (article_id, claimed_at)
+    WHERE is_translated = FALSE;
+
+-- 按发布日期查询
+CREATE INDEX IF NOT EXISTS idx_${table_name}_detail_date ON ${table} (detail_date);
@@ -0,0 +1,12 @@
+-- 高风险文章隔离：标记后不再被领取，保留期过后由定时任务分批删除
+ALTER TABLE ${table} ADD COLUMN IF NOT EXISTS quarantined_at TIMESTAMPTZ;
+ALTER TABLE ${table} ADD COLUMN IF NOT EXISTS quarantine_reason VARCHAR(50);
+
+-- 未翻译条目的部分索引排除已隔离的行
+DROP INDEX IF EXISTS ${schema_prefix}idx_${table_name}_untranslated;
+CREATE INDEX IF NOT EXISTS idx_${table_name}_untranslated ON ${table} (update_time) INCLUDE (article_id, claimed_at)
+    WHERE is_translated = FALSE AND quarantined_at IS NULL;
+
+-- 清理任务按隔离时间查找过期的行
+CREATE INDEX IF NOT EXISTS idx_${table_name}_quarantined ON ${table} (quarantined_at)
+    WHERE quarantined_at IS NOT NULL;
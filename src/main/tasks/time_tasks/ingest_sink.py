@@ -0,0 +1,29 @@
+import pathlib
+import sys
+from loguru import logger
+
+ROOT_DIR: pathlib.Path = pathlib.Path(__file__).parent.parent.parent.parent.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from celery import shared_task
+from src.utils.craw_tools import insert_into_table
+from src.utils.ingest_buffer import IngestBuffer
+from src.utils.seen_index import SeenIndex
+
+
+@shared_task
+def drain_ingest_buffer_task():
+    """
+    定时入口：把采集任务追加到写后缓冲中的记录批量写入数据表
+    多个入库任务可同时运行，通过Redis消费组各自领取不重叠的记录
+    """
+    written = IngestBuffer().drain(insert_into_table)
+    if written:
+        logger.info(f"写后缓冲入库 {written} 条")
+    return written
+
+
+@shared_task
+def rebuild_seen_index_task():
+    """定时入口：从数据表补齐已见文章索引，全表扫描不放在爬虫的抓取路径上"""
+    return SeenIndex().refresh()
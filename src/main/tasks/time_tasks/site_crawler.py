@@ -0,0 +1,153 @@
+import pathlib
+import sys
+import datetime
+from typing import Optional
+from urllib.parse import urljoin
+from loguru import logger
+
+ROOT_DIR: pathlib.Path = pathlib.Path(__file__).parent.parent.parent.parent.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from celery import shared_task, group, chord
+from src.settings.site_specs import SITES
+from src.utils.craw_tools import get_primary_key, fetch_and_parse, insert_into_table
+from src.utils.async_fetcher import fetch_all
+from src.utils.seen_index import SeenIndex
+from src.utils.ingest_buffer import IngestBuffer
+from src.settings.config import settings
+from src.utils.listing_watch import ListingWatcher, ListingResult
+from src.utils.site_spec import SiteSpec
+from src.utils.extractor import ArticleRecord
+
+
+def _extract(spec: SiteSpec, url: str, parse_html) -> Optional[ArticleRecord]:
+    """抽取详情页字段，失败时返回None"""
+    try:
+        return spec.extractor.extract(parse_html, url)
+    except Exception as e:
+        logger.error(f"详情页抽取失败: {spec.name} {url}, error: {e}")
+        return None
+
+
+def _parse_detail(spec: SiteSpec, url: str, parse_html=None, record: Optional[ArticleRecord] = None):
+    """把详情页（或已抽取的record）转换为入库字段，失败时返回None"""
+    try:
+        res = spec.build_row(record or spec.extractor.extract(parse_html, url))
+        res["article_id"] = get_primary_key(spec.name, res)
+        res["update_time"] = datetime.datetime.now().isoformat()
+    except Exception as e:
+        logger.error(f"详情页解析失败, 跳过: {spec.name} {url}, error: {e}")
+        return None
+    if not res["article_id"] or not (res.get("detail_contents") or res.get("detail_contents_cn")):
+        logger.error(f"内容为空, 跳过: {spec.name} {url}")
+        return None
+    return res
+
+
+@shared_task
+def dispatch_sites_task():
+    """
+    定时入口：每个启用的站点、每个列表页一个子任务，由crawler_queue上的worker并行执行
+    """
+    signatures = [crawl_listing_task.s(spec.name, listing_url)
+                  for spec in SITES.values() if spec.enabled
+                  for listing_url in spec.listing_urls]
+    if not signatures:
+        return 0
+    group(signatures).apply_async()
+    logger.info(f"已分发 {len(signatures)} 个列表页任务")
+    return len(signatures)
+
+
+@shared_task
+def crawl_listing_task(site_name: str, listing_url: str):
+    """
+    抓取单个列表页，过滤掉未变化的列表和已入库的文章，
+    剩余详情页按batch_size分批，通过chord并行抓取后统一入库
+    """
+    spec = SITES[site_name]
+    watcher = ListingWatcher()
+    listing = watcher.fetch(listing_url, spec.extractor.links)
+    if not listing.changed:
+        return 0
+
+    download_urls = [urljoin(listing_url, u) for u in listing.links][:spec.max_articles]
+    download_urls = SeenIndex().filter_new_urls(download_urls)
+    listing_state = {"url": listing.url, "etag": listing.etag,
+                     "last_modified": listing.last_modified, "links_hash": listing.links_hash}
+    if not download_urls:
+        logger.info(f"{listing_url} 没有新文章")
+        store_articles_task([], site_name, listing_state)
+        return 0
+
+    batches = [download_urls[i:i + spec.batch_size] for i in range(0, len(download_urls), spec.batch_size)]
+    chord(crawl_details_task.s(site_name, batch) for batch in batches)(
+        store_articles_task.s(site_name, listing_state))
+    logger.info(f"{site_name} {listing_url}: {len(download_urls)} 篇新文章, 分 {len(batches)} 批抓取")
+    return len(download_urls)
+
+
+@shared_task
+def crawl_details_task(site_name: str, urls: list):
+    """
+    抓取一批详情页：先并发HTTP抓取，未抓到或缺少预期字段的页面再走分级抓取（必要时使用浏览器）
+    :return: {"rows": 可入库的数据列表, "failed": 抓取失败的URL列表}
+    """
+    spec = SITES[site_name]
+    expected_xpaths = spec.detail_expected_xpaths
+    rows = []
+    retry_urls = []
+    failed = []
+    for result in fetch_all(urls):
+        # 每页只抽取一次，完整性直接按抽取结果判断，完整时复用同一份结果入库
+        record = _extract(spec, result.url, result.parse_html) if result.ok else None
+        if record is not None and spec.is_complete(record, result.parse_html):
+            res = _parse_detail(spec, result.url, record=record)
+            if res:
+                rows.append(res)
+        else:
+            retry_urls.append(result.url)
+
+    for url in retry_urls:
+        try:
+            page = fetch_and_parse(url, expected_xpaths=expected_xpaths)
+        except Exception as e:
+            logger.error(f"详情页抓取失败, 跳过: {url}, error: {e}")
+            failed.append(url)
+            continue
+        res = _parse_detail(spec, url, page.get("parse_html"))
+        if res:
+            rows.append(res)
+    return {"rows": rows, "failed": failed}
+
+
+def _store_rows(rows: list):
+    """
+    开启 INGEST_WRITE_BEHIND 时追加到写后缓冲，由 drain_ingest_buffer_task 批量入库，采集任务不等待数据库；
+    缓冲不可用时直接入库
+    """
+    if settings.INGEST_WRITE_BEHIND:
+        try:
+            IngestBuffer().append(rows)
+            return
+        except Exception as e:
+            logger.warning(f"写后缓冲追加失败, 直接入库: {str(e)}")
+    insert_into_table(rows)
+
+
+@shared_task
+def store_articles_task(batches: list, site_name: str, listing_state: dict):
+    """
+    chord回调：汇总各批详情页结果入库，全部详情页都抓取成功后才记录列表页状态；
+    有页面抓取失败时不记录，下次列表页仍视为有变化，已入库的文章由SeenIndex跳过，只重抓失败的页面
+    """
+    rows = [row for batch in batches for row in batch["rows"]]
+    failed = [url for batch in batches for url in batch["failed"]]
+    if rows:
+        _store_rows(rows)
+    if failed:
+        logger.warning(f"{site_name} {len(failed)} 个详情页抓取失败, 不记录列表页状态: {listing_state['url']}")
+    else:
+        ListingWatcher().commit(ListingResult(changed=True, **listing_state))
+    logger.info(f"{site_name} 入库 {len(rows)} 条")
+    return len(rows)
@@ -1,16 +1,18 @@
 import sys
-import time
+import asyncio
+import datetime
+from functools import partial
 from loguru import logger
-from concurrent.futures import ThreadPoolExecutor
 import pathlib
 ROOT_DIR: pathlib.Path = pathlib.Path(__file__).parent.parent.parent.parent.parent.resolve()
 sys.path.append(str(ROOT_DIR))
 
-from src.utils.craw_tools import find_translated as translate
-from src.utils.craw_tools import update_no_translate_context as update_table
-from src.utils.craw_tools import delete_high_risk_data as delete_data
-from src.utils.ai_tools import report_for_en, translate_content, translate_title, \
-    for_simple_analyze_report, catch_hot_key_words, llm_filter_high_risk_news
+from src.utils.craw_tools import TranslationResultSink
+from src.utils.craw_tools import purge_quarantined
+from src.utils.ai_tools import enrich_article_async, is_high_risk_exception, llm_filter_high_risk_news_async
+from src.utils.async_llm import LLMOverloadedError, get_async_llm
+from src.utils.async_db_tools import get_async_db
+from src.utils.llm_usage import LLMBudgetExceededError, set_current_article, within_budget
 from celery import shared_task
 from src.settings.config import settings
 
@@ -19,84 +21,84 @@ table_name = settings.CRAWL_TABLE_NAME
 
 @shared_task
 def time_task():
-    translate_list = translate(table_name)
+    if not within_budget():
+        logger.warning("当日LLM token用量已达预算, 本轮不领取翻译条目")
+        return
+    # 整批条目同时提交，实际在途请求数由异步客户端按模型自适应控制，翻译结果由sink批量写回
+    with TranslationResultSink(table_name) as sink:
+        asyncio.run(process_batch(sink))
+
+
+async def process_batch(sink):
+    db = get_async_db()
+    try:
+        # 每次只领取一批，多个worker并发执行时各自处理不重叠的条目
+        translate_list = await db.claim_untranslated(table_name)
+    finally:
+        # 连接池绑定本次事件循环，领取后即释放
+        await db.dispose()
     logger.info(f'translate_obj: {len(translate_list)}')
-    # 使用线程池来并行执行任务
-    with ThreadPoolExecutor(5) as executor:  # 你可以根据需要调整线程数
-        futures = []
-        for item in translate_list:
-            future = executor.submit(process_item, item)
-            futures.append(future)
-        for future in futures:
-            try:
-                future.result()  # 这会等待每个任务完成
-            except Exception as e:
-                logger.error(f"{e}, {e.__traceback__.tb_lineno}")
-                # 针对429（超限）类型报错 休眠一分钟
-                time.sleep(60)
-                continue
-
-
-def is_high_risk_exception(raised_exception):
-    if "high risk" or "inappropriate content." in str(raised_exception):
-        return True
-    else:
-        return False
-
-
-def process_item(item):
+    llm = get_async_llm()
+    try:
+        results = await asyncio.gather(*(process_item(item, sink) for item in translate_list),
+                                       return_exceptions=True)
+    finally:
+        logger.info(f"LLM并发状态: {llm.stats()}")
+        await llm.close()
+    for item, result in zip(translate_list, results):
+        if isinstance(result, (LLMOverloadedError, LLMBudgetExceededError)):
+            # 接口过载（429/5xx已按Retry-After重试到上限）或预算用尽：不写回任何结果，租约过期后重新领取
+            logger.warning(f"{item.get('article_id')}: {result}, 留待租约过期后重试")
+        elif isinstance(result, Exception):
+            # 其他调用故障同样不写回，租约过期后重新领取
+            logger.error(f"{item.get('article_id')}: {result}, {result.__traceback__.tb_lineno}")
+
+
+@shared_task
+def purge_quarantined_task():
+    """定时入口：分批删除隔离期已过的高风险文章"""
+    return purge_quarantined(table_name)
+
+
+def quarantine(sink, article_id, reason):
+    """把高风险文章标记为隔离，随翻译结果一起批量写回，之后不再被领取"""
+    sink.add(article_id=article_id, quarantined_at=datetime.datetime.now(datetime.timezone.utc),
+             quarantine_reason=reason)
+
+
+async def process_item(item, sink):
     article_id = item.get("article_id")
     detail_title = item.get("detail_title")
     detail_contents = item.get("detail_contents") or item.get("detail_title_cn")
-    
-    is_high_risk = llm_filter_high_risk_news(detail_title, detail_contents)
+    loop = asyncio.get_running_loop()
+    # 每个条目是独立的asyncio任务，调用账本据此把token记到这篇文章名下
+    set_current_article(article_id)
+
+    # 过载、预算用尽等调用故障直接抛给 process_batch，只有模型的判定结果才会隔离
+    is_high_risk = await llm_filter_high_risk_news_async(detail_title, detail_contents)
     if is_high_risk.strip() == '【直接过滤】':
-        delete_data(table_name, article_id)
-        logger.info(f"第一次安全检查... 删除高风险数据: {article_id}")
+        # sink攒满时会同步写库，放到线程池中执行，不阻塞事件循环
+        await loop.run_in_executor(None, quarantine, sink, article_id, "llm_filter")
+        logger.info(f"第一次安全检查... 隔离高风险数据: {article_id}")
         return
  
 
     try:
-        if not detail_title:
-            detail_title_cn = item.get("detail_title_cn")
-            detail_title = translate_title(detail_title_cn, 'zh')
+        # 标题/正文翻译、中英文摘要、关键字合并为一次调用，校验不通过的字段再逐项补齐
+        if detail_title:
+            row = await enrich_article_async(detail_title, item.get("detail_contents"), "en")
         else:
-            detail_title_cn = translate_title(detail_title, 'en')
-
-        # 微信热点需求, 英文
-        detail_contents = item.get("detail_contents")
-        # 英文翻译成中文
-        if not detail_contents:
-            # 如果获取不到detail_content 说明是中文版本
-            detail_contents_cn = item.get("detail_contents_cn")
-            # 中文翻译成英文
-            detail_contents = translate_content(detail_contents_cn, 'zh')
-        else:
-            detail_contents_cn = translate_content(detail_contents, 'en')
-
-        # abstract_cn_wechat = for_analyze_report(detail_contents)
-        # 新闻需求, prompt已兼容中文版本。
-        abstract_cn = for_simple_analyze_report(detail_contents)
-        # 中文摘要英译
-        abstract_en = report_for_en(abstract_cn)
-
-        # 热点关键字， 返回英文版本
-        keyword1, keyword2, keyword3 = eval(catch_hot_key_words(detail_contents, detail_title))
+            row = await enrich_article_async(item.get("detail_title_cn"), item.get("detail_contents_cn"), "zh")
 
         # 如果每一项翻译都成功不为空
-        is_translated = "yes"
-
-        update_table(table_name, abstract_cn, abstract_en,
-                     detail_title_cn, detail_contents_cn,
-                     detail_contents, detail_title,
-                     article_id, keyword1, keyword2, keyword3, is_translated)
+        await loop.run_in_executor(None, partial(sink.add, article_id=article_id, is_translated=True, **row))
 
     except Exception as e:
-        logger.error(f"error occured: {e}, {e.__traceback__.tb_lineno}")
         if is_high_risk_exception(e):
-            delete_data(table_name, article_id)
-            logger.info(f"输出安全检查...   删除高风险数据: {article_id}")
+            await loop.run_in_executor(None, quarantine, sink, article_id, "output_check")
+            logger.info(f"输出安全检查...   隔离高风险数据: {article_id}")
             return
+        raise
 
 
 if __name__ == '__main__':
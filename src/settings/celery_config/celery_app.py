@@ -44,7 +44,9 @@ celery_app.conf.update(
     
     # 队列配置
     task_routes = {
-        'src.main.tasks.time_tasks.craw_aibase_thread.time_task': {'queue': 'crawler_queue'},
+        'src.main.tasks.time_tasks.site_crawler.*': {'queue': 'crawler_queue'},
+        # 写后缓冲入库使用独立队列，不排在耗时很长的翻译任务后面
+        'src.main.tasks.time_tasks.ingest_sink.*': {'queue': 'ingest_queue'},
         'src.main.tasks.time_tasks.translate_tasks.time_task': {'queue': 'default'}
     },
     task_default_queue = 'default',
@@ -58,9 +60,24 @@ celery_app.conf.update(
             'schedule': timedelta(seconds=30),  # 每30秒执行一次
             'args': ()
         },
-        'craw-aibase-thread-120s': {
-            'task': 'src.main.tasks.time_tasks.craw_aibase_thread.time_task',
-            'schedule': timedelta(seconds=120),  # 每120秒执行一次
+        'crawl-sites-120s': {
+            'task': 'src.main.tasks.time_tasks.site_crawler.dispatch_sites_task',
+            'schedule': timedelta(seconds=120),  # 每120秒分发一次所有站点的采集任务
+            'args': ()
+        },
+        'purge-quarantined-hourly': {
+            'task': 'src.main.tasks.time_tasks.translate_tasks.purge_quarantined_task',
+            'schedule': timedelta(hours=1),  # 每小时分批删除隔离期满的高风险文章
+            'args': ()
+        },
+        'drain-ingest-buffer-15s': {
+            'task': 'src.main.tasks.time_tasks.ingest_sink.drain_ingest_buffer_task',
+            'schedule': timedelta(seconds=15),  # 每15秒把写后缓冲中的采集结果批量入库
+            'args': ()
+        },
+        'rebuild-seen-index': {
+            'task': 'src.main.tasks.time_tasks.ingest_sink.rebuild_seen_index_task',
+            'schedule': timedelta(seconds=settings.SEEN_INDEX_REBUILD_INTERVAL),  # 定时从数据表补齐已见文章索引
             'args': ()
         },
     }
@@ -26,7 +26,93 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT: int = config("REQUEST_TIMEOUT", cast=int)
     MAX_RETRIES: int = config("MAX_RETRIES", cast=int)
     OPENAI_API_KEY: str = config("OPENAI_API_KEY", cast=str)  # type: ignore
-    
+
+    # 翻译结果批量写回配置
+    TRANSLATE_FLUSH_ROWS: int = config("TRANSLATE_FLUSH_ROWS", cast=int, default=50)  # 攒够多少条写回一次
+    TRANSLATE_FLUSH_INTERVAL: float = config("TRANSLATE_FLUSH_INTERVAL", cast=float, default=10)  # 最长多少秒写回一次
+    TRANSLATE_CLAIM_BATCH: int = config("TRANSLATE_CLAIM_BATCH", cast=int, default=50)  # 每次领取的未翻译条目数
+    TRANSLATE_CLAIM_LEASE: int = config("TRANSLATE_CLAIM_LEASE", cast=int, default=1800)  # 领取租约秒数，过期后可被重新领取
+
+    # 异步抓取引擎配置
+    FETCH_MAX_CONNECTIONS: int = config("FETCH_MAX_CONNECTIONS", cast=int, default=100)  # 连接池总连接数
+    FETCH_PER_HOST_LIMIT: int = config("FETCH_PER_HOST_LIMIT", cast=int, default=8)  # 单站点最大并发连接数
+    FETCH_KEEPALIVE_TIMEOUT: int = config("FETCH_KEEPALIVE_TIMEOUT", cast=int, default=30)  # keep-alive空闲保持秒数
+
+    # 浏览器池配置（每个worker进程）
+    BROWSER_POOL_SIZE: int = config("BROWSER_POOL_SIZE", cast=int, default=2)  # 常驻浏览器数量
+    BROWSER_MAX_TABS: int = config("BROWSER_MAX_TABS", cast=int, default=4)  # 单个浏览器同时打开的标签页上限
+    BROWSER_MAX_PAGES: int = config("BROWSER_MAX_PAGES", cast=int, default=50)  # 单个浏览器服务多少页面后回收重启
+    BROWSER_CHECKOUT_TIMEOUT: int = config("BROWSER_CHECKOUT_TIMEOUT", cast=int, default=60)  # 等待空闲标签页的超时秒数
+    CHROMIUM_PORT_LEASE_DIR: str = config("CHROMIUM_PORT_LEASE_DIR", cast=str, default="")  # 端口租约目录，为空时使用系统临时目录
+    CHROMIUM_PORT_LEASE_TTL: int = config("CHROMIUM_PORT_LEASE_TTL", cast=int, default=86400)  # 端口租约最长有效秒数
+
+    # 爬虫共享状态（抓取策略、去重索引等）使用的Redis，为空时使用CELERY_RESULT_BACKEND
+    CRAWLER_REDIS_URL: str = config("CRAWLER_REDIS_URL", cast=str, default="")
+
+    # 分级抓取策略配置（先普通HTTP，校验失败再走浏览器）
+    FETCH_STRATEGY_MIN_SAMPLES: int = config("FETCH_STRATEGY_MIN_SAMPLES", cast=int, default=5)  # HTTP样本数达到该值后才按成功率决策
+    FETCH_STRATEGY_HTTP_MIN_SUCCESS: float = config("FETCH_STRATEGY_HTTP_MIN_SUCCESS", cast=float, default=0.2)  # HTTP成功率低于该值的域名直接走浏览器
+    FETCH_STRATEGY_REPROBE_EVERY: int = config("FETCH_STRATEGY_REPROBE_EVERY", cast=int, default=20)  # 直接走浏览器的域名每N次重新试探一次HTTP
+    FETCH_STRATEGY_TTL: int = config("FETCH_STRATEGY_TTL", cast=int, default=604800)  # 域名统计最长保留秒数
+
+    # 已见文章索引配置（抓取详情页前过滤已入库文章）
+    SEEN_INDEX_REBUILD_INTERVAL: int = config("SEEN_INDEX_REBUILD_INTERVAL", cast=int, default=3600)  # 从数据表补齐索引的间隔秒数
+    SEEN_INDEX_TTL: int = config("SEEN_INDEX_TTL", cast=int, default=2592000)  # 索引最长保留秒数
+    LISTING_WATCH_TTL: int = config("LISTING_WATCH_TTL", cast=int, default=86400)  # 列表页ETag/链接哈希最长保留秒数
+
+    # 分布式限流配置（按域名或API凭证分桶，所有worker共享）
+    RATE_LIMIT_DEFAULT_RPS: float = config("RATE_LIMIT_DEFAULT_RPS", cast=float, default=2.0)  # 每个桶默认每秒请求数
+    RATE_LIMIT_BURST: int = config("RATE_LIMIT_BURST", cast=int, default=5)  # 令牌桶容量（允许的突发请求数）
+    RATE_LIMIT_OVERRIDES: str = config("RATE_LIMIT_OVERRIDES", cast=str, default="")  # 单独配置的速率，格式: 域名或前缀=每秒请求数,...
+    RATE_LIMIT_RECOVER_SECONDS: int = config("RATE_LIMIT_RECOVER_SECONDS", cast=int, default=300)  # 被限流降速后恢复到配置速率的秒数
+    RATE_LIMIT_PENALTY_SECONDS: int = config("RATE_LIMIT_PENALTY_SECONDS", cast=int, default=30)  # 没有Retry-After时的默认暂停秒数
+
+    # 高风险文章隔离配置
+    QUARANTINE_RETENTION_SECONDS: int = config("QUARANTINE_RETENTION_SECONDS", cast=int, default=604800)  # 隔离的文章保留多少秒后删除
+    QUARANTINE_PURGE_BATCH: int = config("QUARANTINE_PURGE_BATCH", cast=int, default=500)  # 每批删除的行数（单个事务）
+    QUARANTINE_PURGE_PAUSE: float = config("QUARANTINE_PURGE_PAUSE", cast=float, default=0.5)  # 批与批之间暂停的秒数
+    QUARANTINE_PURGE_MAX_SECONDS: int = config("QUARANTINE_PURGE_MAX_SECONDS", cast=int, default=300)  # 单次清理任务最长运行秒数
+
+    # 大模型异步并发配置
+    LLM_MAX_CONCURRENCY: int = config("LLM_MAX_CONCURRENCY", cast=int, default=16)  # 每个模型的在途请求数上限
+    LLM_CONCURRENCY_OVERRIDES: str = config("LLM_CONCURRENCY_OVERRIDES", cast=str, default="")  # 单独配置的模型并发上限，格式: 模型=并发数,...
+    LLM_INITIAL_CONCURRENCY: int = config("LLM_INITIAL_CONCURRENCY", cast=int, default=4)  # 起始并发数，之后按延迟和错误率自动增减
+    LLM_AIMD_BACKOFF: float = config("LLM_AIMD_BACKOFF", cast=float, default=0.5)  # 收到429/5xx时并发上限乘以该系数
+    LLM_LATENCY_TOLERANCE: float = config("LLM_LATENCY_TOLERANCE", cast=float, default=2.0)  # 近期延迟超过长期均值的倍数时停止增加并发
+    LLM_MAX_RETRIES: int = config("LLM_MAX_RETRIES", cast=int, default=3)  # 429/5xx/超时的最多请求次数
+
+    # 长文分段翻译配置
+    LLM_CHUNK_THRESHOLD_TOKENS: int = config("LLM_CHUNK_THRESHOLD_TOKENS", cast=int, default=2000)  # 正文估算token数超过该值时分段翻译
+    LLM_CHUNK_MAX_TOKENS: int = config("LLM_CHUNK_MAX_TOKENS", cast=int, default=800)  # 每段的估算token数上限
+    LLM_CHUNK_OVERLAP_CHARS: int = config("LLM_CHUNK_OVERLAP_CHARS", cast=int, default=200)  # 附带的上一段末尾字符数（仅作上下文）
+    LLM_CHUNK_MIN_RATIO: float = config("LLM_CHUNK_MIN_RATIO", cast=float, default=0.4)  # 译文与原文估算token数之比低于该值视为不完整
+    LLM_CHUNK_PARALLELISM: int = config("LLM_CHUNK_PARALLELISM", cast=int, default=8)  # 同步接口同时翻译的段数（异步接口由自适应并发控制）
+
+    # LLM调用账本配置
+    LLM_USAGE_SINK: str = config("LLM_USAGE_SINK", cast=str, default="db")  # db（llm_usage表）/ file（data/llm_usage下的JSONL）/ none
+    LLM_USAGE_FLUSH_ROWS: int = config("LLM_USAGE_FLUSH_ROWS", cast=int, default=200)  # 攒够多少条调用记录写出一次
+    LLM_USAGE_FLUSH_INTERVAL: float = config("LLM_USAGE_FLUSH_INTERVAL", cast=float, default=60)  # 最长多少秒写出一次
+    LLM_DAILY_TOKEN_BUDGET: int = config("LLM_DAILY_TOKEN_BUDGET", cast=int, default=0)  # 所有worker每日token预算，0表示不限制
+    LLM_LOW_PRIORITY_BUDGET_SHARE: float = config("LLM_LOW_PRIORITY_BUDGET_SHARE", cast=float, default=0.8)  # 低优先级调用可用的预算比例
+
+    # LLM响应缓存配置
+    LLM_CACHE_BACKEND: str = config("LLM_CACHE_BACKEND", cast=str, default="sqlite")  # sqlite（本机共享）/ redis（集群共享）/ none（关闭）
+    LLM_CACHE_DIR: str = config("LLM_CACHE_DIR", cast=str, default="")  # sqlite缓存目录，为空时使用项目下的data/llm_cache
+    LLM_CACHE_TTL: int = config("LLM_CACHE_TTL", cast=int, default=2592000)  # 缓存条目有效秒数
+    LLM_CACHE_MAX_BYTES: int = config("LLM_CACHE_MAX_BYTES", cast=int, default=536870912)  # 缓存总大小上限（字节），超过后淘汰旧条目
+
+    # 写后缓冲配置（采集结果先写入Redis Stream，由入库任务批量写库）
+    INGEST_WRITE_BEHIND: bool = config("INGEST_WRITE_BEHIND", cast=bool, default=True)  # 采集任务是否通过写后缓冲入库
+    INGEST_BATCH_SIZE: int = config("INGEST_BATCH_SIZE", cast=int, default=1000)  # 入库任务每批写库的记录数
+    INGEST_DRAIN_MAX_SECONDS: int = config("INGEST_DRAIN_MAX_SECONDS", cast=int, default=50)  # 单次入库任务最长运行秒数
+    INGEST_CLAIM_IDLE_SECONDS: int = config("INGEST_CLAIM_IDLE_SECONDS", cast=int, default=120)  # 未确认的记录超过该秒数后可被重新领取
+    INGEST_MAX_DELIVERIES: int = config("INGEST_MAX_DELIVERIES", cast=int, default=5)  # 入库重试超过该次数的记录移入死信
+
+    # 原始HTML归档配置（用于离线重新解析）
+    HTML_ARCHIVE_ENABLED: bool = config("HTML_ARCHIVE_ENABLED", cast=bool, default=False)  # 抓取后是否归档原始HTML
+    HTML_ARCHIVE_DIR: str = config("HTML_ARCHIVE_DIR", cast=str, default="")  # 归档目录，为空时使用项目下的data/html_archive
+    HTML_ARCHIVE_ZSTD_LEVEL: int = config("HTML_ARCHIVE_ZSTD_LEVEL", cast=int, default=3)  # zstd压缩级别
+
     # 数据库配置
     DATABASE_TYPE: str = config("DATABASE_TYPE", cast=str, default="postgresql")  # 数据库类型: postgresql, oceanbase
     POSTGRES_CONNECT: str = config("POSTGRES_CONNECT", cast=str)  # type: ignore
@@ -45,6 +131,7 @@ class Settings(BaseSettings):
     OCEANBASE_PASSWORD: str = config("OCEANBASE_PASSWORD", cast=str, default="")  # type: ignore
 
     DB_MAX_POOL_CON: int = config("DB_MAX_POOL_CON", cast=int)  # type: ignore
+    DB_POOL_SIZE_BY_CONCURRENCY: bool = config("DB_POOL_SIZE_BY_CONCURRENCY", cast=bool, default=False)  # worker子进程按并发数均分DB_MAX_POOL_CON作为连接池大小
     DB_POOL_SIZE: int = config("DB_POOL_SIZE", cast=int)  # type: ignore
     DB_POOL_OVERFLOW: int = config("DB_POOL_OVERFLOW", cast=int)  # type: ignore
     DB_TIMEOUT: int = config("DB_TIMEOUT", cast=int)  # type: ignore
@@ -52,6 +139,12 @@ class Settings(BaseSettings):
     DB_POOL_TIMEOUT: int = config("DB_POOL_TIMEOUT", cast=int)  # type: ignore
     DB_POOL_RESET_ON_RETURN: str = config("DB_POOL_RESET_ON_RETURN", cast=str)  # type: ignore
     IS_DB_ECHO_LOG: bool = config("IS_DB_ECHO_LOG", cast=bool)  # type: ignore
+    DB_BULK_CHUNK_SIZE: int = config("DB_BULK_CHUNK_SIZE", cast=int, default=500)  # 批量写入时每条SQL包含的记录数
+    DB_REPLICA_URL: str = config("DB_REPLICA_URL", cast=str, default="")  # 只读副本的SQLAlchemy连接URL，为空时读写都走主库
+    DB_METRICS_ENABLED: bool = config("DB_METRICS_ENABLED", cast=bool, default=True)  # 是否统计连接池等待和SQL耗时
+    DB_SLOW_QUERY_MS: float = config("DB_SLOW_QUERY_MS", cast=float, default=1000)  # 慢查询日志阈值(毫秒)
+    DB_METRICS_EXPORT_INTERVAL: float = config("DB_METRICS_EXPORT_INTERVAL", cast=float, default=30)  # worker进程导出统计到Redis的最小间隔(秒)
+    DB_READ_YOUR_WRITES_SECONDS: float = config("DB_READ_YOUR_WRITES_SECONDS", cast=float, default=5)  # 本进程写入主库后该时间内的读仍走主库
 
 
     # 数据采集配置
@@ -0,0 +1,22 @@
+from typing import Dict
+
+from src.utils.site_spec import SiteSpec
+
+# 采集站点注册表：新增站点只需在此添加一个SiteSpec，无需新增任务模块
+SITE_SPECS = [
+    SiteSpec(
+        name="aibase",
+        listing_urls=("https://news.aibase.com/zh/news",),
+        link_xpath='//div[@pathstr="client/doc"]//a/@href',
+        title_xpath='//h1/text()',
+        content_xpath="//div[@class='articleContent']//text()",
+        date_xpath='//span[2]//text()',
+        img_xpath='//div[@class="articleContent"]//p//img/@src',
+        date_format="%Y年%m月%d号 %H:%M",
+        utc_offset=8,
+        language="zh",
+        class_level_1="科技前沿",
+    ),
+]
+
+SITES: Dict[str, SiteSpec] = {spec.name: spec for spec in SITE_SPECS}
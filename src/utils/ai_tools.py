@@ -1,26 +1,83 @@
+import ast
+import asyncio
+import contextvars
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
 from src.settings.config import settings
-from openai import OpenAI
+from src.utils.rate_limiter import get_rate_limiter, parse_retry_after
+from src.utils.llm_cache import cache_key, get_llm_cache
+from src.utils.llm_usage import check_budget, get_usage_ledger
+from src.utils.text_chunks import estimate_tokens, join_chunks, split_chunks, tail
+from src.utils.async_llm import LLM_BASE_URL, get_async_llm, llm_limiter_key
+from openai import OpenAI, RateLimitError
 from loguru import logger
 
 sdk_key = settings.OPENAI_API_KEY
 
 client = OpenAI(
     api_key=sdk_key,
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    base_url=LLM_BASE_URL,
 )
 
-def chat(system_prompt:str = "", query:str = "", model:str = "qwen-max"):
+def chat(system_prompt:str = "", query:str = "", model:str = "qwen-max", response_format: Optional[dict] = None,
+         use_cache: bool = True, stage: Optional[str] = None, priority: str = "normal",
+         validate: Optional[Callable[[str], bool]] = None):
+    """
+    :param response_format: 透传给接口的输出格式，例如 {"type": "json_object"}
+    :param use_cache: 是否使用LLM响应缓存；相同(模型, 消息, 温度, 输出格式)的请求直接返回缓存结果，
+                      重试和重复投递的任务不会重复计费
+    :param validate: 结果校验函数，只有校验通过的结果才写入缓存；命中的缓存校验不通过时删除并重新请求，
+                     调用方校验失败后再次调用即会重新请求接口
+    :param stage: 记入调用账本的阶段名，默认为调用chat的函数名
+    :param priority: normal / low，当日token用量超过对应预算时抛出 LLMBudgetExceededError
+    """
+    stage = stage or sys._getframe(1).f_code.co_name
+    ledger = get_usage_ledger()
     messages = [{"role": "system", "content": system_prompt}]
     messages.append({"role": "system", "content": query})
+    temperature = 0.3
+    cache = get_llm_cache()
+    key = cache_key(model, messages, temperature, response_format=response_format)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None and (validate is None or validate(cached)):
+            logger.info(f'LLM缓存命中: {key[:12]}')
+            ledger.record(model, stage, cached=True)
+            return cached
+        if cached is not None:
+            logger.warning(f'LLM缓存结果未通过校验, 删除后重新请求: {key[:12]}')
+            cache.delete(key)
+    check_budget(priority)
+    limiter = get_rate_limiter()
+    extra = {"response_format": response_format} if response_format else {}
+    start = time.monotonic()
     try:
+        limiter.acquire(llm_limiter_key)
         completion = client.chat.completions.create(
             model=model,
             messages=messages,
-            temperature=0.3
+            temperature=temperature,
+            **extra
         )
         logger.info(f'usage_token: {completion.usage.total_tokens}')
+        ledger.record(model, stage, completion.usage.prompt_tokens, completion.usage.completion_tokens,
+                      time.monotonic() - start)
         result = completion.choices[0].message.content
+        if use_cache and (validate is None or validate(result)):
+            cache.set(key, result)
+    except RateLimitError as e:
+        ledger.record(model, stage, latency=time.monotonic() - start, status="rate_limited")
+        limiter.penalize(llm_limiter_key, parse_retry_after(e.response.headers.get('Retry-After')))
+        logger.error(f"chat： {e}")
+        raise e
     except Exception as e:
+        ledger.record(model, stage, latency=time.monotonic() - start, status="error")
         logger.error(f"chat： {e}")
         raise e
     return result
@@ -97,7 +154,7 @@ def match_web_url_class_label(news_title, news_content):
                         """
         logger.info(f"根据文章标题和内容分类中...")
 
-        info = chat(abstract)
+        info = chat(abstract, priority="low")
         logger.info(f'分类结果: {info}')
         return info
     except Exception as e:
@@ -166,7 +223,7 @@ def for_analyze_report(content_text):
 
         """
         logger.info(f"微信热点简报生成中...")
-        info = chat(abstract)
+        info = chat(abstract, priority="low")
         logger.info(f'分析简报生成完成, 分析字数: {len(info)}')
         return info
     except Exception as e:
@@ -240,7 +297,7 @@ def match_web_url_class_label(news_title, news_content):
                         """
         logger.info(f"根据文章标题和内容分类中...")
 
-        info = chat(abstract)
+        info = chat(abstract, priority="low")
         logger.info(f'分类结果: {info}')
         return info
     except Exception as e:
@@ -331,6 +388,8 @@ def translate_content(content_text, type):
     try:
         if content_text is None:
             raise ValueError("content returned None, which is not allowed")
+        if _is_long(content_text):
+            return translate_content_chunked(content_text, type)
         if type == "zh":
             logger.info(f"根据文章内容生成英文翻译中...")
             abstract = f"""
@@ -355,6 +414,99 @@ def translate_content(content_text, type):
         raise
 
 
+def _is_long(content_text) -> bool:
+    """正文超过 LLM_CHUNK_THRESHOLD_TOKENS 时分段翻译，避免单次输出过长被截断"""
+    return estimate_tokens(content_text) > settings.LLM_CHUNK_THRESHOLD_TOKENS
+
+
+def _chunk_prompt(chunk_text, context, type):
+    target = "英文" if type == "zh" else "中文"
+    context_part = f"""
+                        ## 上文（仅供理解语境，不要翻译、不要输出）
+                        {context}
+    """ if context else ""
+    return f"""
+                        请将以下海洋航运业新闻正文中的一个片段翻译为{target}。
+                        {context_part}
+                        ## 待翻译片段
+                        {chunk_text}
+
+                        要求返回的结果
+                        1. 仅有该片段的{target}译文，保持原有分段，不要遗漏任何句子
+                        2. 不要翻译上文，不要出现例如：{target}翻译是:... 类似的表述。
+    """
+
+
+def _covers(source_text, translation, type) -> bool:
+    """译文语言正确，且长度与原文相称（明显过短视为被截断或漏译）"""
+    is_target = _is_english if type == "zh" else _is_chinese
+    if not is_target(translation):
+        return False
+    source_tokens = estimate_tokens(source_text)
+    return source_tokens < 50 or estimate_tokens(translation) >= source_tokens * settings.LLM_CHUNK_MIN_RATIO
+
+
+def _chunk_plan(content_text):
+    chunks = split_chunks(content_text, settings.LLM_CHUNK_MAX_TOKENS)
+    contexts = [""] + [tail(chunk.text, settings.LLM_CHUNK_OVERLAP_CHARS) for chunk in chunks[:-1]]
+    logger.info(f"正文约 {estimate_tokens(content_text)} tokens, 分 {len(chunks)} 段并行翻译中...")
+    return chunks, contexts
+
+
+def _translate_chunk(chunk_text, context, type):
+    prompt = _chunk_prompt(chunk_text, context, type)
+    covers = partial(_covers, chunk_text, type=type)
+    # 不完整的译文不写入缓存，重试时会重新请求接口
+    result = chat(prompt, stage="translate_chunk", validate=covers)
+    if not covers(result):
+        logger.warning(f"片段译文不完整, 重新翻译: {chunk_text[:50]}")
+        result = chat(prompt, stage="translate_chunk", validate=covers)
+        if not covers(result):
+            raise ValueError(f"片段译文不完整: {chunk_text[:50]}")
+    return result
+
+
+async def _translate_chunk_async(chunk_text, context, type):
+    prompt = _chunk_prompt(chunk_text, context, type)
+    llm = get_async_llm()
+    covers = partial(_covers, chunk_text, type=type)
+    result = await llm.chat(prompt, stage="translate_chunk", validate=covers)
+    if not covers(result):
+        logger.warning(f"片段译文不完整, 重新翻译: {chunk_text[:50]}")
+        result = await llm.chat(prompt, stage="translate_chunk", validate=covers)
+        if not covers(result):
+            raise ValueError(f"片段译文不完整: {chunk_text[:50]}")
+    return result
+
+
+def translate_content_chunked(content_text, type):
+    """
+    长文分段并行翻译
+    - 按段落（超长段落按句子）切成不超过 LLM_CHUNK_MAX_TOKENS 的片段，最多 LLM_CHUNK_PARALLELISM 段同时翻译
+    - 每段附带上一段末尾 LLM_CHUNK_OVERLAP_CHARS 字符作为上下文，只翻译本段
+    - 每段译文都要通过语言和长度校验，重试一次仍不通过则抛出异常，不保存不完整的译文
+    """
+    chunks, contexts = _chunk_plan(content_text)
+    with ThreadPoolExecutor(max(1, min(len(chunks), settings.LLM_CHUNK_PARALLELISM))) as executor:
+        # 每个片段复制一份上下文，调用账本仍记到当前文章名下
+        futures = [executor.submit(contextvars.copy_context().run, _translate_chunk, chunk.text, context, type)
+                   for chunk, context in zip(chunks, contexts)]
+        translations = [future.result() for future in futures]
+    info = join_chunks(chunks, translations, "en" if type == "zh" else "zh")
+    logger.info(f'新闻内容分段翻译完成, 翻译字数: {len(info)}')
+    return info
+
+
+async def translate_content_chunked_async(content_text, type):
+    """translate_content_chunked 的协程版本，各段的并发由异步客户端按模型自适应控制"""
+    chunks, contexts = _chunk_plan(content_text)
+    translations = await asyncio.gather(*(_translate_chunk_async(chunk.text, context, type)
+                                          for chunk, context in zip(chunks, contexts)))
+    info = join_chunks(chunks, list(translations), "en" if type == "zh" else "zh")
+    logger.info(f'新闻内容分段翻译完成, 翻译字数: {len(info)}')
+    return info
+
+
 def catch_hot_key_words(content_text, title_text):
     # 根据 原文正文 和 原文标题 提取关键字
     try:
@@ -381,8 +533,7 @@ def catch_hot_key_words(content_text, title_text):
         raise
 
 
-# 过滤国内外对中国不良言论的新闻
-def llm_filter_high_risk_news(content_title:str, content_text:str):
+def _filter_prompts(content_title:str, content_text:str):
     sys_pmt = """
         你是一个严格的内容安全过滤器。你的任务​​不是修改或重写​​，而是基于以下​​绝对标准​​，对提供的国际新闻内容进行二元判断：​"直接过滤"或 ​​"允许通过"​。无需提供解释，只需给出判定结果。
     """
@@ -414,9 +565,235 @@ def llm_filter_high_risk_news(content_title:str, content_text:str):
         输出 ​​【直接过滤】​或者 ​​【允许通过】​​。
         不要输出任何其他内容。
     """
+    return sys_pmt, query_prompt
+
+
+def is_high_risk_exception(raised_exception) -> bool:
+    """接口的内容审核拒绝了输入或输出（这是对内容的判定，不是调用故障）"""
+    message = str(raised_exception)
+    return "high risk" in message or "inappropriate content." in message
+
+
+# 过滤国内外对中国不良言论的新闻
+def llm_filter_high_risk_news(content_title:str, content_text:str):
+    """
+    返回模型的判定结果；接口内容审核拒绝时视为【直接过滤】
+    预算用尽、限流、网络等调用故障原样抛出，由调用方留待重试，不能当作高风险隔离
+    """
+    sys_pmt, query_prompt = _filter_prompts(content_title, content_text)
     try:
         result = chat(sys_pmt, query_prompt, model="qwen3-235b-a22b-instruct-2507")
         return result
     except Exception as e:
+        if is_high_risk_exception(e):
+            logger.info(f"llm_filter_high_risk_news 内容审核拒绝: {e}")
+            return "【直接过滤】"
         logger.error(f"llm_filter_high_risk_news： {e}")
-        return "【直接过滤】"
+        raise
+
+
+async def llm_filter_high_risk_news_async(content_title:str, content_text:str):
+    """llm_filter_high_risk_news 的协程版本，通过自适应并发的异步客户端调用"""
+    sys_pmt, query_prompt = _filter_prompts(content_title, content_text)
+    try:
+        return await get_async_llm().chat(sys_pmt, query_prompt, model="qwen3-235b-a22b-instruct-2507",
+                                          stage="llm_filter_high_risk_news")
+    except Exception as e:
+        if is_high_risk_exception(e):
+            logger.info(f"llm_filter_high_risk_news_async 内容审核拒绝: {e}")
+            return "【直接过滤】"
+        logger.error(f"llm_filter_high_risk_news_async： {e}")
+        raise
+
+
+_CJK = re.compile(r"[\u4e00-\u9fff]")
+_LATIN = re.compile(r"[A-Za-z]")
+_JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def _is_chinese(text) -> bool:
+    """非空且包含足够比例的汉字"""
+    if not isinstance(text, str) or not text.strip():
+        return False
+    return len(_CJK.findall(text)) >= max(1, len(text.strip()) * 0.1)
+
+
+def _is_english(text) -> bool:
+    """非空、以拉丁字母为主且几乎不含汉字"""
+    if not isinstance(text, str) or not text.strip():
+        return False
+    return len(_LATIN.findall(text)) > len(_CJK.findall(text)) * 10
+
+
+def _valid_keywords(keywords) -> bool:
+    return (isinstance(keywords, (list, tuple)) and len(keywords) == 3
+            and all(_is_english(k) and len(k) <= 100 for k in keywords))
+
+
+def _parse_keywords(text: str) -> List[str]:
+    """解析 catch_hot_key_words 返回的元组字符串"""
+    return [str(k).strip() for k in ast.literal_eval(text.strip())]
+
+
+def _parse_json_object(text: str) -> dict:
+    data = json.loads(_JSON_FENCE.sub("", text))
+    if not isinstance(data, dict):
+        raise ValueError("返回结果不是JSON对象")
+    return data
+
+
+def _is_json_object(text: str) -> bool:
+    """合并调用结果的缓存校验：能解析为JSON对象"""
+    try:
+        _parse_json_object(text)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def _enrich_query(title: str, content: str, source_lang: str, include_content: bool = True) -> str:
+    """include_content为False时（长文单独分段翻译）不要求模型输出正文译文"""
+    if not title or not content:
+        raise ValueError("title/content returned None, which is not allowed")
+    target = "英文" if source_lang == "zh" else "中文"
+    if not include_content:
+        return f"""
+            你是一位专业的海洋航运业新闻编辑，请根据以下新闻完成标题翻译、摘要和关键字提取。
+
+            ## 新闻标题
+            {title}
+
+            ## 新闻内容
+            {content}
+
+            ## 任务
+            1. translated_title：将新闻标题翻译为{target}新闻标题，仅包含标题本身，不要出现"标题是"、"翻译是"类似的表述。
+            2. abstract_cn：纯中文摘要，100字左右，客观中立，可直接作为新闻摘要，认真校对原文中出现的公司名称，不要混淆。
+            3. abstract_en：将abstract_cn翻译为英文，保持格式一致。
+            4. keywords：三个航运相关的英文关键字。
+
+            ## 输出
+            只输出一个JSON对象，不要输出其他内容，格式如下：
+            {{"translated_title": "...", "abstract_cn": "...", "abstract_en": "...",
+              "keywords": ["Containers", "Singapore", "Safety"]}}
+    """
+    return f"""
+            你是一位专业的海洋航运业新闻编辑，请根据以下新闻完成翻译、摘要和关键字提取。
+
+            ## 新闻标题
+            {title}
+
+            ## 新闻内容
+            {content}
+
+            ## 任务
+            1. translated_title：将新闻标题翻译为{target}新闻标题，仅包含标题本身，不要出现"标题是"、"翻译是"类似的表述。
+            2. translated_content：将新闻内容完整翻译为{target}新闻内容，仅包含正文本身，不要出现"翻译是"类似的表述。
+            3. abstract_cn：纯中文摘要，100字左右，客观中立，可直接作为新闻摘要，认真校对原文中出现的公司名称，不要混淆。
+            4. abstract_en：将abstract_cn翻译为英文，保持格式一致。
+            5. keywords：三个航运相关的英文关键字。
+
+            ## 输出
+            只输出一个JSON对象，不要输出其他内容，格式如下：
+            {{"translated_title": "...", "translated_content": "...", "abstract_cn": "...", "abstract_en": "...",
+              "keywords": ["Containers", "Singapore", "Safety"]}}
+    """
+
+
+def _complete_enrichment(data: dict, title: str, content: str, source_lang: str) -> Dict[str, object]:
+    """逐字段校验合并调用的结果，校验不通过的字段用对应的单项函数补齐"""
+    is_target = _is_english if source_lang == "zh" else _is_chinese
+    fallback = []
+    translated_title = data.get("translated_title")
+    if not is_target(translated_title):
+        fallback.append("translated_title")
+        translated_title = translate_title(title, source_lang)
+    translated_content = data.get("translated_content")
+    if not _covers(content, translated_content, source_lang):
+        fallback.append("translated_content")
+        translated_content = translate_content(content, source_lang)
+
+    if source_lang == "zh":
+        row = {"detail_title": translated_title, "detail_title_cn": title,
+               "detail_contents": translated_content, "detail_contents_cn": content}
+    else:
+        row = {"detail_title": title, "detail_title_cn": translated_title,
+               "detail_contents": content, "detail_contents_cn": translated_content}
+
+    abstract_cn = data.get("abstract_cn")
+    if not _is_chinese(abstract_cn):
+        fallback.append("abstract_cn")
+        abstract_cn = for_simple_analyze_report(row["detail_contents"])
+    abstract_en = data.get("abstract_en")
+    if "abstract_cn" in fallback or not _is_english(abstract_en):
+        fallback.append("abstract_en")
+        abstract_en = report_for_en(abstract_cn)
+    keywords = data.get("keywords")
+    if not _valid_keywords(keywords):
+        fallback.append("keywords")
+        keywords = _parse_keywords(catch_hot_key_words(row["detail_contents"], row["detail_title"]))
+
+    if fallback:
+        logger.info(f"enrich_article 校验未通过、已逐项补齐的字段: {fallback}")
+    row.update(abstract_cn=abstract_cn, abstract=abstract_en,
+               keyword1=keywords[0], keyword2=keywords[1], keyword3=keywords[2])
+    return row
+
+
+def enrich_article(title: str, content: str, source_lang: str) -> Dict[str, object]:
+    """
+    一次调用完成一篇文章的标题翻译、正文翻译、中英文摘要和三个英文关键字
+    - 要求模型返回JSON对象并逐字段校验（非空、语言正确、正文译文长度与原文相称、关键字为3个英文词）
+    - 只有校验不通过的字段才回退到对应的单项函数（translate_title / translate_content /
+      for_simple_analyze_report / report_for_en / catch_hot_key_words）；合并调用本身失败（限流、
+      预算用尽、内容审核拒绝等）时直接抛出，不逐项补齐
+    - 长文（超过 LLM_CHUNK_THRESHOLD_TOKENS）的正文不放进合并调用，改为 translate_content_chunked 分段翻译
+    :param title: 原文标题
+    :param content: 原文正文
+    :param source_lang: 原文语言，zh 或 en
+    :return: 入库字段 detail_title / detail_title_cn / detail_contents / detail_contents_cn /
+             abstract_cn / abstract / keyword1~3
+    """
+    long_content = _is_long(content)
+    query = _enrich_query(title, content, source_lang, include_content=not long_content)
+    logger.info(f"文章翻译、摘要、关键字合并生成中...")
+    # 调用本身的故障（限流、预算用尽、内容审核等）直接抛出，只有返回结果无法解析时才逐项补齐
+    text = chat(query, response_format={"type": "json_object"}, validate=_is_json_object)
+    try:
+        data = _parse_json_object(text)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"enrich_article 合并调用结果无法解析, 全部字段改为逐项生成: {e}")
+        data = {}
+    if long_content:
+        data["translated_content"] = translate_content_chunked(content, source_lang)
+    return _complete_enrichment(data, title, content, source_lang)
+
+
+async def enrich_article_async(title: str, content: str, source_lang: str) -> Dict[str, object]:
+    """
+    enrich_article 的协程版本：合并调用走自适应并发的异步客户端，长文的分段翻译与合并调用同时进行，
+    校验不通过时的逐项补齐在线程池中执行，不阻塞事件循环
+    """
+    long_content = _is_long(content)
+    query = _enrich_query(title, content, source_lang, include_content=not long_content)
+
+    async def merged():
+        logger.info(f"文章翻译、摘要、关键字合并生成中...")
+        # 过载、预算用尽、内容审核拒绝等调用故障直接抛出，不逐项补齐，避免把一次请求放大成五次同步调用
+        text = await get_async_llm().chat(query, response_format={"type": "json_object"},
+                                          stage="enrich_article", validate=_is_json_object)
+        try:
+            return _parse_json_object(text)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"enrich_article_async 合并调用结果无法解析, 全部字段改为逐项生成: {e}")
+            return {}
+
+    if long_content:
+        data, translated_content = await asyncio.gather(merged(), translate_content_chunked_async(content, source_lang))
+        data["translated_content"] = translated_content
+    else:
+        data = await merged()
+    loop = asyncio.get_running_loop()
+    # 复制上下文，线程池中的补齐调用也记到当前文章名下
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, context.run, _complete_enrichment, data, title, content, source_lang)
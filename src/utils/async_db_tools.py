@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.settings.config import settings
+from src.utils.db_metrics import get_db_metrics, instrumented_pool_class
+from src.utils.db_tools import (BulkWriteResult, DatabaseManager, _claim_lease_statements, _claim_params,
+                                _claim_select_statement, _claimed_items, _group_by_columns,
+                                _insert_ignore_statement, _pool_options, _set_autocommit, _update_statements)
+
+# 同步驱动 -> asyncio驱动
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# asyncpg不做隐式类型转换，这些类型的字段传入字符串时先转换为Python对象
+_STRING_PARSERS = {
+    "date": lambda value: datetime.date.fromisoformat(value[:10]),
+    "timestamp without time zone": datetime.datetime.fromisoformat,
+    "timestamp with time zone": datetime.datetime.fromisoformat,
+}
+
+
+def _parse_strings(rows: List[Dict[str, Any]], column_types: Dict[str, str]) -> List[Dict[str, Any]]:
+    """把日期/时间字段中的字符串转换为 date / datetime，空字符串转换为NULL"""
+    parsers = {c: _STRING_PARSERS[t] for c, t in column_types.items() if t in _STRING_PARSERS}
+    if not parsers:
+        return rows
+    return [{c: (parsers[c](v) if v else None) if c in parsers and isinstance(v, str) else v
+             for c, v in row.items()} for row in rows]
+
+
+class AsyncDatabaseManager:
+    """
+    基于SQLAlchemy asyncio扩展的数据库访问，与DatabaseManager共用连接配置和SQL构造
+    - PostgreSQL使用asyncpg，OceanBase使用aiomysql，连接池参数与同步引擎相同
+    - 引擎在第一次使用时创建；asyncio连接绑定创建它的事件循环，跨事件循环请通过 get_async_db() 获取
+    - asyncpg不做隐式类型转换：批量写入前按表结构把日期/时间字符串转换为 date / datetime，
+      批量UPDATE的VALUES参数按字段类型显式CAST
+    用法：
+        async def main():
+            db = get_async_db()
+            try:
+                result = await db.bulk_insert(table_name, rows)
+            finally:
+                await db.dispose()  # 事件循环结束前释放连接
+    """
+
+    def __init__(self, database_url: Optional[str] = None):
+        self._database_url = database_url
+        self._engine: Optional[AsyncEngine] = None
+        self._column_types: Dict[str, Dict[str, str]] = {}
+
+    def _get_database_url(self) -> str:
+        url = make_url(self._database_url or DatabaseManager()._get_database_url())
+        backend = url.get_backend_name()
+        if backend not in _ASYNC_DRIVERS:
+            raise ValueError(f"不支持的异步数据库类型: {backend}")
+        return url.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """异步引擎（第一次访问时创建）"""
+        if self._engine is None:
+            options = _pool_options()
+            if settings.DB_METRICS_ENABLED:
+                # 与同步引擎一样统计获取连接的等待耗时和超时次数
+                options["poolclass"] = instrumented_pool_class("async", AsyncAdaptedQueuePool)
+            if settings.DATABASE_TYPE.lower() == "oceanbase":
+                options["connect_args"] = {"charset": "utf8mb4", "autocommit": True}
+            self._engine = create_async_engine(self._get_database_url(), **options)
+            if settings.DB_METRICS_ENABLED:
+                get_db_metrics().instrument(self._engine.sync_engine, "async")
+            logger.info(f"{settings.DATABASE_TYPE.upper()}异步数据库连接池初始化成功")
+        return self._engine
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """批量写入使用的事务，语义同 DatabaseManager._transaction（OceanBase事务期间关闭autocommit）"""
+        oceanbase = settings.DATABASE_TYPE.lower() == "oceanbase"
+        async with self.engine.connect() as conn:
+            if oceanbase:
+                await conn.run_sync(_set_autocommit, False)
+            try:
+                async with conn.begin():
+                    yield conn
+            finally:
+                if oceanbase and not conn.invalidated:
+                    await conn.run_sync(_set_autocommit, True)
+
+    async def _get_column_types(self, conn, table_name: str) -> Dict[str, str]:
+        """PostgreSQL表各字段的类型名（不含长度等修饰），每张表只查询一次；其他数据库返回空字典"""
+        if conn.dialect.name != "postgresql":
+            return {}
+        column_types = self._column_types.get(table_name)
+        if column_types is None:
+            rows = (await conn.execute(text("""
+                SELECT attname, format_type(atttypid, NULL) FROM pg_attribute
+                WHERE attrelid = CAST(CAST(:table_name AS TEXT) AS regclass) AND attnum > 0 AND NOT attisdropped
+            """), {"table_name": table_name})).fetchall()
+            column_types = self._column_types[table_name] = {row[0]: row[1] for row in rows}
+        return column_types
+
+    async def bulk_insert(self, table_name: str, records: List[Dict[str, Any]],
+                          conflict_key: str = "article_id", chunk_size: Optional[int] = None) -> BulkWriteResult:
+        """批量插入，主键冲突的记录跳过，语义同 DatabaseManager.bulk_insert"""
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        result = BulkWriteResult()
+        async with self._transaction() as conn:
+            records = _parse_strings(records, await self._get_column_types(conn, table_name))
+            for columns, rows in _group_by_columns(records).items():
+                stmt = _insert_ignore_statement(conn.dialect.name, table_name, list(columns), conflict_key)
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    cursor = await conn.execute(stmt.values(chunk))
+                    inserted = len(cursor.fetchall()) if cursor.returns_rows else max(cursor.rowcount, 0)
+                    result += BulkWriteResult(inserted, len(chunk) - inserted)
+        return result
+
+    async def bulk_update(self, table_name: str, records: List[Dict[str, Any]],
+                          key: str = "article_id", chunk_size: Optional[int] = None) -> int:
+        """按主键批量更新，语义同 DatabaseManager.bulk_update"""
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        updated = 0
+        async with self._transaction() as conn:
+            column_types = await self._get_column_types(conn, table_name)
+            records = _parse_strings(records, column_types)
+            for columns, rows in _group_by_columns(records).items():
+                for stmt, params in _update_statements(conn.dialect.name, table_name, columns, rows,
+                                                       key, chunk_size, column_types):
+                    updated += max((await conn.execute(stmt, params)).rowcount, 0)
+        return updated
+
+    async def delete_by_keys(self, table_name: str, keys: List[Any], key: str = "article_id",
+                             chunk_size: Optional[int] = None) -> int:
+        """
+        按主键批量删除，每个分块一条 DELETE ... WHERE key IN (...)
+        :return: 删除的行数
+        """
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        deleted = 0
+        async with self._transaction() as conn:
+            for start in range(0, len(keys), chunk_size):
+                params = {f"key_{i}": k for i, k in enumerate(keys[start:start + chunk_size])}
+                stmt = text(f"DELETE FROM {table_name} WHERE {key} IN ({', '.join(f':{p}' for p in params)})")
+                deleted += max((await conn.execute(stmt, params)).rowcount, 0)
+        return deleted
+
+    async def claim_untranslated(self, table_name: str, limit: int = None, lease_seconds: int = None,
+                                 worker_id: str = None) -> List[dict]:
+        """
+        原子地领取一批未翻译的条目，多个worker并发领取时互不重叠
+        - SELECT ... FOR UPDATE SKIP LOCKED 跳过其他事务正在领取的行
+        - 领取后写入 claimed_by / claimed_at 租约，租约未过期的行不会被再次领取；
+          worker异常退出时租约过期后自动重新可领
+        - 只返回本次确实写入了自己租约的行（SQL见 db_tools._claim_lease_statements）
+        :param table_name: 表名
+        :param limit: 每次最多领取条数，默认 TRANSLATE_CLAIM_BATCH
+        :param lease_seconds: 租约时长(秒)，默认 TRANSLATE_CLAIM_LEASE
+        :param worker_id: 领取者标识，默认 主机名:进程号
+        :return: 条目列表，英文原文带 detail_title / detail_contents，中文原文带 detail_title_cn / detail_contents_cn
+        """
+        claim = _claim_params(limit, lease_seconds, worker_id)
+        async with self.engine.begin() as conn:
+            rows = (await conn.execute(_claim_select_statement(table_name),
+                                       {'expired_before': claim['expired_before'], 'limit': claim['limit']})).fetchall()
+            article_ids = [row[0] for row in rows]
+            if not article_ids:
+                return []
+            update, select, params = _claim_lease_statements(table_name, article_ids, claim)
+            await conn.execute(update, params)
+            rows = (await conn.execute(select, params)).fetchall()
+
+        claimed = _claimed_items(rows)
+        logger.info(f"{claim['worker_id']} 领取了 {len(claimed)} 条未翻译条目")
+        return claimed
+
+    async def dispose(self):
+        """释放所有数据库连接"""
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+            logger.info("异步数据库连接池已释放")
+
+
+_async_dbs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncDatabaseManager]" = weakref.WeakKeyDictionary()
+
+
+def get_async_db() -> AsyncDatabaseManager:
+    """当前事件循环共享的异步数据库管理器（必须在事件循环中调用）"""
+    loop = asyncio.get_running_loop()
+    db = _async_dbs.get(loop)
+    if db is None:
+        db = _async_dbs[loop] = AsyncDatabaseManager()
+    return db
@@ -0,0 +1,160 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+from fake_useragent import UserAgent
+from loguru import logger
+from lxml import html
+
+from src.settings.config import settings
+from src.utils.fetch_strategy import get_domain
+from src.utils.rate_limiter import get_rate_limiter
+from src.utils.html_archive import archive_html
+
+ua = UserAgent()
+
+
+@dataclass
+class FetchResult:
+    """单个URL的抓取结果"""
+    url: str
+    status: int = 0
+    html: Optional[str] = None
+    parse_html: Any = None
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.parse_html is not None
+
+
+class AsyncFetcher:
+    """
+    基于asyncio的并发抓取引擎
+    - 同一个ClientSession共享连接池，开启HTTP keep-alive
+    - 通过limit_per_host限制单个站点的并发连接数，避免对同一站点瞬时压力过大
+    - 每个请求独立超时，单个慢页面不会拖住整批请求
+    用法：
+        async with AsyncFetcher() as fetcher:
+            async for result in fetcher.fetch_iter(urls):
+                ...
+    """
+
+    def __init__(self,
+                 max_connections: int = None,
+                 per_host_limit: int = None,
+                 timeout: float = None,
+                 max_retries: int = 1,
+                 headers: Optional[Dict[str, str]] = None,
+                 archive: Optional[bool] = None):
+        self.max_connections = max_connections or settings.FETCH_MAX_CONNECTIONS
+        self.per_host_limit = per_host_limit or settings.FETCH_PER_HOST_LIMIT
+        self.timeout = timeout or settings.REQUEST_TIMEOUT
+        self.max_retries = max(1, max_retries)
+        self.headers = headers
+        # 是否归档原始HTML，默认取 HTML_ARCHIVE_ENABLED
+        self.archive = settings.HTML_ARCHIVE_ENABLED if archive is None else archive
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """创建共享连接池"""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.per_host_limit,
+            keepalive_timeout=settings.FETCH_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers or {
+                'User-Agent': ua.random,
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+            },
+        )
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url: str) -> FetchResult:
+        """抓取并解析单个URL，失败时返回带error的结果而不是抛出异常"""
+        if self._session is None:
+            raise RuntimeError("AsyncFetcher未打开，请在 async with 中使用")
+
+        loop = asyncio.get_running_loop()
+        limiter = get_rate_limiter()
+        domain = get_domain(url)
+        result = FetchResult(url=url)
+        for attempt in range(self.max_retries):
+            start = loop.time()
+            try:
+                await limiter.acquire_async(domain)
+                async with self._session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    result.status = response.status
+                    limiter.observe(domain, response.status, response.headers)
+                    response.raise_for_status()
+                    text = await response.text(errors="replace")
+                result.html = text
+                result.parse_html = html.fromstring(text)
+                if self.archive:
+                    await loop.run_in_executor(None, archive_html, url, text, 'http', True)
+                result.error = None
+                result.elapsed = loop.time() - start
+                return result
+            except Exception as e:
+                result.elapsed = loop.time() - start
+                result.error = f"{type(e).__name__}: {e}"
+                logger.warning(f"第{attempt + 1}次抓取失败: {url}, 错误: {result.error}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(attempt + 1)
+        logger.error(f"Error fetching {url}: {result.error}")
+        return result
+
+    async def fetch_iter(self, urls: Iterable[str]):
+        """并发抓取一批URL，按完成顺序逐个产出FetchResult"""
+        tasks = [asyncio.ensure_future(self.fetch(url)) for url in dict.fromkeys(urls)]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+async def _fetch_all(urls: List[str], callback: Optional[Callable[[FetchResult], Any]], **fetcher_kwargs) -> List[FetchResult]:
+    results = []
+    async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+        async for result in fetcher.fetch_iter(urls):
+            if callback is not None:
+                callback(result)
+            results.append(result)
+    return results
+
+
+def fetch_all(urls: Iterable[str], callback: Optional[Callable[[FetchResult], Any]] = None, **fetcher_kwargs) -> List[FetchResult]:
+    """
+    同步入口，供Celery任务直接调用
+    :param urls: 待抓取URL列表
+    :param callback: 每个页面完成时的回调，可用于边抓取边解析
+    :param fetcher_kwargs: 透传给AsyncFetcher的参数
+    :return: 按完成顺序排列的FetchResult列表
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+    return asyncio.run(_fetch_all(urls, callback, **fetcher_kwargs))
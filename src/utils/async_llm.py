@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import sys
+import time
+import weakref
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI
+
+from src.settings.config import settings
+from src.utils.llm_cache import cache_key, get_llm_cache
+from src.utils.llm_usage import check_budget, get_usage_ledger
+from src.utils.rate_limiter import RateLimiter, credential_key, get_rate_limiter, parse_retry_after
+
+LLM_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+# 同一个API Key的所有worker共用一个限流桶
+llm_limiter_key = credential_key("llm", settings.OPENAI_API_KEY)
+# 本进程学到的各模型并发上限，每次任务新建事件循环时从这里继续，不必重新爬升
+_learned_limits: Dict[str, float] = {}
+
+
+class LLMOverloadedError(Exception):
+    """接口持续返回429/5xx，重试次数用完"""
+
+
+class AdaptiveConcurrency:
+    """
+    单个模型的自适应并发上限（AIMD）
+    - 请求成功且延迟、错误率正常时加性增长：每个并发窗口（约limit次成功）上限+1，直到max_limit
+    - 收到429/5xx/超时时乘性下降：上限乘以 LLM_AIMD_BACKOFF，并按Retry-After暂停发出新请求；
+      同一延迟窗口内的多次失败只下降一次，避免并发中的请求一起失败时把上限压到底
+    - 延迟变慢（短期均值超过长期均值的 LLM_LATENCY_TOLERANCE 倍）或错误率偏高时保持不变
+    """
+
+    def __init__(self, model: str, max_limit: int, initial: Optional[float] = None, min_limit: int = 1):
+        self.model = model
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = float(min(self.max_limit, initial or settings.LLM_INITIAL_CONCURRENCY))
+        self.in_flight = 0
+        self.backoff = settings.LLM_AIMD_BACKOFF
+        self.latency_tolerance = settings.LLM_LATENCY_TOLERANCE
+        self.latency_short: Optional[float] = None
+        self.latency_long: Optional[float] = None
+        self.error_rate = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self):
+        """等待到有空闲的并发名额"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pause = self._paused_until - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            await self._changed.wait()
+
+    def release(self):
+        self.in_flight -= 1
+        self._notify()
+
+    def _healthy(self) -> bool:
+        if self.error_rate > 0.1:
+            return False
+        if self.latency_long is None:
+            return True
+        return self.latency_short <= self.latency_long * self.latency_tolerance
+
+    def on_success(self, latency: float):
+        self.error_rate *= 0.9
+        if self.latency_long is None:
+            self.latency_short = self.latency_long = latency
+        else:
+            self.latency_short = self.latency_short * 0.7 + latency * 0.3
+            self.latency_long = self.latency_long * 0.95 + latency * 0.05
+        if self._healthy() and self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._notify()
+
+    def on_error(self):
+        """非限流类错误（参数错误、内容审核等）只计入错误率"""
+        self.error_rate = self.error_rate * 0.9 + 0.1
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.error_rate = self.error_rate * 0.9 + 0.1
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now - self._last_decrease < (self.latency_short or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        logger.warning(f"LLM并发降为 {int(self.limit)}: {self.model}"
+                       + (f", 暂停 {retry_after:.1f} 秒" if retry_after else ""))
+
+    def stats(self) -> dict:
+        return {"limit": int(self.limit), "in_flight": self.in_flight, "max_limit": self.max_limit,
+                "latency": round(self.latency_short or 0.0, 3), "error_rate": round(self.error_rate, 4)}
+
+
+class AsyncLLMClient:
+    """
+    基于AsyncOpenAI的异步大模型客户端，参数和返回值与 ai_tools.chat 相同
+    - 每个模型一个 AdaptiveConcurrency，在途请求数随延迟和错误率自动调整，上限为
+      LLM_MAX_CONCURRENCY，单独的上限通过 LLM_CONCURRENCY_OVERRIDES 配置，例如 "qwen-max=32"
+    - 与同步chat共用响应缓存、调用账本、当日token预算和跨worker的令牌桶（llm_limiter_key）；
+      传入 validate 时只缓存校验通过的结果
+    - 429/5xx/超时按Retry-After退避后重试，最多 LLM_MAX_RETRIES 次；SDK自带的重试关闭，避免掩盖限流信号
+    用法：
+        async def main():
+            llm = get_async_llm()
+            text = await llm.chat(prompt)
+    """
+
+    def __init__(self):
+        self._client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=LLM_BASE_URL, max_retries=0)
+        self.max_retries = max(1, settings.LLM_MAX_RETRIES)
+        self.default_limit = settings.LLM_MAX_CONCURRENCY
+        self.overrides = RateLimiter._parse_overrides(settings.LLM_CONCURRENCY_OVERRIDES)
+        self._models: Dict[str, AdaptiveConcurrency] = {}
+
+    def concurrency(self, model: str) -> AdaptiveConcurrency:
+        limiter = self._models.get(model)
+        if limiter is None:
+            limiter = self._models[model] = AdaptiveConcurrency(
+                model, int(self.overrides.get(model, self.default_limit)), initial=_learned_limits.get(model))
+        return limiter
+
+    async def chat(self, system_prompt: str = "", query: str = "", model: str = "qwen-max",
+                   response_format: Optional[dict] = None, use_cache: bool = True,
+                   stage: Optional[str] = None, priority: str = "normal",
+                   validate: Optional[Callable[[str], bool]] = None) -> str:
+        stage = stage or sys._getframe(1).f_code.co_name
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.append({"role": "system", "content": query})
+        temperature = 0.3
+        loop = asyncio.get_running_loop()
+        cache = get_llm_cache()
+        ledger = get_usage_ledger()
+        # 账本攒满时会同步写出，放到线程池中执行
+        record = partial(self._record, loop, ledger, model, stage)
+        key = cache_key(model, messages, temperature, response_format=response_format)
+        if use_cache:
+            cached = await loop.run_in_executor(None, cache.get, key)
+            if cached is not None and (validate is None or validate(cached)):
+                logger.info(f'LLM缓存命中: {key[:12]}')
+                await record(cached=True)
+                return cached
+            if cached is not None:
+                logger.warning(f'LLM缓存结果未通过校验, 删除后重新请求: {key[:12]}')
+                await loop.run_in_executor(None, cache.delete, key)
+        await loop.run_in_executor(None, check_budget, priority)
+
+        extra = {"response_format": response_format} if response_format else {}
+        concurrency = self.concurrency(model)
+        rate_limiter = get_rate_limiter()
+        for attempt in range(self.max_retries):
+            await concurrency.acquire()
+            start = time.monotonic()
+            try:
+                await rate_limiter.acquire_async(llm_limiter_key)
+                completion = await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    **extra
+                )
+            except (APIStatusError, APITimeoutError, APIConnectionError) as e:
+                status = getattr(e, "status_code", None)
+                await record(latency=time.monotonic() - start, status="rate_limited" if status == 429 else "error")
+                if status is not None and status != 429 and status < 500:
+                    concurrency.on_error()
+                    logger.error(f"async chat： {e}")
+                    raise
+                retry_after = parse_retry_after(e.response.headers.get('Retry-After')) if status else None
+                concurrency.on_overload(retry_after)
+                if status == 429:
+                    rate_limiter.penalize(llm_limiter_key, retry_after)
+                logger.warning(f"async chat 第{attempt + 1}次请求失败: {model}, {type(e).__name__}: {e}")
+                if attempt == self.max_retries - 1:
+                    raise LLMOverloadedError(f"{model} 重试 {self.max_retries} 次仍失败: {e}") from e
+                if retry_after is None:
+                    await asyncio.sleep(attempt + 1)
+                continue
+            except Exception as e:
+                await record(latency=time.monotonic() - start, status="error")
+                concurrency.on_error()
+                logger.error(f"async chat： {e}")
+                raise
+            finally:
+                concurrency.release()
+            latency = time.monotonic() - start
+            concurrency.on_success(latency)
+            logger.info(f'usage_token: {completion.usage.total_tokens}')
+            await record(completion.usage.prompt_tokens, completion.usage.completion_tokens, latency)
+            result = completion.choices[0].message.content
+            if use_cache and (validate is None or validate(result)):
+                await loop.run_in_executor(None, cache.set, key, result)
+            return result
+
+    @staticmethod
+    async def _record(loop, ledger, model, stage, *args, **kwargs):
+        # run_in_executor不传递contextvars，复制上下文让账本拿到当前文章
+        context = contextvars.copy_context()
+        await loop.run_in_executor(None, partial(context.run, ledger.record, model, stage, *args, **kwargs))
+
+    def stats(self) -> Dict[str, dict]:
+        """各模型当前的并发上限、在途请求数、延迟和错误率"""
+        return {model: limiter.stats() for model, limiter in self._models.items()}
+
+    async def close(self):
+        """记录学到的并发上限并关闭连接，事件循环结束前调用"""
+        _learned_limits.update({model: limiter.limit for model, limiter in self._models.items()})
+        await self._client.close()
+
+
+_async_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncLLMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_llm() -> AsyncLLMClient:
+    """当前事件循环共享的异步大模型客户端（必须在事件循环中调用）"""
+    loop = asyncio.get_running_loop()
+    llm = _async_llms.get(loop)
+    if llm is None:
+        llm = _async_llms[loop] = AsyncLLMClient()
+    return llm
@@ -1,29 +1,31 @@
-import socket
+import os
+import tempfile
+from contextlib import contextmanager
 from loguru import logger
-from DrissionPage import ChromiumOptions
-from multiprocessing import Lock
+from DrissionPage import ChromiumOptions, ChromiumPage
 import time
-import random
-from threading import Lock
-import socket
+from threading import Lock, Condition
+
+from celery.signals import worker_process_shutdown
+from src.settings.config import settings
+from src.utils.port_lease import get_port_registry
 
-# 全局端口锁和已分配端口集合
-port_lock = Lock()
 class ChromiumOptionsManager:
-    """ChromiumOptions 单例管理器，确保所有实例使用相同的配置"""
+    """
+    ChromiumOptions 单例管理器，确保所有实例使用相同的配置
+    单例本身不占用端口：每个浏览器启动时由浏览器池单独领取端口租约，退出时释放
+    """
     _instance = None
     _lock = Lock()
     _options = None
-    _port = None
     
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
-                    cls._instance._port = cls.get_available_port()  # 为实例分配固定端口
                     cls._instance._init_options()
-                    logger.info(f"ChromiumOptions单例初始化完成，使用固定端口: {cls._instance._port}")
+                    logger.info("ChromiumOptions单例初始化完成")
         return cls._instance
     
     def _init_options(self):
@@ -39,54 +41,21 @@ class ChromiumOptionsManager:
             self._options.set_argument('--disable-gpu')  # 减少GPU内存使用
             # 可以根据需要添加更多配置
 
+    @staticmethod
     def get_available_port():
-        """获取可用的端口号（线程安全版本）"""
-        with port_lock:
-            # 尝试多次以避免竞态条件
-            for _ in range(3):  # 最多尝试3次
-                port = random.randint(9223, 9323)
-                logger.info(f"尝试端口: {port}")
-
-                # 检查端口是否真正可用
-                try:
-                    pre_port = None
-                    for i in range(2):
-                        # 初始化socket
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(0.1)  # 设置超时避免长时间阻塞
-                        try:
-                            # 3秒后再检查一次是否连接占用.
-                            sock.bind(('localhost', port))
-                            sock.close()
-                            time.sleep(3)
-                            if i == 1 and pre_port == port:
-                                return port
-                            else:
-                                pre_port = port
-
-                        except Exception as e:
-                            logger.error(f"端口 {port} 绑定失败: {str(e)}")
-                            continue
-                        finally:
-                            try:
-                                if sock and not sock._closed:  # 只有在socket未关闭时才关闭
-                                    sock.close()
-                            except:
-                                pass
-                except OSError as e:
-                    # 端口已被占用，重新随机端口
-                    continue
-                finally:
-                    try:
-                        sock.close()
-                    except:
-                        pass
-        raise RuntimeError("No available ports found after cleanup")
+        """获取可用的端口号（跨进程安全，由端口租约登记器分配）"""
+        return get_port_registry().acquire()
+
+    @staticmethod
+    def release_port(port):
+        """浏览器退出后释放端口租约"""
+        if port is not None:
+            get_port_registry().release(port)
     
     def get_options(self, port=None):
         """
         获取配置好的ChromiumOptions实例
-        :param port: 可选端口号，如果提供则设置端口
+        :param port: 浏览器调试端口（由 get_available_port 领取），不提供时不设置端口
         :return: ChromiumOptions实例
         """
         options = self._options.copy() if hasattr(self._options, 'copy') else ChromiumOptions()
@@ -99,13 +68,217 @@ class ChromiumOptionsManager:
         options.set_argument('--disable-gpu')
         options.set_argument('--headless=new')
         
-        # 使用实例的固定端口，除非明确指定其他端口
-        final_port = port if port is not None else self._port
-        if final_port is not None:
-            options.set_local_port(final_port)
+        if port is not None:
+            options.set_local_port(port)
             
         return options
-    
-    def get_port(self):
-        """获取当前单例实例使用的固定端口"""
-        return self._port
+
+
+class _PooledBrowser:
+    """池中的单个浏览器进程及其使用统计"""
+
+    def __init__(self, page: ChromiumPage, port: int):
+        self.page = page
+        self.port = port
+        self.active_tabs = 0
+        self.pages_served = 0
+        self.retiring = False
+        self.created_at = time.time()
+
+    def is_alive(self) -> bool:
+        try:
+            return bool(self.page.states.is_alive)
+        except Exception:
+            return False
+
+
+class ChromiumBrowserPool:
+    """
+    常驻浏览器池（每个worker进程一个单例）
+    - 每个进程最多保持 BROWSER_POOL_SIZE 个浏览器，启动后复用，不再每个URL都启动/退出浏览器
+    - 通过 checkout() 借出标签页，用完自动归还（关闭标签页）
+    - 每个浏览器同时打开的标签页数不超过 BROWSER_MAX_TABS
+    - 每个浏览器累计服务 BROWSER_MAX_PAGES 个页面后回收重启，防止内存泄漏
+    - 借出前做健康检查，已崩溃的浏览器直接丢弃
+    """
+    _instance = None
+    _pid = None
+    _lock = Lock()
+
+    def __new__(cls):
+        # fork后子进程不能复用父进程的浏览器，按pid重建单例
+        if cls._instance is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._instance is None or cls._pid != os.getpid():
+                    instance = super().__new__(cls)
+                    instance._init_pool()
+                    cls._instance = instance
+                    cls._pid = os.getpid()
+        return cls._instance
+
+    def _init_pool(self):
+        self._options_manager = ChromiumOptionsManager()
+        self._browsers = []
+        # 已预留名额、正在锁外启动的浏览器数
+        self._launching = 0
+        self._cond = Condition(Lock())
+        self.size = settings.BROWSER_POOL_SIZE
+        self.max_tabs = settings.BROWSER_MAX_TABS
+        self.max_pages = settings.BROWSER_MAX_PAGES
+        self.checkout_timeout = settings.BROWSER_CHECKOUT_TIMEOUT
+        # 清理已退出进程遗留的端口租约
+        get_port_registry().cleanup_stale()
+
+    def _launch(self) -> _PooledBrowser:
+        """启动一个新的浏览器进程"""
+        port = ChromiumOptionsManager.get_available_port()
+        options = self._options_manager.get_options(port=port)
+        # 每个端口独立的用户数据目录，避免多个浏览器争用同一个profile
+        options.set_user_data_path(os.path.join(tempfile.gettempdir(), 'chromium_pool', str(port)))
+        try:
+            page = ChromiumPage(options)
+        except Exception:
+            ChromiumOptionsManager.release_port(port)
+            raise
+        logger.info(f"浏览器池启动新浏览器, 端口: {port}, pid: {os.getpid()}")
+        return _PooledBrowser(page, port)
+
+    def _detach(self, pooled: _PooledBrowser) -> bool:
+        """把浏览器移出池子（调用方持有锁），返回是否由本次调用移出"""
+        if pooled not in self._browsers:
+            return False
+        self._browsers.remove(pooled)
+        return True
+
+    def _shutdown(self, pooled: _PooledBrowser):
+        """关闭已移出池子的浏览器并释放端口（不持有锁，退出浏览器可能需要数秒）"""
+        try:
+            pooled.page.quit()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: 端口 {pooled.port}, {str(e)}")
+        ChromiumOptionsManager.release_port(pooled.port)
+        logger.info(f"浏览器已回收, 端口: {pooled.port}, 累计页面数: {pooled.pages_served}")
+
+    def _pick(self):
+        """挑选当前标签页最少的浏览器（调用方持有锁）"""
+        candidates = [b for b in self._browsers if not b.retiring and b.active_tabs < self.max_tabs]
+        if candidates:
+            return min(candidates, key=lambda b: b.active_tabs)
+        return None
+
+    def _launch_reserved(self) -> _PooledBrowser:
+        """在锁外启动已预留名额的浏览器，启动完成后加入池子"""
+        try:
+            pooled = self._launch()
+        except Exception:
+            with self._cond:
+                self._launching -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._launching -= 1
+            pooled.active_tabs += 1
+            self._browsers.append(pooled)
+            self._cond.notify_all()
+        return pooled
+
+    def _acquire(self) -> _PooledBrowser:
+        """
+        借出一个浏览器的标签页名额
+        - 锁内只做挑选和计数；启动浏览器先预留名额（_launching），在锁外启动，不阻塞其他线程借还
+        - 借到空闲浏览器时在锁外做健康检查，已崩溃的浏览器丢弃后重新挑选
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                while True:
+                    pooled = self._pick()
+                    # 已有浏览器都满载时，在上限内扩容（正在启动的浏览器也计入上限）
+                    if ((pooled is None or pooled.active_tabs > 0)
+                            and len(self._browsers) + self._launching < self.size):
+                        self._launching += 1
+                        pooled, launch = None, True
+                        break
+                    if pooled is not None:
+                        idle = pooled.active_tabs == 0
+                        pooled.active_tabs += 1
+                        launch = False
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待浏览器标签页超时({self.checkout_timeout}秒)")
+                    self._cond.wait(remaining)
+
+            if launch:
+                return self._launch_reserved()
+            if not idle or pooled.is_alive():
+                return pooled
+            logger.warning(f"浏览器健康检查失败, 丢弃: 端口 {pooled.port}")
+            with self._cond:
+                pooled.active_tabs -= 1
+                pooled.retiring = True
+                dead = pooled.active_tabs <= 0 and self._detach(pooled)
+                self._cond.notify_all()
+            if dead:
+                self._shutdown(pooled)
+
+    def _release(self, pooled: _PooledBrowser):
+        with self._cond:
+            pooled.active_tabs -= 1
+            pooled.pages_served += 1
+            if pooled.pages_served >= self.max_pages:
+                pooled.retiring = True
+            retire = pooled.retiring and pooled.active_tabs <= 0 and self._detach(pooled)
+            self._cond.notify_all()
+        if retire:
+            self._shutdown(pooled)
+
+    @contextmanager
+    def checkout(self):
+        """
+        借出一个标签页，退出上下文时自动关闭标签页并归还浏览器
+        用法：
+            with ChromiumBrowserPool().checkout() as tab:
+                tab.get(url)
+        """
+        pooled = self._acquire()
+        tab = None
+        try:
+            tab = pooled.page.new_tab()
+            yield tab
+        except Exception:
+            # 浏览器进程异常时不再分配新标签页
+            if not pooled.is_alive():
+                pooled.retiring = True
+            raise
+        finally:
+            if tab is not None:
+                try:
+                    tab.close()
+                except Exception as e:
+                    logger.warning(f"关闭标签页失败: {str(e)}")
+            self._release(pooled)
+
+    def close_all(self):
+        """关闭池内所有浏览器"""
+        with self._cond:
+            browsers, self._browsers = self._browsers, []
+        for pooled in browsers:
+            self._shutdown(pooled)
+
+    def stats(self) -> dict:
+        """当前池状态"""
+        with self._cond:
+            return {
+                "browsers": len(self._browsers),
+                "launching": self._launching,
+                "active_tabs": sum(b.active_tabs for b in self._browsers),
+                "pages_served": {b.port: b.pages_served for b in self._browsers},
+            }
+
+
+@worker_process_shutdown.connect
+def _close_browser_pool(**kwargs):
+    """worker子进程退出时关闭本进程的浏览器，避免遗留孤儿Chromium进程"""
+    if ChromiumBrowserPool._instance is not None and ChromiumBrowserPool._pid == os.getpid():
+        ChromiumBrowserPool._instance.close_all()
@@ -4,13 +4,20 @@ PROJECT_ROOT = pathlib.Path(__file__).parent.parent.parent.resolve()
 sys.path.append(str(PROJECT_ROOT))
 
 from loguru import logger
-from src.utils.chromium_manager import ChromiumOptionsManager
-from src.utils.db_tools import std_db
+from src.utils.chromium_manager import ChromiumOptionsManager, ChromiumBrowserPool
+from src.utils.db_tools import std_db, batch_insert_into_table, batch_update_table
+from src.utils.fetch_strategy import HTTP, BROWSER, get_domain, get_strategy_store
+from src.utils.seen_index import SeenIndex
+from src.utils.rate_limiter import get_rate_limiter
+from src.utils.html_archive import archive_html
+from src.utils.extractor import XPathLike
 from src.settings.config import settings
 
 from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread, local
+from typing import Iterable, Optional
+import requests
 from fake_useragent import UserAgent
-from DrissionPage import ChromiumPage
 from lxml import etree
 from sqlalchemy import text
 
@@ -22,114 +29,123 @@ try:
 except ImportError:
     HAS_PSYCOPG2 = False
 
+import datetime
 import time
 ua = UserAgent()
+_http_local = local()
 
 table_name = settings.CRAWL_TABLE_NAME
 
-def update_no_translate_context(table_name, abstract_cn, abstract,
-                                detail_title_cn, detail_contents_cn,
-                                detail_contents, detail_title,
-                                article_id,
-                                keyword1, keyword2, keyword3, is_translated):
-    # 创建一个同步会话对象
-    try:
-        with std_db._scoped_session() as session:
-            # 使用参数化查询来避免 SQL 注入
-            exe_sql = text(f"""
-                UPDATE {table_name}
-                SET
-                    abstract_cn = :abstract_cn,
-                    abstract = :abstract,
-                    detail_title_cn = :detail_title_cn,
-                    detail_contents_cn = :detail_contents_cn,
-                    detail_contents = :detail_contents,
-                    detail_title = :detail_title,
-                    is_translated = :is_translated,
-                    keyword1 = :keyword1,
-                    keyword2 = :keyword2,
-                    keyword3 = :keyword3
-                WHERE
-                    article_id = :article_id
-            """)
-
-            session.execute(exe_sql, {
-                'abstract_cn': abstract_cn,
-                'abstract': abstract,
-                'detail_title_cn': detail_title_cn,
-                'detail_contents_cn': detail_contents_cn,
-                'detail_contents': detail_contents,
-                'detail_title': detail_title,
-                'article_id': article_id,
-                'keyword1': keyword1,
-                'keyword2': keyword2,
-                'keyword3': keyword3,
-                'is_translated': is_translated
-            })
-            logger.info(f"已更新id： {article_id}")
-            session.commit()
-
-    except Exception as e:
-        logger.error(f"{e}, 在更新未翻译上下文时发生错误")
-        raise
-
-def delete_high_risk_data(table_name, article_id):
+class TranslationResultSink:
     """
-    删除指定article_id的数据行。
+    翻译结果的批量写回缓冲
+    - 各翻译线程调用 add() 提交结果，攒够 TRANSLATE_FLUSH_ROWS 条或每隔 TRANSLATE_FLUSH_INTERVAL 秒
+      合并成一次批量UPDATE，减少逐条提交带来的事务和WAL开销
+    - 写回失败的结果保留在缓冲中，下次刷新时重试；close() 时仍失败则抛出异常
+    用法：
+        with TranslationResultSink(table_name) as sink:
+            sink.add(article_id=..., abstract_cn=..., ...)
     """
-    # 创建一个同步会话对象
-    try:
-        with std_db._scoped_session() as session:
-            # 使用参数化查询来避免SQL注入
-            exe_sql = text(f"""
-                DELETE FROM {table_name}
-                WHERE
-                    article_id = :article_id
-            """)
 
-            session.execute(exe_sql, {'article_id': article_id})
-            logger.info(f"已删除高风险数据： {article_id}")
-            session.commit()
+    def __init__(self, table_name, max_rows: int = None, interval: float = None):
+        self.table_name = table_name
+        self.max_rows = max_rows or settings.TRANSLATE_FLUSH_ROWS
+        self.interval = interval or settings.TRANSLATE_FLUSH_INTERVAL
+        self._rows = []
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._stopped = Event()
+        self._timer = Thread(target=self._run, name="translation-sink", daemon=True)
+        self._timer.start()
 
-    except Exception as e:
-        logger.error(f"{e}, 在删除数据时发生错误")
-        raise
+    def __enter__(self):
+        return self
 
-def find_translated(table_name):
-    try:
-        with std_db._scoped_session() as session:
-            # 查询未翻译的条目
-            # 英文条目
-            exe_sql = f"""
-                SELECT detail_title, detail_contents, article_id, detail_url
-                FROM {table_name}
-                WHERE is_translated = 'no'
-                AND detail_title IS NOT NULL;
-            """
-            result = session.execute(text(exe_sql))
-            rows = result.fetchall()
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-            translate_result = [{"detail_title": row[0], "detail_contents": row[1], "article_id": row[2], "detail_url": row[3]}
-             for row in rows]
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
 
-            # 中文条目
-            exe_sql2 = f"""
-                SELECT detail_title_cn, detail_contents_cn, article_id, detail_url
-                FROM {table_name}
-                WHERE is_translated = 'no'
-                AND detail_title_cn IS NOT NULL;
-            """
-            result = session.execute(text(exe_sql2))
-            rows = result.fetchall()
+    def add(self, **row):
+        """提交一条翻译结果（必须包含article_id）"""
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self.flush()
 
-            translate_result_cn = [{"detail_title_cn": row[0], "detail_contents_cn": row[1], "article_id": row[2], "detail_url": row[3]}
-                                   for row in rows]
+    def flush(self) -> int:
+        """把缓冲中的结果写回数据库，返回更新的行数"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                updated = batch_update_table(self.table_name, rows)
+            except Exception as e:
+                logger.error(f"{e}, 批量写回翻译结果失败, {len(rows)} 条结果保留到下次重试")
+                with self._lock:
+                    self._rows[:0] = rows
+                raise
+            logger.info(f"已批量更新 {updated} 条翻译结果: {[row['article_id'] for row in rows]}")
+            return updated
 
-            translate_result.extend(translate_result_cn)
-            return translate_result
-    except Exception as e:
-        logger.error(f"{e}, {e.__traceback__.tb_lineno}")
-        raise
+    def close(self):
+        """停止定时刷新并写回剩余结果"""
+        self._stopped.set()
+        self._timer.join()
+        self.flush()
+
+def purge_quarantined(table_name, retention_seconds: int = None, batch_size: int = None, max_seconds: float = None):
+    """
+    分批删除隔离期已过的高风险文章
+    - 每批 SELECT ... FOR UPDATE SKIP LOCKED 取一批 article_id 后 DELETE 并立即提交，单个事务持锁时间有界
+    - 批与批之间暂停 QUARANTINE_PURGE_PAUSE 秒，给采集和翻译的写入让出锁和IO
+    - 隔离期内的行仍保留在表中，期间重新采集到的同一篇文章按主键冲突跳过，不会作为新数据再次入库
+    :param table_name: 表名
+    :param retention_seconds: 隔离保留秒数，默认 QUARANTINE_RETENTION_SECONDS
+    :param batch_size: 每批删除的行数，默认 QUARANTINE_PURGE_BATCH
+    :param max_seconds: 本次最长运行秒数，默认 QUARANTINE_PURGE_MAX_SECONDS
+    :return: 删除的行数
+    """
+    retention_seconds = retention_seconds or settings.QUARANTINE_RETENTION_SECONDS
+    batch_size = batch_size or settings.QUARANTINE_PURGE_BATCH
+    deadline = time.monotonic() + (max_seconds or settings.QUARANTINE_PURGE_MAX_SECONDS)
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=retention_seconds)
+    deleted = 0
+    while time.monotonic() < deadline:
+        try:
+            with std_db._scoped_session() as session:
+                rows = session.execute(text(f"""
+                    SELECT article_id FROM {table_name}
+                    WHERE quarantined_at < :cutoff
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                """), {'cutoff': cutoff, 'limit': batch_size}).fetchall()
+                if not rows:
+                    session.commit()
+                    break
+                params = {f'id_{i}': row[0] for i, row in enumerate(rows)}
+                session.execute(text(f"""
+                    DELETE FROM {table_name}
+                    WHERE article_id IN ({', '.join(f':{k}' for k in params)})
+                """), params)
+                session.commit()
+        except Exception as e:
+            logger.error(f"{e}, 删除隔离数据时发生错误")
+            raise
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            break
+        time.sleep(settings.QUARANTINE_PURGE_PAUSE)
+    logger.info(f"已删除隔离期满的高风险数据 {deleted} 条")
+    return deleted
 
 def get_primary_key(web_name, res_dict):
     try:
@@ -146,70 +162,119 @@ def get_primary_key(web_name, res_dict):
             logger.error(e)
             return None
 
+def browser_like_headers():
+    """模拟浏览器的请求头，HTTP直连和浏览器标签页共用"""
+    return {
+        'User-Agent': ua.random,
+        'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Referer': 'https://www.google.com/',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'same-origin',
+        'Sec-Fetch-User': '?1',
+        'Upgrade-Insecure-Requests': '1',
+        'Connection': 'keep-alive',
+        'Cache-Control': 'max-age=0'
+    }
+
+def _http_session() -> requests.Session:
+    """线程内复用的requests会话，保持keep-alive连接"""
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _http_local.session = session
+    return session
+
+def validate_html(parse_html, expected_xpaths: Optional[Iterable[XPathLike]] = None) -> bool:
+    """
+    校验页面是否包含站点预期的内容
+    :param parse_html: lxml解析后的页面
+    :param expected_xpaths: 站点预期的XPath列表（字符串或已编译的etree.XPath），全部命中才算有效；
+                            为空时只要求页面有正文
+    """
+    if parse_html is None:
+        return False
+    if not expected_xpaths:
+        return bool(parse_html.xpath('//body//text()[normalize-space()]'))
+    for xpath in expected_xpaths:
+        if not (xpath(parse_html) if isinstance(xpath, etree.XPath) else parse_html.xpath(xpath)):
+            return False
+    return True
+
+def fetch_and_parse_normal(url: str, expected_xpaths: Optional[Iterable[XPathLike]] = None, timeout: float = None):
+    """
+    普通HTTP抓取（不启动浏览器），结果需通过expected_xpaths校验
+    :param url: 目标URL
+    :param expected_xpaths: 站点预期的XPath列表
+    :param timeout: 请求超时时间(秒)
+    :return: 与fetch_and_parse相同结构的字典，抓取失败或校验不通过时返回None
+    """
+    domain = get_domain(url)
+    limiter = get_rate_limiter()
+    try:
+        limiter.acquire(domain)
+        response = _http_session().get(url, headers=browser_like_headers(),
+                                       timeout=timeout or settings.REQUEST_TIMEOUT)
+        limiter.observe(domain, response.status_code, response.headers)
+        response.raise_for_status()
+        html = response.text
+        parse_html = etree.HTML(html) if html else None
+    except Exception as e:
+        logger.info(f"HTTP抓取失败: {url}, 错误: {str(e)}")
+        return None
+    if not validate_html(parse_html, expected_xpaths):
+        logger.info(f"HTTP抓取结果未通过XPath校验: {url}")
+        return None
+    return {"html": html, "parse_html": parse_html, "status": True, "via": HTTP}
+
 def get_with_timeout(url, need_click, chromium_options_manager):
     """
     使用DrissionPage获取页面内容，支持超时和重试
+    浏览器从进程内常驻浏览器池借出标签页，不再每个URL启动一次浏览器
     :param url: 目标URL
     :param need_click: 是否需要点击页面元素
-    :param task_id: 任务唯一标识符
+    :param chromium_options_manager: ChromiumOptions单例管理器（浏览器池基于其配置启动浏览器）
     :return: 包含html和状态的字典
     """
     local_web_status = {'html': None, 'status': False}
-    tab = None
-    page = None
     
     try:
-        headers = {
-            'User-Agent': ua.random,
-            'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Referer': 'https://www.google.com/',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'same-origin',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'max-age=0'
-        }
-        # 使用单例管理器获取配置好的ChromiumOptions
-        co = chromium_options_manager.get_options()
-        
-        page = ChromiumPage(co)
-        tab = page.new_tab()
-        
-        # 设置页面加载超时
-        tab.set.timeouts(page_load=30)
-        
-        # 添加模拟请求头
-        tab.set.headers(headers)
-        tab.get(url=url, retry=0, interval=0)
-        tab.stop_loading()  # 优化点：获取到页面以后 直接停止加载。
+        headers = browser_like_headers()
+        with ChromiumBrowserPool().checkout() as tab:
+            # 设置页面加载超时
+            tab.set.timeouts(page_load=30)
+            
+            # 添加模拟请求头
+            tab.set.headers(headers)
+            get_rate_limiter().acquire(get_domain(url))
+            tab.get(url=url, retry=0, interval=0)
+            tab.stop_loading()  # 优化点：获取到页面以后 直接停止加载。
 
-        # if need_click:
-        #     try:
-        #         get_more_button = tab.ele('x://button[@class="wysiwyg-content__read-more wysiwyg-content__show"]', timeout=3)
-        #         price_btn = tab.ele('x://button[@data-article-type="{C60C0F27-FFBF-40B4-A7CF-DC241D2A2A44}"]', timeout=3)
-        #         ky_date_btn = tab.ele('x://label[@class="postDate__date postDate__date--toggleButton"]', timeout=3)
+            # if need_click:
+            #     try:
+            #         get_more_button = tab.ele('x://button[@class="wysiwyg-content__read-more wysiwyg-content__show"]', timeout=3)
+            #         price_btn = tab.ele('x://button[@data-article-type="{C60C0F27-FFBF-40B4-A7CF-DC241D2A2A44}"]', timeout=3)
+            #         ky_date_btn = tab.ele('x://label[@class="postDate__date postDate__date--toggleButton"]', timeout=3)
 
-        #         if price_btn:
-        #             price_btn.click()
-        #             logger.info("mscargo site 点击了 Customer Advisorie按钮")
-        #             time.sleep(3)
-        #         elif get_more_button:
-        #             get_more_button.click()
-        #             logger.info(f"alja 点击了 read more按钮")
-        #             time.sleep(3)
-        #         elif ky_date_btn:
-        #             ky_date_btn.click()
-        #             logger.info(f"kyodo 点击了 日期按钮")
-        #             time.sleep(3)
-        #         else:
-        #             logger.warning("未找到更多按钮")
-        #     except Exception as e:
-        #         logger.warning(f"点击操作失败: {str(e)}")
-        
-        html = tab.html
+            #         if price_btn:
+            #             price_btn.click()
+            #             logger.info("mscargo site 点击了 Customer Advisorie按钮")
+            #             time.sleep(3)
+            #         elif get_more_button:
+            #             get_more_button.click()
+            #             logger.info(f"alja 点击了 read more按钮")
+            #             time.sleep(3)
+            #         elif ky_date_btn:
+            #             ky_date_btn.click()
+            #             logger.info(f"kyodo 点击了 日期按钮")
+            #             time.sleep(3)
+            #         else:
+            #             logger.warning("未找到更多按钮")
+            #     except Exception as e:
+            #         logger.warning(f"点击操作失败: {str(e)}")
+            
+            html = tab.html
         if html:
             local_web_status['html'] = html
             local_web_status['status'] = True
@@ -218,29 +283,46 @@ def get_with_timeout(url, need_click, chromium_options_manager):
     except Exception as e:
         logger.error(f"爬取失败: {url}, 错误: {str(e)}")
         return local_web_status
-    finally:
-        # 确保在任何情况下都清理浏览器实例和端口
-        try:
-            # 关闭标签页
-            if tab is not None:
-                try:
-                    tab.close()
-                except Exception as e:
-                    logger.warning(f"关闭标签页失败: {str(e)}")
-            
-            # 关闭浏览器页面
-            if page is not None:
-                try:
-                    page.quit()
-                except Exception as e:
-                    logger.warning(f"关闭浏览器页面失败: {str(e)}")
-                    
-        except Exception as e:
-            logger.error(f"清理浏览器实例时发生错误: {str(e)}")
 
-def fetch_and_parse(url: str, need_click: bool = False, max_retries: int = 2, retry_delay: int = 1, timeout: float = 300):
+def fetch_and_parse(url: str, need_click: bool = False, max_retries: int = 2, retry_delay: int = 1, timeout: float = 300,
+                    expected_xpaths: Optional[Iterable[XPathLike]] = None, archive: Optional[bool] = None):
+    """
+    分级抓取：先用普通HTTP抓取并按expected_xpaths校验，校验失败才走浏览器
+    按域名记录两种方式的成功率和耗时，长期需要JS渲染的域名直接走浏览器，静态站点不会启动浏览器
+    :param url: 目标URL
+    :param need_click: 是否需要点击页面元素（需要点击时只能走浏览器）
+    :param max_retries: 浏览器抓取最大重试次数
+    :param retry_delay: 重试延迟基数(秒)
+    :param timeout: 浏览器单次请求超时时间(秒)
+    :param expected_xpaths: 站点预期的XPath列表，用于判断HTTP抓取结果是否可用
+    :param archive: 是否归档原始HTML用于离线重新解析，默认取 HTML_ARCHIVE_ENABLED
+    :return: 包含html和解析结果的字典，via字段标明实际使用的抓取方式
+    """
+    store = get_strategy_store()
+    domain = get_domain(url)
+
+    if not need_click and store.preferred(domain) == HTTP:
+        start = time.monotonic()
+        result = fetch_and_parse_normal(url, expected_xpaths)
+        store.record(domain, HTTP, result is not None, time.monotonic() - start)
+        if result is not None:
+            archive_html(url, result["html"], HTTP, archive)
+            return result
+        logger.info(f"fetch_and_parse_normal解析失败，使用浏览器解析: {url}")
+
+    start = time.monotonic()
+    try:
+        result = fetch_and_parse_browser(url, need_click, max_retries, retry_delay, timeout)
+    except Exception:
+        store.record(domain, BROWSER, False, time.monotonic() - start)
+        raise
+    store.record(domain, BROWSER, validate_html(result.get("parse_html"), expected_xpaths), time.monotonic() - start)
+    archive_html(url, result["html"], BROWSER, archive)
+    return result
+
+def fetch_and_parse_browser(url: str, need_click: bool = False, max_retries: int = 2, retry_delay: int = 1, timeout: float = 300):
     """
-    优化后的爬虫函数，直接调用避免线程池开销
+    通过浏览器池抓取页面，直接调用避免线程池开销
     :param url: 目标URL
     :param need_click: 是否需要点击页面元素
     :param max_retries: 最大重试次数
@@ -248,7 +330,6 @@ def fetch_and_parse(url: str, need_click: bool = False, max_retries: int = 2, re
     :param timeout: 单次请求超时时间(秒)
     :return: 包含html和解析结果的字典
     """
-    logger.info(f"fetch_and_parse_normal解析失败，使用fetch_and_parse解析: {url}")
     chromium_options_manager = ChromiumOptionsManager()
     
     for attempt in range(max_retries):
@@ -266,7 +347,8 @@ def fetch_and_parse(url: str, need_click: bool = False, max_retries: int = 2, re
                         return {
                             "html": html,
                             "parse_html": etree.HTML(html),
-                            "status": True
+                            "status": True,
+                            "via": BROWSER
                         }
                     raise ValueError(f'获取到空HTML内容: {url}')
                 
@@ -283,51 +365,25 @@ def fetch_and_parse(url: str, need_click: bool = False, max_retries: int = 2, re
 
 def insert_into_table(data: list[dict] = None):
     """
-    插入数据到指定表
+    插入数据到指定表，article_id重复的数据跳过
     
     Args:
-        table_name: 表名
         data: 要插入的数据字典列表
     """
-    session = None
+    if not data:
+        return
+    seen_index = SeenIndex(table_name)
     try:
-        session = std_db._scoped_session()
-        successful_inserts = 0
-        
-        for item in data:
-            try:
-                # 先判断是否存在重复键值
-                stmt = text(f"SELECT 1 FROM {table_name} WHERE article_id = :article_id")
-                result = session.execute(stmt, {'article_id': item['article_id']}).fetchone()
-                if result:
-                    logger.warning(f"数据已存在，跳过插入（重复键值）: {item.get('article_id', 'Unknown')}")
-                    continue
-
-                stmt = text(f"INSERT INTO {table_name} ({', '.join(item.keys())}) VALUES ({', '.join([':' + k for k in item.keys()])})")
-                session.execute(stmt, item)
-                successful_inserts += 1
-                
-            except Exception as e:
-                logger.error(f"插入数据 {item} 到表 {table_name} 失败: {e}")
-                # 对于其他异常，回滚并重新抛出
-                session.rollback()
-                raise
-    
-        # 只有所有插入都成功或跳过重复项后才提交
-        session.commit()
-        logger.info(f"成功插入 {successful_inserts} 条数据到表 {table_name}")
+        # 已见索引中存在的article_id直接跳过，不再写库
+        new_data = seen_index.filter_new_items(data)
+        if len(new_data) < len(data):
+            logger.info(f"已见文章索引跳过 {len(data) - len(new_data)} 条重复数据")
+        # 按块多行写入，重复键值由数据库跳过，不再逐条查重
+        result = batch_insert_into_table(table_name, new_data)
+        logger.info(f"成功插入 {result.inserted} 条数据到表 {table_name}, 跳过重复 {result.skipped} 条")
+        seen_index.add(urls=[item.get('detail_url') for item in data],
+                       article_ids=[item['article_id'] for item in data])
         
     except Exception as e:
-        if session:
-            session.rollback()
         logger.error(f"插入数据到表 {table_name} 失败: {e}")
         raise
-    finally:
-        if session:
-            session.close()
-
-
-
-if __name__ == '__main__':
-    translate_result = find_translated('sdc_data.ex_shipping_information')
-    print(translate_result)
\ No newline at end of file
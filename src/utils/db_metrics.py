@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import re
+import socket
+import sys
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+
+import redis
+from celery.signals import task_postrun
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from src.settings.config import settings
+from src.utils.redis_tools import get_redis
+
+# 直方图桶上限（毫秒），最后一个桶为 +Inf
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+# 批量语句中带序号的参数名：:article_id_m12 / :id_3
+_NUMBERED_PARAM = re.compile(r":(\w+?)_m?\d+\b")
+_POSITIONAL_PARAM = re.compile(r"\$\d+|%s")
+# 连续重复的参数或元组：VALUES (...), (...), ... / IN (x, x, x)
+_REPEATED_GROUP = re.compile(r"(\([^()]*\)|:\w+|\?)(?:\s*,\s*\1)+")
+_MAX_KEY_LENGTH = 300
+_EXPORT_PREFIX = "crawler:db_metrics:"
+
+
+def normalize_sql(statement: str) -> str:
+    """把SQL归一化为统计用的键：压缩空白，去掉字面量和批量语句中的序号与重复项"""
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _PYFORMAT_PARAM.sub(r":\1", sql)
+    sql = _NUMBERED_PARAM.sub(r":\1_N", sql)
+    sql = _POSITIONAL_PARAM.sub("?", sql)
+    sql = _REPEATED_GROUP.sub(r"\1, ...", sql)
+    return sql[:_MAX_KEY_LENGTH]
+
+
+class Histogram:
+    """固定桶的耗时直方图（毫秒）"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(list(BUCKETS_MS) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum_ms": round(self.sum, 3), "max_ms": round(self.max, 3), "buckets": buckets}
+
+
+class DbMetrics:
+    """
+    数据库连接池与SQL执行的进程内统计
+    - 连接池：获取连接的等待耗时、等待超时次数（DB_POOL_TIMEOUT），以及当前占用、溢出连接数
+    - SQL：按归一化SQL分组的执行耗时直方图和出错次数；超过 DB_SLOW_QUERY_MS 的语句记慢查询日志
+    - stats() 返回可直接序列化的字典；prometheus_text() 输出Prometheus文本格式；
+      worker子进程每 DB_METRICS_EXPORT_INTERVAL 秒把快照写入Redis，由本模块命令行汇总
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._engines = {}
+        self._pool_wait: Dict[str, Histogram] = {}
+        self._pool_timeouts: Dict[str, int] = {}
+        self._statements: Dict[tuple, Histogram] = {}
+        self._errors: Dict[tuple, int] = {}
+        self._slow_queries = 0
+        self._last_export = 0.0
+
+    def instrument(self, engine, role: str):
+        """为引擎挂载SQL执行耗时统计，并登记其连接池以便读取状态"""
+        self._engines[role] = engine
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute(role))
+        event.listen(engine, "handle_error", self._on_error(role))
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_execute(self, role: str):
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+            key = (role, normalize_sql(statement))
+            with self._lock:
+                self._statements.setdefault(key, Histogram()).observe(elapsed_ms)
+                if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+                    self._slow_queries += 1
+            if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+                logger.warning(f"慢查询 {elapsed_ms:.0f} ms ({role}): {_WHITESPACE.sub(' ', statement)[:1000]}")
+        return listener
+
+    def _on_error(self, role: str):
+        def listener(context):
+            starts = context.connection.info.get("query_start") if context.connection is not None else None
+            if starts:
+                starts.pop()
+            statement = context.statement or ""
+            key = (role, normalize_sql(statement))
+            with self._lock:
+                self._errors[key] = self._errors.get(key, 0) + 1
+        return listener
+
+    def observe_pool_wait(self, role: str, ms: float, timed_out: bool = False):
+        with self._lock:
+            self._pool_wait.setdefault(role, Histogram()).observe(ms)
+            if timed_out:
+                self._pool_timeouts[role] = self._pool_timeouts.get(role, 0) + 1
+
+    def stats(self) -> dict:
+        """当前进程的统计快照"""
+        pools = {}
+        for role, engine in list(self._engines.items()):
+            pool = engine.pool
+            pools[role] = {
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            }
+        with self._lock:
+            for role, histogram in self._pool_wait.items():
+                pools.setdefault(role, {})["checkout_wait"] = histogram.snapshot()
+                pools[role]["checkout_timeouts"] = self._pool_timeouts.get(role, 0)
+            statements = [{"role": role, "sql": sql, **histogram.snapshot(),
+                           "errors": self._errors.get((role, sql), 0)}
+                          for (role, sql), histogram in self._statements.items()]
+            slow_queries = self._slow_queries
+        statements.sort(key=lambda item: item["sum_ms"], reverse=True)
+        return {"process": f"{socket.gethostname()}:{os.getpid()}", "time": time.time(),
+                "pools": pools, "statements": statements, "slow_queries": slow_queries}
+
+    def export(self, force: bool = False):
+        """把本进程快照写入Redis（按 DB_METRICS_EXPORT_INTERVAL 节流），失败不影响任务"""
+        now = time.monotonic()
+        if not force and now - self._last_export < settings.DB_METRICS_EXPORT_INTERVAL:
+            return
+        self._last_export = now
+        snapshot = self.stats()
+        try:
+            get_redis().set(f"{_EXPORT_PREFIX}{snapshot['process']}", json.dumps(snapshot, ensure_ascii=False),
+                            ex=max(int(settings.DB_METRICS_EXPORT_INTERVAL) * 4, 60))
+        except redis.RedisError as e:
+            logger.warning(f"数据库统计写入Redis失败: {str(e)}")
+
+
+def instrumented_pool_class(role: str, base=QueuePool):
+    """
+    记录获取连接等待耗时的连接池子类（连接池重建时沿用同一个类）
+    :param base: 同步引擎为QueuePool，异步引擎为AsyncAdaptedQueuePool
+    """
+
+    class InstrumentedQueuePool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            timed_out = False
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                timed_out = True
+                raise
+            finally:
+                get_db_metrics().observe_pool_wait(role, (time.perf_counter() - start) * 1000, timed_out)
+
+    return InstrumentedQueuePool
+
+
+_metrics: Optional[DbMetrics] = None
+_metrics_pid: Optional[int] = None
+_metrics_lock = Lock()
+
+
+def get_db_metrics() -> DbMetrics:
+    """当前进程的数据库统计（fork后的子进程重新开始计数）"""
+    global _metrics, _metrics_pid
+    if _metrics is None or _metrics_pid != os.getpid():
+        with _metrics_lock:
+            if _metrics is None or _metrics_pid != os.getpid():
+                _metrics, _metrics_pid = DbMetrics(), os.getpid()
+    return _metrics
+
+
+def collect_exported() -> List[dict]:
+    """读取所有worker进程最近写入Redis的快照"""
+    client = get_redis()
+    keys = list(client.scan_iter(match=f"{_EXPORT_PREFIX}*", count=500))
+    return [json.loads(value) for value in client.mget(keys) if value] if keys else []
+
+
+def prometheus_text(snapshots: List[dict]) -> str:
+    """把一个或多个进程的快照渲染为Prometheus文本格式"""
+    lines = [
+        "# TYPE db_pool_checked_out gauge",
+        "# TYPE db_pool_overflow gauge",
+        "# TYPE db_pool_checkout_wait_ms histogram",
+        "# TYPE db_pool_checkout_timeouts_total counter",
+        "# TYPE db_statement_duration_ms histogram",
+        "# TYPE db_statement_errors_total counter",
+        "# TYPE db_slow_queries_total counter",
+    ]
+
+    def labels(**values) -> str:
+        return ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                        for k, v in values.items())
+
+    def histogram(name: str, snapshot: dict, **values):
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{{{labels(**values, le=bound)}}} {count}")
+        lines.append(f"{name}_sum{{{labels(**values)}}} {snapshot['sum_ms']}")
+        lines.append(f"{name}_count{{{labels(**values)}}} {snapshot['count']}")
+
+    for snapshot in snapshots:
+        process = snapshot["process"]
+        for role, pool in snapshot["pools"].items():
+            if pool.get("checked_out") is not None:
+                lines.append(f"db_pool_checked_out{{{labels(process=process, role=role)}}} {pool['checked_out']}")
+                lines.append(f"db_pool_overflow{{{labels(process=process, role=role)}}} {pool['overflow']}")
+            if "checkout_wait" in pool:
+                histogram("db_pool_checkout_wait_ms", pool["checkout_wait"], process=process, role=role)
+                lines.append(f"db_pool_checkout_timeouts_total{{{labels(process=process, role=role)}}} "
+                             f"{pool['checkout_timeouts']}")
+        for item in snapshot["statements"]:
+            histogram("db_statement_duration_ms", item, process=process, role=item["role"], sql=item["sql"])
+            lines.append(f"db_statement_errors_total{{{labels(process=process, role=item['role'], sql=item['sql'])}}} "
+                         f"{item['errors']}")
+        lines.append(f"db_slow_queries_total{{{labels(process=process)}}} {snapshot['slow_queries']}")
+    return "\n".join(lines) + "\n"
+
+
+@task_postrun.connect
+def _export_after_task(**kwargs):
+    """每个任务结束后按间隔导出一次本进程的统计"""
+    if settings.DB_METRICS_ENABLED and _metrics is not None and _metrics_pid == os.getpid():
+        _metrics.export()
+
+
+if __name__ == '__main__':
+    # 示例：python src/utils/db_metrics.py --format prometheus
+    parser = argparse.ArgumentParser(description='汇总各worker进程导出的数据库统计')
+    parser.add_argument('--format', choices=['json', 'prometheus'], default='json')
+    args = parser.parse_args()
+
+    snapshots = collect_exported()
+    if args.format == 'prometheus':
+        print(prometheus_text(snapshots), end='')
+    else:
+        print(json.dumps(snapshots, ensure_ascii=False, indent=2))
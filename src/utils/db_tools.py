@@ -1,20 +1,191 @@
 
+import datetime
+import os
+import socket
 import threading
-from typing import Dict, Any, Optional
-from sqlalchemy import create_engine, text
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import create_engine, event, text, table, column
+from sqlalchemy.dialects import mysql, postgresql
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.pool import QueuePool
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from loguru import logger
 
 # 导入项目配置
 from src.settings.config import settings
+from src.utils.db_metrics import get_db_metrics, instrumented_pool_class
 
 Base = declarative_base()
 
 
+@dataclass
+class BulkWriteResult:
+    """批量写入结果"""
+    inserted: int = 0
+    skipped: int = 0
+
+    def __add__(self, other: "BulkWriteResult") -> "BulkWriteResult":
+        return BulkWriteResult(self.inserted + other.inserted, self.skipped + other.skipped)
+
+
+def _group_by_columns(records: List[Dict[str, Any]]) -> Dict[tuple, List[Dict[str, Any]]]:
+    """按字段集合分组，同一组的记录可以合并成一条语句"""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault(tuple(record.keys()), []).append(record)
+    return groups
+
+
+def _insert_ignore_statement(dialect_name: str, table_name: str, columns: List[str], conflict_key: str):
+    """按数据库方言构造"冲突即跳过"的多行INSERT"""
+    schema, _, name = table_name.rpartition('.')
+    target = table(name, *[column(c) for c in columns], schema=schema or None)
+    if dialect_name == "postgresql":
+        # 只有真正插入的行会被RETURNING返回，据此统计插入条数
+        return postgresql.insert(target).on_conflict_do_nothing(
+            index_elements=[conflict_key]).returning(target.c[conflict_key])
+    # OceanBase（MySQL协议）：重复主键的行被忽略，rowcount即插入条数
+    return mysql.insert(target).prefix_with("IGNORE")
+
+
+def _update_statements(dialect_name: str, table_name: str, columns: tuple, rows: List[Dict[str, Any]],
+                       key: str, chunk_size: int, column_types: Optional[Dict[str, str]] = None):
+    """
+    按数据库方言构造批量UPDATE，逐个产出 (语句, 参数)
+    - PostgreSQL：每个分块一条 UPDATE ... FROM (VALUES ...)；VALUES中的参数没有上下文可推断类型，
+      传入 column_types 时按字段类型显式CAST（asyncpg按服务端推断的类型编码参数，不CAST时一律当作text）
+    - 其他：一条UPDATE语句，参数为记录列表（executemany）
+    """
+    set_columns = [c for c in columns if c != key]
+    if dialect_name != "postgresql":
+        yield (text(f"UPDATE {table_name} SET {', '.join(f'{c} = :{c}' for c in set_columns)} "
+                    f"WHERE {key} = :{key}"), rows)
+        return
+    value_columns = [key] + set_columns
+    column_types = column_types or {}
+
+    def placeholder(c: str, i: int) -> str:
+        return f"CAST(:{c}_{i} AS {column_types[c]})" if c in column_types else f":{c}_{i}"
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        params, values_sql = {}, []
+        for i, row in enumerate(chunk):
+            values_sql.append("(" + ", ".join(placeholder(c, i) for c in value_columns) + ")")
+            params.update({f"{c}_{i}": row[c] for c in value_columns})
+        yield text(f"""
+            UPDATE {table_name} AS t
+            SET {', '.join(f'{c} = v.{c}' for c in set_columns)}
+            FROM (VALUES {', '.join(values_sql)}) AS v({', '.join(value_columns)})
+            WHERE t.{key} = v.{key}
+        """), params
+
+
+def _claim_params(limit: Optional[int] = None, lease_seconds: Optional[int] = None,
+                  worker_id: Optional[str] = None) -> Dict[str, Any]:
+    """领取未翻译条目的参数：每批条数、领取者标识（默认 主机名:进程号）、本次租约时间及过期界限"""
+    # 取整到秒：OceanBase的TIMESTAMP默认不保留小数秒，回查时按 claimed_at = :now 精确匹配
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    lease_seconds = lease_seconds or settings.TRANSLATE_CLAIM_LEASE
+    return {
+        "limit": limit or settings.TRANSLATE_CLAIM_BATCH,
+        "worker_id": worker_id or f"{socket.gethostname()}:{os.getpid()}",
+        "now": now,
+        "expired_before": now - datetime.timedelta(seconds=lease_seconds),
+    }
+
+
+def _claim_select_statement(table_name: str):
+    """
+    领取第一步：选出一批未翻译、未隔离、租约已过期的条目
+    SELECT ... FOR UPDATE SKIP LOCKED 跳过其他事务正在领取的行，参数 expired_before / limit
+    """
+    return text(f"""
+        SELECT article_id FROM {table_name}
+        WHERE is_translated = FALSE
+        AND quarantined_at IS NULL
+        AND (detail_title IS NOT NULL OR detail_title_cn IS NOT NULL)
+        AND (claimed_at IS NULL OR claimed_at < :expired_before)
+        ORDER BY update_time
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    """)
+
+
+def _claim_lease_statements(table_name: str, article_ids: List[Any], claim: Dict[str, Any]) -> Tuple[Any, Any, dict]:
+    """
+    领取第二步：写入租约并回查本次确实领取到的行，返回 (UPDATE语句, 回查语句, 参数)
+    UPDATE 再次检查租约，只回查写入了自己租约的行：OceanBase连接为autocommit，
+    SELECT返回时行锁已释放，两个worker可能选中同一批行，但只有一个能写入租约
+    """
+    params = {f'id_{i}': article_id for i, article_id in enumerate(article_ids)}
+    in_sql = ', '.join(f':{k}' for k in params)
+    update = text(f"""
+        UPDATE {table_name} SET claimed_by = :worker_id, claimed_at = :now
+        WHERE article_id IN ({in_sql})
+        AND (claimed_at IS NULL OR claimed_at < :expired_before)
+    """)
+    select = text(f"""
+        SELECT detail_title, detail_contents, detail_title_cn, detail_contents_cn, article_id, detail_url
+        FROM {table_name}
+        WHERE article_id IN ({in_sql})
+        AND claimed_by = :worker_id AND claimed_at = :now
+    """)
+    return update, select, {**params, 'worker_id': claim['worker_id'], 'now': claim['now'],
+                            'expired_before': claim['expired_before']}
+
+
+def _claimed_items(rows) -> List[dict]:
+    """把回查结果整理为待翻译条目：英文原文带 detail_title / detail_contents，中文原文带 *_cn 字段"""
+    claimed = []
+    for row in rows:
+        if row[0] is not None:
+            claimed.append({"detail_title": row[0], "detail_contents": row[1], "article_id": row[4], "detail_url": row[5]})
+        else:
+            claimed.append({"detail_title_cn": row[2], "detail_contents_cn": row[3], "article_id": row[4], "detail_url": row[5]})
+    return claimed
+
+
+def _set_autocommit(conn, value: bool):
+    """切换OceanBase底层连接的autocommit（pymysql连接和aiomysql适配连接都提供autocommit()）"""
+    conn.connection.dbapi_connection.autocommit(value)
+
+
+# 本进程所在worker的并发数（prefork子进程数），由worker_init信号在主进程中记录，fork后子进程继承
+_worker_concurrency: Optional[int] = None
+
+
+def _pool_options() -> Dict[str, Any]:
+    """
+    同步与异步引擎共用的连接池配置
+    开启 DB_POOL_SIZE_BY_CONCURRENCY 时，worker子进程的连接池按并发数均分 DB_MAX_POOL_CON，
+    整个worker占用的连接数不超过 DB_MAX_POOL_CON
+    """
+    pool_size, max_overflow = settings.DB_POOL_SIZE, settings.DB_POOL_OVERFLOW
+    if settings.DB_POOL_SIZE_BY_CONCURRENCY and _worker_concurrency:
+        pool_size, max_overflow = max(1, settings.DB_MAX_POOL_CON // _worker_concurrency), 0
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_reset_on_return": settings.DB_POOL_RESET_ON_RETURN,
+        "echo": settings.IS_DB_ECHO_LOG,
+    }
+
+
 class DatabaseManager:
-    """数据库连接管理器，单例模式，使用连接池，支持PostgreSQL和OceanBase"""
+    """
+    数据库连接管理器，单例模式，使用连接池，支持PostgreSQL和OceanBase
+    - 连接池在第一次使用时创建，只导入模块的进程（beat、Flower、check_env等）不会建立连接
+    - 连接池属于创建它的进程：fork出的子进程第一次使用时丢弃继承来的连接，重新创建自己的连接池
+    - 配置 DB_REPLICA_URL 后，read_session() 的只读查询走只读副本（独立连接池），写入和领取仍走主库；
+      本进程在主库提交事务后 DB_READ_YOUR_WRITES_SECONDS 秒内的读也走主库，避免读不到刚写入的数据
+    """
     
     _instance = None
     _lock = threading.Lock()
@@ -29,10 +200,30 @@ class DatabaseManager:
     
     def __init__(self):
         if not self._initialized:
-            self._engine = None
+            self._engine_instance = None
             self._session_factory = None
-            self._scoped_session = None
+            self._scoped_session_instance = None
+            self._replica_engine_instance = None
+            self._replica_session_factory = None
+            self._last_write = 0.0
+            self._database_url = None
+            self._pid = None
+            self._init_lock = threading.Lock()
             self._initialized = True
+
+    @property
+    def _engine(self):
+        """当前进程的引擎，第一次访问时创建"""
+        if self._engine_instance is None or self._pid != os.getpid():
+            self.init_database()
+        return self._engine_instance
+
+    @property
+    def _scoped_session(self):
+        """当前进程的线程安全scoped session，第一次访问时创建"""
+        if self._scoped_session_instance is None or self._pid != os.getpid():
+            self.init_database()
+        return self._scoped_session_instance
     
     def _build_postgresql_url(self) -> str:
         """构建PostgreSQL连接URL"""
@@ -63,55 +254,109 @@ class DatabaseManager:
             return self._build_postgresql_url()
     
     def init_database(self, database_url: Optional[str] = None):
-        """初始化数据库连接"""
-        if self._engine is not None:
-            return
-            
+        """初始化数据库连接（已初始化则直接返回；在fork出的子进程中调用时重建连接池）"""
+        with self._init_lock:
+            if self._engine_instance is not None and self._pid == os.getpid():
+                return
+            if self._engine_instance is not None:
+                self._discard_inherited()
+            self._create_engine(database_url or self._database_url)
+
+    def _discard_inherited(self):
+        """丢弃从父进程继承的连接池：不关闭连接（socket仍被父进程使用），只让本进程不再复用它们"""
+        self._engine_instance.dispose(close=False)
+        if self._replica_engine_instance is not None:
+            self._replica_engine_instance.dispose(close=False)
+        self._engine_instance = None
+        self._session_factory = None
+        self._scoped_session_instance = None
+        self._replica_engine_instance = None
+        self._replica_session_factory = None
+        logger.info(f"进程 {os.getpid()} 丢弃继承的数据库连接池")
+
+    def _new_engine(self, db_url: str, role: str):
+        """按统一的连接池配置创建引擎，开启 DB_METRICS_ENABLED 时挂载连接池和SQL统计"""
+        # 根据数据库类型调整连接池配置
+        poolclass = instrumented_pool_class(role) if settings.DB_METRICS_ENABLED else QueuePool
+        pool_config = {"poolclass": poolclass, **_pool_options()}
+        
+        # OceanBase可能需要特殊的连接参数
+        if settings.DATABASE_TYPE.lower() == "oceanbase":
+            # 添加OceanBase特定的连接参数
+            pool_config.update({
+                "connect_args": {
+                    "charset": "utf8mb4",
+                    "autocommit": True,
+                }
+            })
+        
+        # 创建带连接池的引擎
+        engine = create_engine(db_url, **pool_config)
+        if settings.DB_METRICS_ENABLED:
+            get_db_metrics().instrument(engine, role)
+        return engine, pool_config
+
+    def _create_engine(self, database_url: Optional[str] = None):
         try:
             # 获取数据库连接URL
             db_url = self._get_database_url(database_url)
-            
-            # 根据数据库类型调整连接池配置
-            pool_config = {
-                "poolclass": QueuePool,
-                "pool_size": settings.DB_POOL_SIZE,
-                "max_overflow": settings.DB_POOL_OVERFLOW,
-                "pool_timeout": settings.DB_POOL_TIMEOUT,
-                "pool_recycle": settings.DB_POOL_RECYCLE,
-                "pool_reset_on_return": settings.DB_POOL_RESET_ON_RETURN,
-                "echo": settings.IS_DB_ECHO_LOG,
-            }
-            
-            # OceanBase可能需要特殊的连接参数
-            if settings.DATABASE_TYPE.lower() == "oceanbase":
-                # 添加OceanBase特定的连接参数
-                pool_config.update({
-                    "connect_args": {
-                        "charset": "utf8mb4",
-                        "autocommit": True,
-                    }
-                })
-            
-            # 创建带连接池的引擎
-            self._engine = create_engine(db_url, **pool_config)
+            self._engine_instance, pool_config = self._new_engine(db_url, "primary")
+            # 记录主库最近一次提交的时间，用于读己之写
+            event.listen(self._engine_instance, "commit", self._mark_write)
             
             # 创建会话工厂
-            self._session_factory = sessionmaker(bind=self._engine)
+            self._session_factory = sessionmaker(bind=self._engine_instance)
             
             # 创建线程安全的scoped session
-            self._scoped_session = scoped_session(self._session_factory)
+            self._scoped_session_instance = scoped_session(self._session_factory)
+
+            if settings.DB_REPLICA_URL:
+                self._replica_engine_instance, _ = self._new_engine(settings.DB_REPLICA_URL, "replica")
+                self._replica_session_factory = sessionmaker(bind=self._replica_engine_instance)
+                logger.info(f"只读副本连接池初始化成功: {self._replica_engine_instance.url!r}")
+            self._database_url = database_url
+            self._pid = os.getpid()
             
-            logger.info(f"{settings.DATABASE_TYPE.upper()}数据库连接池初始化成功: {db_url}")
+            logger.info(f"{settings.DATABASE_TYPE.upper()}数据库连接池初始化成功(pid={self._pid}, "
+                        f"pool_size={pool_config['pool_size']}, max_overflow={pool_config['max_overflow']}): {db_url}")
             
         except Exception as e:
             logger.error(f"数据库连接初始化失败: {e}")
             raise
+
+    def _mark_write(self, conn):
+        self._last_write = time.monotonic()
+
+    def read_engine(self, primary: bool = False):
+        """
+        只读查询使用的引擎
+        :param primary: 强制读主库（读己之写）
+        :return: 未配置副本、强制读主库或本进程刚写入过数据时返回主库引擎，否则返回副本引擎
+        """
+        engine = self._engine
+        if (primary or self._replica_engine_instance is None
+                or time.monotonic() - self._last_write < settings.DB_READ_YOUR_WRITES_SECONDS):
+            return engine
+        return self._replica_engine_instance
+
+    @contextmanager
+    def read_session(self, primary: bool = False):
+        """
+        只读会话，按路由规则选择副本或主库，退出时关闭会话
+        用法：
+            with std_db.read_session() as session:
+                rows = session.execute(text("SELECT ...")).fetchall()
+        """
+        engine = self.read_engine(primary)
+        factory = self._session_factory if engine is self._engine_instance else self._replica_session_factory
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
     
     def get_session(self):
         """从连接池获取一个会话"""
-        if self._scoped_session is None:
-            raise RuntimeError("数据库连接未初始化，请先调用init_database()")
-        
         return self._scoped_session()
     
     def close_session(self, session):
@@ -121,10 +366,6 @@ class DatabaseManager:
     
     def test_connection(self) -> bool:
         """测试数据库连接是否正常"""
-        if self._engine is None:
-            logger.warning("数据库连接未初始化")
-            return False
-        
         try:
             with self._engine.connect() as conn:
                 # 根据数据库类型执行不同的测试语句
@@ -141,22 +382,102 @@ class DatabaseManager:
             logger.error(f"数据库连接测试失败: {e}")
             return False
     
+    @contextmanager
+    def _transaction(self):
+        """
+        批量写入使用的事务：所有语句一起提交，任一语句失败整体回滚
+        OceanBase连接以autocommit方式创建（每条语句单独提交），事务期间临时关闭，归还连接池前恢复
+        """
+        oceanbase = settings.DATABASE_TYPE.lower() == "oceanbase"
+        with self._engine.connect() as conn:
+            if oceanbase:
+                _set_autocommit(conn, False)
+            try:
+                with conn.begin():
+                    yield conn
+            finally:
+                if oceanbase and not conn.invalidated:
+                    _set_autocommit(conn, True)
+
+    def bulk_insert(self, table_name: str, records: List[Dict[str, Any]],
+                    conflict_key: str = "article_id", chunk_size: Optional[int] = None) -> BulkWriteResult:
+        """
+        批量插入，主键冲突的记录跳过
+        - 每个分块一条多行INSERT，PostgreSQL使用 ON CONFLICT DO NOTHING，OceanBase使用 INSERT IGNORE
+        - 字段不同的记录分组写入，缺失的字段保留数据库默认值
+        - 所有分块在同一个事务中提交，任一分块失败整体回滚（OceanBase在事务期间关闭autocommit）
+        :param table_name: 表名，可带schema前缀
+        :param records: 待写入的记录
+        :param conflict_key: 判重的唯一键
+        :param chunk_size: 每条INSERT包含的记录数，默认 DB_BULK_CHUNK_SIZE
+        :return: 插入与跳过的条数
+        """
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        result = BulkWriteResult()
+        with self._transaction() as conn:
+            for columns, rows in _group_by_columns(records).items():
+                stmt = _insert_ignore_statement(self._engine.dialect.name, table_name, list(columns), conflict_key)
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    cursor = conn.execute(stmt.values(chunk))
+                    inserted = len(cursor.fetchall()) if cursor.returns_rows else max(cursor.rowcount, 0)
+                    result += BulkWriteResult(inserted, len(chunk) - inserted)
+        return result
+
+    def bulk_update(self, table_name: str, records: List[Dict[str, Any]],
+                    key: str = "article_id", chunk_size: Optional[int] = None) -> int:
+        """
+        按主键批量更新
+        - PostgreSQL：每个分块一条 UPDATE ... FROM (VALUES ...) 语句
+        - OceanBase：同一条UPDATE语句executemany
+        - 所有分块在同一个事务中提交，任一分块失败整体回滚（OceanBase在事务期间关闭autocommit）
+        :param table_name: 表名，可带schema前缀
+        :param records: 待更新的记录，必须包含key字段
+        :param key: 定位记录的主键字段
+        :param chunk_size: 每条语句包含的记录数，默认 DB_BULK_CHUNK_SIZE
+        :return: 更新的行数
+        """
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        updated = 0
+        with self._transaction() as conn:
+            for columns, rows in _group_by_columns(records).items():
+                for stmt, params in _update_statements(self._engine.dialect.name, table_name, columns, rows,
+                                                       key, chunk_size):
+                    updated += max(conn.execute(stmt, params).rowcount, 0)
+        return updated
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """本进程的连接池与SQL执行统计（需开启 DB_METRICS_ENABLED）"""
+        return get_db_metrics().stats()
+
     def get_database_info(self) -> Dict[str, Any]:
         """获取数据库信息"""
         return {
             "database_type": settings.DATABASE_TYPE,
-            "is_connected": self._engine is not None,
-            "connection_url": self._get_database_url() if self._engine else None,
+            "is_connected": self._engine_instance is not None and self._pid == os.getpid(),
+            "connection_url": self._get_database_url(self._database_url) if self._engine_instance else None,
+            "replica_url": repr(self._replica_engine_instance.url) if self._replica_engine_instance else None,
         }
     
     def dispose(self):
         """释放所有数据库连接"""
-        if self._scoped_session:
-            self._scoped_session.remove()
-        if self._engine:
-            self._engine.dispose()
+        if self._engine_instance is not None and self._pid != os.getpid():
+            self._discard_inherited()
+            return
+        if self._scoped_session_instance:
+            self._scoped_session_instance.remove()
+        if self._engine_instance:
+            self._engine_instance.dispose()
+        if self._replica_engine_instance:
+            self._replica_engine_instance.dispose()
         logger.info("数据库连接池已释放")
 
+    def reset_after_fork(self):
+        """fork出的子进程调用：丢弃继承的连接池，下次使用时按本进程的配置重新创建"""
+        with self._init_lock:
+            if self._engine_instance is not None and self._pid != os.getpid():
+                self._discard_inherited()
+
 
 # 创建全局数据库管理器实例
 db_manager = DatabaseManager()
@@ -185,6 +506,39 @@ def get_database_info() -> Dict[str, Any]:
     return db_manager.get_database_info()
 
 
-# 创建全局数据库管理器实例并初始化
+# 批量插入（主键冲突跳过）
+def batch_insert_into_table(table_name: str, data: List[Dict[str, Any]],
+                            conflict_key: str = "article_id", chunk_size: Optional[int] = None) -> BulkWriteResult:
+    """批量插入数据，返回插入与跳过的条数"""
+    return std_db.bulk_insert(table_name, data, conflict_key, chunk_size)
+
+
+# 批量更新（按主键）
+def batch_update_table(table_name: str, data: List[Dict[str, Any]],
+                       key: str = "article_id", chunk_size: Optional[int] = None) -> int:
+    """按主键批量更新数据，返回更新的行数"""
+    return std_db.bulk_update(table_name, data, key, chunk_size)
+
+
+# 创建全局数据库管理器实例（连接池在第一次使用时创建）
 std_db = DatabaseManager()
-std_db.init_database()
+
+
+@worker_init.connect
+def _record_worker_concurrency(sender=None, **kwargs):
+    """worker主进程启动时记录并发数，prefork子进程据此划分连接池大小"""
+    global _worker_concurrency
+    _worker_concurrency = getattr(sender, "concurrency", None)
+
+
+@worker_process_init.connect
+def _reset_pool_in_child(**kwargs):
+    """prefork子进程启动时丢弃继承自主进程的连接，本进程第一次访问数据库时再建立连接池"""
+    std_db.reset_after_fork()
+
+
+@worker_process_shutdown.connect
+def _dispose_pool_in_child(**kwargs):
+    """worker子进程退出时关闭本进程的连接"""
+    if std_db._engine_instance is not None and std_db._pid == os.getpid():
+        std_db.dispose()
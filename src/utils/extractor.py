@@ -0,0 +1,76 @@
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Union
+
+from lxml import etree
+
+XPathLike = Union[str, etree.XPath]
+
+
+def compile_xpath(xpath: Optional[XPathLike]) -> Optional[etree.XPath]:
+    """把字符串XPath编译为可复用的etree.XPath（关闭smart_strings，结果为普通str，不持有文档引用）"""
+    if xpath is None or isinstance(xpath, etree.XPath):
+        return xpath
+    return etree.XPath(xpath, smart_strings=False)
+
+
+@dataclass
+class ArticleRecord:
+    """从详情页抽取出的文章字段"""
+    url: str
+    title: Optional[str] = None
+    contents: str = ""
+    date: Optional[str] = None
+    img_url: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ArticleExtractor:
+    """
+    站点字段抽取器
+    - 每个站点的XPath在创建时编译一次，之后所有页面复用，不再每页重新解析XPath字符串
+    - extract() 对每个字段的XPath只求值一次，返回 ArticleRecord
+    用法：
+        extractor = ArticleExtractor(title='//h1/text()', content='//article//text()', date='//time/text()')
+        record = extractor.extract(parse_html, url)
+    """
+
+    def __init__(self,
+                 title: XPathLike,
+                 content: XPathLike,
+                 date: Optional[XPathLike] = None,
+                 img: Optional[XPathLike] = None,
+                 links: Optional[XPathLike] = None):
+        self.title = compile_xpath(title)
+        self.content = compile_xpath(content)
+        self.date = compile_xpath(date)
+        self.img = compile_xpath(img)
+        self.links = compile_xpath(links)
+
+    @staticmethod
+    def _first(xpath: Optional[etree.XPath], tree) -> Optional[str]:
+        if xpath is None:
+            return None
+        for value in xpath(tree):
+            value = str(value).strip()
+            if value:
+                return value
+        return None
+
+    def extract_links(self, tree) -> List[str]:
+        """列表页中的文章链接"""
+        if self.links is None:
+            return []
+        return [str(link) for link in self.links(tree)]
+
+    def extract(self, tree, url: str) -> ArticleRecord:
+        """一次性抽取详情页的全部字段"""
+        texts = (str(t).strip() for t in self.content(tree))
+        return ArticleRecord(
+            url=url,
+            title=self._first(self.title, tree),
+            contents='\n'.join(t for t in texts if t),
+            date=self._first(self.date, tree),
+            img_url=self._first(self.img, tree),
+        )
@@ -0,0 +1,119 @@
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import redis
+from loguru import logger
+
+from src.settings.config import settings
+from src.utils.redis_tools import get_redis
+
+HTTP = "http"
+BROWSER = "browser"
+
+
+def get_domain(url: str) -> str:
+    """URL对应的站点域名（去掉端口，统一小写）"""
+    return (urlsplit(url).hostname or "").lower()
+
+
+class DomainStrategyStore:
+    """
+    按域名记录抓取结果，决定先走普通HTTP还是直接走浏览器
+    - 每个域名一个Redis hash，记录HTTP/浏览器两条路径的成功、失败次数和累计耗时，
+      所有worker共享，worker重启后学习结果不会丢失
+    - 样本数达到 FETCH_STRATEGY_MIN_SAMPLES 且HTTP成功率低于 FETCH_STRATEGY_HTTP_MIN_SUCCESS 的域名
+      直接走浏览器；每 FETCH_STRATEGY_REPROBE_EVERY 次仍会试探一次HTTP，站点改版后可以自动恢复
+    - Redis不可用时退化为进程内统计，不影响抓取
+    """
+
+    _FIELDS = ("http_ok", "http_fail", "http_elapsed", "browser_ok", "browser_fail", "browser_elapsed", "skipped")
+
+    def __init__(self, redis_url: Optional[str] = None, key_prefix: str = "crawler:fetch_strategy:"):
+        self.key_prefix = key_prefix
+        self.min_samples = settings.FETCH_STRATEGY_MIN_SAMPLES
+        self.http_min_success = settings.FETCH_STRATEGY_HTTP_MIN_SUCCESS
+        self.reprobe_every = settings.FETCH_STRATEGY_REPROBE_EVERY
+        self.ttl = settings.FETCH_STRATEGY_TTL
+        self._client = get_redis(redis_url)
+        self._local: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+
+    def _key(self, domain: str) -> str:
+        return f"{self.key_prefix}{domain}"
+
+    def _local_incr(self, domain: str, mapping: Dict[str, float]):
+        with self._lock:
+            stats = self._local.setdefault(domain, dict.fromkeys(self._FIELDS, 0))
+            for field, value in mapping.items():
+                stats[field] += value
+
+    def _incr(self, domain: str, mapping: Dict[str, float]):
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for field, value in mapping.items():
+                pipe.hincrbyfloat(self._key(domain), field, value)
+            pipe.expire(self._key(domain), self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"抓取策略统计写入Redis失败, 使用进程内统计: {domain}, {str(e)}")
+            self._local_incr(domain, mapping)
+
+    def stats(self, domain: str) -> Dict[str, float]:
+        """域名的累计统计"""
+        try:
+            raw = self._client.hgetall(self._key(domain))
+            stats = {k.decode(): float(v) for k, v in raw.items()}
+        except redis.RedisError:
+            with self._lock:
+                stats = dict(self._local.get(domain, {}))
+        return {field: stats.get(field, 0) for field in self._FIELDS}
+
+    def summary(self, domain: str) -> dict:
+        """域名的成功率和平均耗时，便于排查"""
+        s = self.stats(domain)
+        summary = {"domain": domain}
+        for path in (HTTP, BROWSER):
+            total = s[f"{path}_ok"] + s[f"{path}_fail"]
+            summary[f"{path}_attempts"] = int(total)
+            summary[f"{path}_success_rate"] = round(s[f"{path}_ok"] / total, 3) if total else None
+            summary[f"{path}_avg_latency"] = round(s[f"{path}_elapsed"] / total, 3) if total else None
+        summary["preferred"] = self.preferred(domain, record=False)
+        return summary
+
+    def preferred(self, domain: str, record: bool = True) -> str:
+        """
+        该域名应该先尝试的抓取方式
+        :param domain: 站点域名
+        :param record: 选择跳过HTTP时是否计数（用于定期重新试探HTTP）
+        :return: HTTP 或 BROWSER
+        """
+        s = self.stats(domain)
+        http_total = s["http_ok"] + s["http_fail"]
+        if http_total < self.min_samples or s["http_ok"] / http_total >= self.http_min_success:
+            return HTTP
+        if record:
+            self._incr(domain, {"skipped": 1})
+        # HTTP长期失败的域名直接走浏览器，但定期放行一次HTTP试探
+        if self.reprobe_every and (s["skipped"] + 1) % self.reprobe_every == 0:
+            return HTTP
+        return BROWSER
+
+    def record(self, domain: str, path: str, ok: bool, elapsed: float):
+        """记录一次抓取结果"""
+        self._incr(domain, {f"{path}_{'ok' if ok else 'fail'}": 1, f"{path}_elapsed": round(elapsed, 3)})
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_strategy_store() -> DomainStrategyStore:
+    """进程内共享的域名策略统计"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DomainStrategyStore()
+    return _store
+
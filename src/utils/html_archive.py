@@ -0,0 +1,215 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+
+import zstandard
+from loguru import logger
+from lxml import html as lxml_html
+
+from src.settings.config import settings
+from src.settings.site_specs import SITES
+
+
+class HtmlArchive:
+    """
+    原始HTML的本地内容寻址存储
+    - 页面按内容的sha256存为 objects/<前2位>/<其余>.html.zst（zstd压缩），相同内容只存一份
+    - index.sqlite3 记录每次抓取的 URL、抓取时间、内容哈希和抓取方式，可按URL和时间范围查询
+    - 多个worker进程可同时写入：对象文件先写临时文件再原子改名，索引使用SQLite WAL模式
+    """
+
+    def __init__(self, root: Optional[str] = None, level: Optional[int] = None):
+        self.root = Path(root or settings.HTML_ARCHIVE_DIR or PROJECT_ROOT / 'data' / 'html_archive')
+        self.level = level or settings.HTML_ARCHIVE_ZSTD_LEVEL
+        self.objects_dir = self.root / 'objects'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.root / 'index.sqlite3'
+        self._conn = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _index(self) -> sqlite3.Connection:
+        # fork后的子进程不能复用父进程的SQLite连接
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self._index_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fetches (
+                    url TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    via TEXT,
+                    size INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fetches_url ON fetches (url, fetched_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fetches_time ON fetches (fetched_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256[2:]}.html.zst"
+
+    def put(self, url: str, html: str, via: Optional[str] = None) -> str:
+        """保存一次抓取结果，返回内容哈希"""
+        raw = html.encode('utf-8')
+        sha256 = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(sha256)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zstandard.ZstdCompressor(level=self.level).compress(raw))
+            os.replace(tmp_path, path)
+        with self._lock:
+            conn = self._index()
+            conn.execute("INSERT INTO fetches (url, fetched_at, sha256, via, size) VALUES (?, ?, ?, ?, ?)",
+                         (url, time.time(), sha256, via, len(raw)))
+            conn.commit()
+        return sha256
+
+    def get(self, sha256: str) -> str:
+        """按内容哈希读取HTML"""
+        data = self._object_path(sha256).read_bytes()
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+
+    def latest(self, url: str) -> Optional[str]:
+        """URL最近一次抓取的HTML"""
+        with self._lock:
+            row = self._index().execute(
+                "SELECT sha256 FROM fetches WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def entries(self, since: Optional[float] = None, until: Optional[float] = None,
+                url_prefix: Optional[str] = None, latest_only: bool = True) -> List[Tuple[str, float, str]]:
+        """
+        查询归档记录
+        :param since / until: 抓取时间范围（时间戳）
+        :param url_prefix: 只返回该前缀的URL
+        :param latest_only: 同一URL只返回最近一次抓取
+        :return: [(url, fetched_at, sha256)]
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("fetched_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("fetched_at < ?")
+            params.append(until)
+        if url_prefix:
+            where.append("substr(url, 1, ?) = ?")
+            params.extend([len(url_prefix), url_prefix])
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        if latest_only:
+            sql = f"""
+                SELECT url, fetched_at, sha256 FROM fetches
+                WHERE rowid IN (SELECT max(rowid) FROM fetches {where_sql} GROUP BY url)
+                ORDER BY fetched_at
+            """
+        else:
+            sql = f"SELECT url, fetched_at, sha256 FROM fetches {where_sql} ORDER BY fetched_at"
+        with self._lock:
+            return self._index().execute(sql, params).fetchall()
+
+
+_archive = None
+_archive_lock = Lock()
+
+
+def get_html_archive() -> HtmlArchive:
+    """进程内共享的HTML归档"""
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = HtmlArchive()
+    return _archive
+
+
+def archive_html(url: str, html: Optional[str], via: Optional[str] = None, enabled: Optional[bool] = None):
+    """
+    抓取后按配置归档原始HTML，归档失败不影响抓取
+    :param enabled: 是否归档，默认取 HTML_ARCHIVE_ENABLED
+    """
+    if not html or not (settings.HTML_ARCHIVE_ENABLED if enabled is None else enabled):
+        return
+    try:
+        get_html_archive().put(url, html, via)
+    except Exception as e:
+        logger.warning(f"HTML归档失败: {url}, {str(e)}")
+
+
+def _reparse_one(args):
+    """在子进程中解析一个归档页面（需为模块级函数以便pickle）"""
+    site_name, url, sha256 = args
+    spec = SITES[site_name]
+    try:
+        record = spec.extractor.extract(lxml_html.fromstring(get_html_archive().get(sha256)), url)
+        return spec.build_row(record)
+    except Exception as e:
+        return {"detail_url": url, "error": f"{type(e).__name__}: {e}"}
+
+
+def reparse(site_name: str, since: Optional[float] = None, until: Optional[float] = None,
+            workers: Optional[int] = None) -> Iterator[dict]:
+    """
+    用当前的抽取逻辑重新解析某个站点的归档页面，不发起任何网络请求
+    :param site_name: SiteSpec名称
+    :param since / until: 抓取时间范围（时间戳）
+    :param workers: 解析进程数，默认CPU核数
+    :return: 按抓取时间顺序产出解析结果，解析失败的页面带error字段
+    """
+    spec = SITES[site_name]
+    prefixes = {f"{urlsplit(u).scheme}://{urlsplit(u).netloc}/" for u in spec.listing_urls}
+    listing_urls = set(spec.listing_urls)
+    tasks = [(site_name, url, sha256)
+             for prefix in prefixes
+             for url, _, sha256 in get_html_archive().entries(since, until, url_prefix=prefix)
+             if url not in listing_urls]
+    logger.info(f"{site_name} 待重新解析的归档页面: {len(tasks)}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_reparse_one, tasks, chunksize=32)
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.datetime.fromisoformat(value).timestamp() if value else None
+
+
+if __name__ == '__main__':
+    # 示例：python src/utils/html_archive.py aibase --since 2026-10-01 --output reparsed.jsonl
+    parser = argparse.ArgumentParser(description='用当前抽取逻辑重新解析归档的HTML')
+    parser.add_argument('site', help='SiteSpec名称')
+    parser.add_argument('--since', help='抓取时间下限，ISO格式')
+    parser.add_argument('--until', help='抓取时间上限，ISO格式')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数')
+    parser.add_argument('--output', help='结果输出的JSONL文件，默认输出到标准输出')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    total = failed = 0
+    try:
+        for row in reparse(args.site, _parse_time(args.since), _parse_time(args.until), args.workers):
+            total += 1
+            failed += 'error' in row
+            out.write(json.dumps(row, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info(f"重新解析完成: {total} 页, 失败 {failed} 页, 耗时 {time.monotonic() - start:.2f} 秒")
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+
+import redis
+from loguru import logger
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.settings.config import settings
+from src.utils.redis_tools import get_redis
+
+# 数据库或Redis不可用这类暂时性故障：整批留在待确认列表等待恢复，不计入失败次数
+_TRANSIENT_ERRORS = (OperationalError, DisconnectionError, InterfaceError, PoolTimeoutError,
+                     redis.ConnectionError, redis.TimeoutError, ConnectionError, TimeoutError)
+
+
+class IngestBuffer:
+    """
+    采集结果的写后缓冲（Redis Stream），采集任务只追加，由入库任务批量写库
+    - append() 每条记录一个stream条目，采集任务不再等待数据库
+    - drain() 通过消费组读取一批记录交给写库函数，成功后ACK并删除；失败的记录留在待确认列表，
+      超过 INGEST_CLAIM_IDLE_SECONDS 未确认后由任意入库任务重新领取（包括异常退出的worker留下的）
+    - 数据库/Redis暂时不可用时整批保留、本次停止入库，不计入失败次数，故障多久都不会丢进死信
+    - 其他写库异常视为数据问题：把本批二分重试，定位出写不进去的单条记录，其余记录照常写入；
+      单条记录的数据失败次数记在 <stream>:failures 中，达到 INGEST_MAX_DELIVERIES 次后移入死信stream
+    - 死信修复后通过 replay_dead() 放回缓冲重新入库
+    用法：
+        IngestBuffer().append(rows)
+        IngestBuffer().drain(insert_into_table)
+        python src/utils/ingest_buffer.py stats
+        python src/utils/ingest_buffer.py replay
+    """
+
+    GROUP = "ingest_sink"
+
+    def __init__(self, table_name: Optional[str] = None, key_prefix: str = "crawler:ingest:"):
+        self.table_name = table_name or settings.CRAWL_TABLE_NAME
+        self.stream_key = f"{key_prefix}{self.table_name}"
+        self.dead_key = f"{self.stream_key}:dead"
+        self.failures_key = f"{self.stream_key}:failures"
+        self.batch_size = settings.INGEST_BATCH_SIZE
+        self.claim_idle_ms = settings.INGEST_CLAIM_IDLE_SECONDS * 1000
+        self.max_deliveries = settings.INGEST_MAX_DELIVERIES
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._client = get_redis()
+        self._group_ready = False
+
+    def append(self, rows: List[dict]) -> int:
+        """追加待入库的记录，返回追加条数"""
+        if not rows:
+            return 0
+        pipe = self._client.pipeline(transaction=False)
+        for row in rows:
+            pipe.xadd(self.stream_key, {"row": json.dumps(row, ensure_ascii=False, default=str)})
+        pipe.execute()
+        return len(rows)
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self._client.xgroup_create(self.stream_key, self.GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def _read_batch(self) -> List[Tuple[str, dict]]:
+        """先领取超时未确认的记录，再读取新记录"""
+        entries = []
+        _, claimed, *_ = self._client.xautoclaim(self.stream_key, self.GROUP, self.consumer,
+                                                 min_idle_time=self.claim_idle_ms, start_id="0-0",
+                                                 count=self.batch_size)
+        entries.extend(entry for entry in claimed if entry[1])
+        if len(entries) < self.batch_size:
+            response = self._client.xreadgroup(self.GROUP, self.consumer, {self.stream_key: ">"},
+                                               count=self.batch_size - len(entries))
+            for _, stream_entries in response or []:
+                entries.extend(stream_entries)
+        return [(self._decode(entry_id), fields) for entry_id, fields in entries]
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _record_failures(self, entry_ids: List[str]):
+        """单条记录写库失败（数据问题）时累加失败次数，达到上限的移入死信stream"""
+        pipe = self._client.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.hincrby(self.failures_key, entry_id, 1)
+        failures = pipe.execute()
+        dead = [entry_id for entry_id, count in zip(entry_ids, failures) if count >= self.max_deliveries]
+        if not dead:
+            return
+        pipe = self._client.pipeline(transaction=True)
+        for entry_id in dead:
+            for _, fields in self._client.xrange(self.stream_key, min=entry_id, max=entry_id):
+                pipe.xadd(self.dead_key, fields)
+        pipe.xack(self.stream_key, self.GROUP, *dead)
+        pipe.xdel(self.stream_key, *dead)
+        pipe.hdel(self.failures_key, *dead)
+        pipe.execute()
+        logger.error(f"{len(dead)} 条记录入库失败 {self.max_deliveries} 次, 已移入死信: {self.dead_key}")
+
+    def _write(self, writer: Callable[[List[dict]], object],
+               entries: List[Tuple[str, dict]]) -> Tuple[List[str], List[str]]:
+        """
+        写入一批记录，数据异常时二分定位写不进去的单条记录
+        :return: (写入成功的id, 单独写入仍失败的id)；暂时性故障直接抛出
+        """
+        try:
+            writer([row for _, row in entries])
+            return [entry_id for entry_id, _ in entries], []
+        except _TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if len(entries) == 1:
+                logger.error(f"记录入库失败: {entries[0][0]}, {str(e)}")
+                return [], [entries[0][0]]
+        middle = len(entries) // 2
+        left_ok, left_failed = self._write(writer, entries[:middle])
+        right_ok, right_failed = self._write(writer, entries[middle:])
+        return left_ok + right_ok, left_failed + right_failed
+
+    def drain(self, writer: Callable[[List[dict]], object], max_seconds: Optional[float] = None) -> int:
+        """
+        批量取出记录写库，直到缓冲为空、超过max_seconds或遇到暂时性故障
+        :param writer: 写库函数，参数为记录列表，抛出异常视为本批失败
+        :param max_seconds: 本次最多运行的秒数，默认 INGEST_DRAIN_MAX_SECONDS
+        :return: 成功写库的记录数
+        """
+        self._ensure_group()
+        deadline = time.monotonic() + (max_seconds or settings.INGEST_DRAIN_MAX_SECONDS)
+        written = 0
+        while time.monotonic() < deadline:
+            entries = self._read_batch()
+            if not entries:
+                break
+            rows = [(entry_id, json.loads(fields[b"row"] if b"row" in fields else fields["row"]))
+                    for entry_id, fields in entries]
+            try:
+                ok_ids, failed_ids = self._write(writer, rows)
+            except _TRANSIENT_ERRORS as e:
+                logger.warning(f"数据库暂时不可用, {len(rows)} 条记录留在缓冲中等待恢复: {str(e)}")
+                break
+            if ok_ids:
+                pipe = self._client.pipeline(transaction=False)
+                pipe.xack(self.stream_key, self.GROUP, *ok_ids)
+                pipe.xdel(self.stream_key, *ok_ids)
+                pipe.hdel(self.failures_key, *ok_ids)
+                pipe.execute()
+                written += len(ok_ids)
+            if failed_ids:
+                self._record_failures(failed_ids)
+                break
+        return written
+
+    def replay_dead(self, limit: Optional[int] = None) -> int:
+        """把死信stream中的记录放回缓冲（修复数据或表结构后执行），返回放回的条数"""
+        replayed = 0
+        while limit is None or replayed < limit:
+            count = min(self.batch_size, limit - replayed) if limit is not None else self.batch_size
+            entries = self._client.xrange(self.dead_key, min="-", max="+", count=count)
+            if not entries:
+                break
+            pipe = self._client.pipeline(transaction=True)
+            for _, fields in entries:
+                pipe.xadd(self.stream_key, fields)
+            pipe.xdel(self.dead_key, *[entry_id for entry_id, _ in entries])
+            pipe.execute()
+            replayed += len(entries)
+        if replayed:
+            logger.info(f"已把 {replayed} 条死信记录放回缓冲: {self.stream_key}")
+        return replayed
+
+    def stats(self) -> Dict[str, int]:
+        """缓冲长度、待确认数和死信数"""
+        self._ensure_group()
+        pending = self._client.xpending(self.stream_key, self.GROUP)
+        return {"length": self._client.xlen(self.stream_key), "pending": pending["pending"],
+                "dead": self._client.xlen(self.dead_key)}
+
+
+if __name__ == '__main__':
+    # 示例：python src/utils/ingest_buffer.py replay --limit 1000
+    parser = argparse.ArgumentParser(description='写后缓冲状态查看与死信重放')
+    parser.add_argument('command', choices=['stats', 'replay'])
+    parser.add_argument('--table', default=None, help='表名，默认 CRAWL_TABLE_NAME')
+    parser.add_argument('--limit', type=int, default=None, help='replay最多放回的条数')
+    args = parser.parse_args()
+
+    buffer = IngestBuffer(args.table)
+    if args.command == 'replay':
+        print(f"放回 {buffer.replay_dead(args.limit)} 条")
+    print(json.dumps(buffer.stats(), ensure_ascii=False))
@@ -0,0 +1,115 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import redis
+import requests
+from loguru import logger
+from lxml import html
+
+from src.settings.config import settings
+from src.utils.craw_tools import browser_like_headers
+from src.utils.extractor import XPathLike, compile_xpath
+from src.utils.fetch_strategy import get_domain
+from src.utils.rate_limiter import get_rate_limiter
+from src.utils.redis_tools import get_redis
+
+
+@dataclass
+class ListingResult:
+    """列表页的抓取结果"""
+    url: str
+    changed: bool
+    links: List[str] = field(default_factory=list)
+    parse_html: Any = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    links_hash: Optional[str] = None
+
+
+class ListingWatcher:
+    """
+    列表页变更检测
+    - 记录每个列表页的 ETag / Last-Modified，下次抓取带上 If-None-Match / If-Modified-Since，
+      服务端返回304时不下载也不解析
+    - 记录列表页链接列表的哈希，页面有变化（广告、时间戳等）但文章链接不变时同样视为未变化
+    - 状态在任务处理成功后调用 commit() 才写入，任务失败时下次仍会重新处理
+    - Redis不可用时每次都视为有变化
+    用法：
+        watcher = ListingWatcher()
+        listing = watcher.fetch(home_url, url_xpath)
+        if listing.changed:
+            ...处理listing.links...
+            watcher.commit(listing)
+    """
+
+    def __init__(self, key_prefix: str = "crawler:listing:"):
+        self.key_prefix = key_prefix
+        self.ttl = settings.LISTING_WATCH_TTL
+        self._client = get_redis()
+
+    def _key(self, url: str) -> str:
+        return self.key_prefix + hashlib.sha1(url.encode()).hexdigest()
+
+    def _state(self, url: str) -> dict:
+        try:
+            return {k.decode(): v.decode() for k, v in self._client.hgetall(self._key(url)).items()}
+        except redis.RedisError as e:
+            logger.warning(f"列表页状态读取失败, 视为有变化: {url}, {str(e)}")
+            return {}
+
+    @staticmethod
+    def hash_links(links: List[str]) -> str:
+        return hashlib.sha1('\n'.join(links).encode()).hexdigest()
+
+    def fetch(self, url: str, link_xpath: XPathLike, timeout: float = None) -> ListingResult:
+        """
+        条件请求抓取列表页并提取文章链接
+        :param url: 列表页URL
+        :param link_xpath: 文章链接的XPath（字符串或已编译的etree.XPath）
+        :param timeout: 请求超时时间(秒)
+        :return: ListingResult，changed为False时无需继续处理
+        """
+        state = self._state(url)
+        headers = browser_like_headers()
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+        domain = get_domain(url)
+        limiter = get_rate_limiter()
+        limiter.acquire(domain)
+        response = requests.get(url, headers=headers, timeout=timeout or settings.REQUEST_TIMEOUT)
+        limiter.observe(domain, response.status_code, response.headers)
+        if response.status_code == 304:
+            logger.info(f"列表页未变化(304): {url}")
+            return ListingResult(url=url, changed=False)
+        response.raise_for_status()
+
+        parse_html = html.fromstring(response.text)
+        links = [str(link) for link in compile_xpath(link_xpath)(parse_html)]
+        links_hash = self.hash_links(links)
+        result = ListingResult(url=url, changed=links_hash != state.get('links_hash'), links=links,
+                               parse_html=parse_html, etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'), links_hash=links_hash)
+        if not result.changed:
+            logger.info(f"列表页链接未变化: {url}")
+            # 链接没变但缓存头可能已更新，直接刷新
+            self.commit(result)
+        return result
+
+    def commit(self, result: ListingResult):
+        """列表页处理成功后保存状态"""
+        mapping = {'links_hash': result.links_hash, 'etag': result.etag, 'last_modified': result.last_modified}
+        mapping = {k: v for k, v in mapping.items() if v}
+        if not mapping:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.delete(self._key(result.url))
+            pipe.hset(self._key(result.url), mapping=mapping)
+            pipe.expire(self._key(result.url), self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"列表页状态保存失败: {result.url}, {str(e)}")
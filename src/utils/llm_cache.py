@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+import redis
+from loguru import logger
+
+from src.settings.config import settings
+from src.utils.redis_tools import get_redis
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+
+
+def cache_key(model: str, messages: list, temperature: float, **params) -> str:
+    """(模型, 消息, 温度, 其他影响输出的参数) 的sha256"""
+    payload = {"model": model, "messages": messages, "temperature": temperature,
+               **{k: v for k, v in params.items() if v is not None}}
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SqliteCacheBackend:
+    """
+    本地SQLite文件缓存，同一台机器上的worker进程共享
+    - WAL模式，多进程可同时读写；fork后的子进程重新打开连接
+    - 命中时记录访问时间，攒够 _TOUCH_FLUSH_EVERY 条或每隔 _TOUCH_FLUSH_INTERVAL 秒批量写回，
+      读多的场景不必每次命中都提交一次写事务；进程退出时未写回的访问时间丢弃，只影响淘汰顺序
+    - 总大小超过max_bytes时按最久未访问淘汰到90%
+    """
+
+    _EVICT_CHECK_EVERY = 100
+    _TOUCH_FLUSH_EVERY = 100
+    _TOUCH_FLUSH_INTERVAL = 60
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or Path(settings.LLM_CACHE_DIR or PROJECT_ROOT / 'data' / 'llm_cache') / 'cache.sqlite3')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or settings.LLM_CACHE_MAX_BYTES
+        self._conn = None
+        self._pid = None
+        self._lock = Lock()
+        self._puts = 0
+        self._touched = {}
+        self._touched_flushed_at = time.time()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._touched = {}
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            self._touched[key] = now
+            if (len(self._touched) >= self._TOUCH_FLUSH_EVERY
+                    or now - self._touched_flushed_at >= self._TOUCH_FLUSH_INTERVAL):
+                self._flush_touched(conn, now)
+            return row[0]
+
+    def _flush_touched(self, conn: sqlite3.Connection, now: float):
+        """批量写回命中条目的访问时间"""
+        if self._touched:
+            conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?",
+                             [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            conn.commit()
+            self._touched = {}
+        self._touched_flushed_at = now
+
+    def set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                         (key, value, len(value.encode("utf-8")), now + ttl, now))
+            conn.commit()
+            self._puts += 1
+            if self._puts % self._EVICT_CHECK_EVERY == 0:
+                self._evict(conn, now)
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+            self._touched.pop(key, None)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        self._flush_touched(conn, now)
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        evicted = 0
+        while total > self.max_bytes * 0.9:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 500").fetchall()
+            if not rows:
+                break
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(row[0],) for row in rows])
+            total -= sum(row[1] for row in rows)
+            evicted += len(rows)
+        conn.commit()
+        if evicted:
+            logger.info(f"LLM缓存超过 {self.max_bytes} 字节, 淘汰 {evicted} 条")
+
+    def size(self) -> dict:
+        with self._lock:
+            entries, total = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": total}
+
+
+class RedisCacheBackend:
+    """
+    Redis缓存，所有机器上的worker共享
+    - 每条结果一个带过期时间的key；写入时间记录在有序集合中，总大小记录在计数器中
+    - 总大小超过max_bytes时按写入时间从旧到新淘汰到90%（已过期的条目最旧，会先被清理出统计）
+    """
+
+    def __init__(self, key_prefix: str = "crawler:llm_cache:", max_bytes: Optional[int] = None):
+        self.key_prefix = key_prefix
+        self.index_key = f"{key_prefix}index"
+        self.sizes_key = f"{key_prefix}sizes"
+        self.bytes_key = f"{key_prefix}bytes"
+        self.max_bytes = max_bytes or settings.LLM_CACHE_MAX_BYTES
+        self._client = get_redis()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(f"{self.key_prefix}{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int):
+        size = len(value.encode("utf-8"))
+        previous = int(self._client.hget(self.sizes_key, key) or 0)
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(f"{self.key_prefix}{key}", value, ex=ttl)
+        pipe.zadd(self.index_key, {key: time.time()})
+        pipe.hset(self.sizes_key, key, size)
+        pipe.incrby(self.bytes_key, size - previous)
+        total = pipe.execute()[-1]
+        if total > self.max_bytes:
+            self._evict(total)
+
+    def delete(self, key: str):
+        size = int(self._client.hget(self.sizes_key, key) or 0)
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(f"{self.key_prefix}{key}")
+        pipe.zrem(self.index_key, key)
+        pipe.hdel(self.sizes_key, key)
+        pipe.decrby(self.bytes_key, size)
+        pipe.execute()
+
+    def _evict(self, total: int):
+        evicted = 0
+        while total > self.max_bytes * 0.9:
+            keys = [k.decode("utf-8") for k, _ in self._client.zpopmin(self.index_key, 500)]
+            if not keys:
+                break
+            sizes = [int(s or 0) for s in self._client.hmget(self.sizes_key, keys)]
+            pipe = self._client.pipeline(transaction=False)
+            pipe.delete(*[f"{self.key_prefix}{k}" for k in keys])
+            pipe.hdel(self.sizes_key, *keys)
+            pipe.decrby(self.bytes_key, sum(sizes))
+            total = pipe.execute()[-1]
+            evicted += len(keys)
+        if evicted:
+            logger.info(f"LLM缓存超过 {self.max_bytes} 字节, 淘汰 {evicted} 条")
+
+    def size(self) -> dict:
+        return {"entries": self._client.zcard(self.index_key), "bytes": int(self._client.get(self.bytes_key) or 0)}
+
+
+class LLMCache:
+    """
+    chat() 的响应缓存，同一(模型, 消息, 温度)的请求只调用一次接口
+    - 后端由 LLM_CACHE_BACKEND 选择：sqlite（本机共享）或 redis（集群共享），none 关闭缓存
+    - 条目 LLM_CACHE_TTL 秒后过期，总大小超过 LLM_CACHE_MAX_BYTES 时淘汰旧条目
+    - 缓存读写失败只记录警告，不影响接口调用
+    - 只应缓存通过校验的结果：chat() 传入 validate 时，校验不通过的结果不写入，命中的旧结果校验不通过时删除
+    """
+
+    def __init__(self, backend=None, ttl: Optional[int] = None):
+        self.backend = backend
+        self.ttl = ttl or settings.LLM_CACHE_TTL
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = Lock()
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except (sqlite3.Error, redis.RedisError, OSError) as e:
+            self._count("errors")
+            logger.warning(f"LLM缓存读取失败: {str(e)}")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str):
+        if self.backend is None or not value:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except (sqlite3.Error, redis.RedisError, OSError) as e:
+            self._count("errors")
+            logger.warning(f"LLM缓存写入失败: {str(e)}")
+
+    def delete(self, key: str):
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(key)
+        except (sqlite3.Error, redis.RedisError, OSError) as e:
+            self._count("errors")
+            logger.warning(f"LLM缓存删除失败: {str(e)}")
+
+    def stats(self) -> dict:
+        """本进程的命中统计和缓存大小"""
+        total = self.hits + self.misses
+        result = {"backend": type(self.backend).__name__ if self.backend else None,
+                  "hits": self.hits, "misses": self.misses, "errors": self.errors,
+                  "hit_rate": round(self.hits / total, 4) if total else 0.0}
+        if self.backend is not None:
+            try:
+                result.update(self.backend.size())
+            except (sqlite3.Error, redis.RedisError, OSError):
+                pass
+        return result
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """进程内共享的LLM响应缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_name = settings.LLM_CACHE_BACKEND.lower()
+                if backend_name == "redis":
+                    backend = RedisCacheBackend()
+                elif backend_name == "sqlite":
+                    backend = SqliteCacheBackend()
+                else:
+                    backend = None
+                _cache = LLMCache(backend)
+    return _cache
@@ -0,0 +1,312 @@
+import argparse
+import atexit
+import datetime
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+
+import redis
+from celery.signals import task_postrun
+from loguru import logger
+from sqlalchemy import text
+
+from src.settings.config import settings
+from src.utils.db_tools import std_db
+from src.utils.redis_tools import get_redis
+
+GROUP_FIELDS = ("stage", "model", "day", "article_id")
+_BUDGET_PREFIX = "crawler:llm_usage:tokens:"
+
+# 当前正在处理的文章，由任务设置，账本记录时读取（asyncio任务之间互不影响）
+_current_article: ContextVar[Optional[str]] = ContextVar("llm_usage_article_id", default=None)
+
+
+class LLMBudgetExceededError(Exception):
+    """当日token用量超过预算，该优先级的调用被暂停"""
+
+
+def set_current_article(article_id: Optional[str]):
+    """标记之后的LLM调用属于哪篇文章，返回可用于 _current_article.reset() 的token"""
+    return _current_article.set(article_id)
+
+
+def usage_table_name() -> str:
+    """账本表与业务表同schema"""
+    schema, _, _ = settings.CRAWL_TABLE_NAME.rpartition('.')
+    return f"{schema}.llm_usage" if schema else "llm_usage"
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _budget_key(day: Optional[datetime.date] = None) -> str:
+    return f"{_BUDGET_PREFIX}{(day or datetime.date.today()).strftime('%Y%m%d')}"
+
+
+def tokens_today() -> int:
+    """所有worker当日已消耗的token数（不含缓存命中）"""
+    try:
+        return int(get_redis().get(_budget_key()) or 0)
+    except redis.RedisError as e:
+        logger.warning(f"读取当日token用量失败: {str(e)}")
+        return 0
+
+
+def within_budget(priority: str = "normal") -> bool:
+    """
+    当日用量是否还在预算内，LLM_DAILY_TOKEN_BUDGET 为0时不限制
+    - normal：用量达到预算后暂停
+    - low：用量达到预算的 LLM_LOW_PRIORITY_BUDGET_SHARE 后暂停，为翻译等主流程留出余量
+    """
+    budget = settings.LLM_DAILY_TOKEN_BUDGET
+    if budget <= 0:
+        return True
+    limit = budget * settings.LLM_LOW_PRIORITY_BUDGET_SHARE if priority == "low" else budget
+    return tokens_today() < limit
+
+
+def check_budget(priority: str = "normal"):
+    """超过预算时抛出 LLMBudgetExceededError"""
+    if not within_budget(priority):
+        raise LLMBudgetExceededError(f"当日token用量已超过预算({settings.LLM_DAILY_TOKEN_BUDGET}), "
+                                     f"暂停 {priority} 优先级的调用")
+
+
+class UsageLedger:
+    """
+    LLM调用账本：记录每次调用的模型、调用阶段（调用chat的函数名）、文章、prompt/completion token数和耗时
+    - record() 只写内存，攒够 LLM_USAGE_FLUSH_ROWS 条或距上次写出超过 LLM_USAGE_FLUSH_INTERVAL 秒时批量写出；
+      任务结束和进程退出时也会写出
+    - 写出目标由 LLM_USAGE_SINK 选择：db（llm_usage表，迁移V005）、file（data/llm_usage下按天的JSONL）、none
+    - 写出失败的记录保留到下次重试，最多保留 10 倍批量大小，超出的丢弃并记录警告
+    - 非缓存命中的token同时累加到Redis中的当日计数，供 within_budget() 判断预算
+    """
+
+    def __init__(self, sink: Optional[str] = None, max_rows: Optional[int] = None, interval: Optional[float] = None):
+        self.sink = (sink or settings.LLM_USAGE_SINK).lower()
+        self.max_rows = max_rows or settings.LLM_USAGE_FLUSH_ROWS
+        self.interval = interval or settings.LLM_USAGE_FLUSH_INTERVAL
+        self.table_name = usage_table_name()
+        self.file_dir = PROJECT_ROOT / 'data' / 'llm_usage'
+        self._rows: List[dict] = []
+        self._totals: Dict[tuple, dict] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, model: str, stage: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0, cached: bool = False, status: str = "ok"):
+        """记录一次调用，latency单位为秒"""
+        row = {
+            "call_id": uuid.uuid4().hex,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+            "model": model,
+            "stage": stage,
+            "article_id": _current_article.get(),
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "total_tokens": int(prompt_tokens or 0) + int(completion_tokens or 0),
+            "latency_ms": int(latency * 1000),
+            "cached": cached,
+            "status": status,
+        }
+        with self._lock:
+            self._rows.append(row)
+            totals = self._totals.setdefault((stage, model), {
+                "calls": 0, "cached": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "latency_ms": deque(maxlen=1000)})
+            totals["calls"] += 1
+            totals["cached"] += int(cached)
+            totals["errors"] += int(status != "ok")
+            totals["prompt_tokens"] += row["prompt_tokens"]
+            totals["completion_tokens"] += row["completion_tokens"]
+            if not cached:
+                totals["latency_ms"].append(row["latency_ms"])
+            due = len(self._rows) >= self.max_rows or time.monotonic() - self._last_flush >= self.interval
+        if row["total_tokens"] and not cached:
+            self._add_to_budget(row["total_tokens"])
+        if due:
+            self.flush()
+
+    @staticmethod
+    def _add_to_budget(tokens: int):
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.incrby(_budget_key(), tokens)
+            pipe.expire(_budget_key(), 2 * 86400)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"累加当日token用量失败: {str(e)}")
+
+    def flush(self) -> int:
+        """把内存中的记录写出，返回写出的条数；失败时保留记录，不抛出异常"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                self._last_flush = time.monotonic()
+            if not rows or self.sink == "none":
+                return 0
+            try:
+                if self.sink == "db":
+                    std_db.bulk_insert(self.table_name, rows, conflict_key="call_id")
+                else:
+                    self._write_file(rows)
+            except Exception as e:
+                with self._lock:
+                    self._rows[:0] = rows
+                    dropped = len(self._rows) - self.max_rows * 10
+                    if dropped > 0:
+                        del self._rows[:dropped]
+                logger.warning(f"LLM调用账本写出失败, {len(rows)} 条保留到下次重试"
+                               + (f", 丢弃最早的 {dropped} 条" if dropped > 0 else "") + f": {str(e)}")
+                return 0
+            return len(rows)
+
+    def _write_file(self, rows: List[dict]):
+        self.file_dir.mkdir(parents=True, exist_ok=True)
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row["created_at"].astimezone().strftime('%Y%m%d')].append(row)
+        for day, day_rows in by_day.items():
+            with open(self.file_dir / f"usage-{day}.jsonl", "a", encoding="utf-8") as f:
+                for row in day_rows:
+                    f.write(json.dumps({**row, "created_at": row["created_at"].isoformat()}, ensure_ascii=False) + "\n")
+
+    def summary(self) -> List[dict]:
+        """本进程启动以来按 (stage, model) 汇总的调用数、token数和延迟"""
+        with self._lock:
+            items = [(key, {**value, "latency_ms": list(value["latency_ms"])}) for key, value in self._totals.items()]
+        return [_summarize({"stage": stage, "model": model}, totals) for (stage, model), totals in items]
+
+
+def _summarize(group: dict, totals: dict) -> dict:
+    latencies = totals["latency_ms"]
+    return {
+        **group,
+        "calls": totals["calls"],
+        "cached": totals["cached"],
+        "errors": totals["errors"],
+        "prompt_tokens": totals["prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "total_tokens": totals["prompt_tokens"] + totals["completion_tokens"],
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+    }
+
+
+def _load_rows(since: datetime.datetime, until: datetime.datetime, sink: str) -> Iterable[dict]:
+    if sink == "db":
+        with std_db.read_session() as session:
+            result = session.execute(text(f"""
+                SELECT created_at, model, stage, article_id, prompt_tokens, completion_tokens,
+                       latency_ms, cached, status
+                FROM {usage_table_name()}
+                WHERE created_at >= :since AND created_at < :until
+            """), {"since": since, "until": until})
+            for row in result.mappings():
+                yield dict(row)
+        return
+    file_dir = PROJECT_ROOT / 'data' / 'llm_usage'
+    day = since.astimezone().date()
+    while day <= until.astimezone().date():
+        path = file_dir / f"usage-{day.strftime('%Y%m%d')}.jsonl"
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+                    if since <= row["created_at"] < until:
+                        yield row
+        day += datetime.timedelta(days=1)
+
+
+def usage_report(since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                 group_by: Sequence[str] = ("stage",), sink: Optional[str] = None) -> List[dict]:
+    """
+    按阶段/模型/日期/文章汇总已写出的调用记录，按总token数降序
+    :param since: 开始时间（含），默认24小时前
+    :param until: 结束时间（不含），默认现在
+    :param group_by: 分组字段，可选 stage / model / day / article_id 的组合
+    :param sink: 读取的数据来源，默认 LLM_USAGE_SINK
+    :return: 每组的调用数、缓存命中数、错误数、token数和p50/p95延迟（毫秒，不含缓存命中）
+    """
+    unknown = set(group_by) - set(GROUP_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的分组字段: {sorted(unknown)}")
+    until = until or datetime.datetime.now(datetime.timezone.utc)
+    since = since or until - datetime.timedelta(days=1)
+    groups: Dict[tuple, dict] = {}
+    for row in _load_rows(since, until, (sink or settings.LLM_USAGE_SINK).lower()):
+        created_at = row["created_at"]
+        row["day"] = (created_at.astimezone() if created_at.tzinfo else created_at).date().isoformat()
+        key = tuple(row.get(field) for field in group_by)
+        totals = groups.setdefault(key, {
+            "calls": 0, "cached": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": []})
+        totals["calls"] += 1
+        totals["cached"] += int(bool(row["cached"]))
+        totals["errors"] += int(row["status"] != "ok")
+        totals["prompt_tokens"] += row["prompt_tokens"]
+        totals["completion_tokens"] += row["completion_tokens"]
+        if not row["cached"]:
+            totals["latency_ms"].append(row["latency_ms"])
+    report = [_summarize(dict(zip(group_by, key)), totals) for key, totals in groups.items()]
+    return sorted(report, key=lambda item: item["total_tokens"], reverse=True)
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_pid: Optional[int] = None
+_ledger_lock = Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """当前进程的调用账本（prefork子进程各自一份，不继承父进程未写出的记录）"""
+    global _ledger, _ledger_pid
+    if _ledger is None or _ledger_pid != os.getpid():
+        with _ledger_lock:
+            if _ledger is None or _ledger_pid != os.getpid():
+                _ledger = UsageLedger()
+                _ledger_pid = os.getpid()
+    return _ledger
+
+
+@task_postrun.connect
+def _flush_after_task(**kwargs):
+    """每个任务结束后写出本进程的调用记录"""
+    if _ledger is not None and _ledger_pid == os.getpid():
+        _ledger.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _ledger is not None and _ledger_pid == os.getpid():
+        _ledger.flush()
+
+
+if __name__ == '__main__':
+    # 示例：python src/utils/llm_usage.py --days 7 --group-by stage,day
+    parser = argparse.ArgumentParser(description='按阶段/模型/日期汇总LLM调用的token数和延迟')
+    parser.add_argument('--days', type=float, default=1, help='统计最近多少天')
+    parser.add_argument('--group-by', default='stage', help=f"分组字段，逗号分隔: {','.join(GROUP_FIELDS)}")
+    parser.add_argument('--top', type=int, default=0, help='只显示总token数最多的前N组')
+    args = parser.parse_args()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = usage_report(now - datetime.timedelta(days=args.days), now,
+                        [field.strip() for field in args.group_by.split(',') if field.strip()])
+    print(json.dumps(rows[:args.top] if args.top else rows, ensure_ascii=False, indent=2))
+    print(f"当日已用token: {tokens_today()}, 预算: {settings.LLM_DAILY_TOKEN_BUDGET or '不限'}")
@@ -0,0 +1,207 @@
+import argparse
+import datetime
+import hashlib
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from string import Template
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+
+from loguru import logger
+from sqlalchemy import text
+
+from src.settings.config import settings
+from src.utils.db_tools import std_db
+
+MIGRATIONS_DIR = PROJECT_ROOT / 'sql' / 'migrations'
+_FILE_PATTERN = re.compile(r'^V(\d+)__(.+)\.sql$')
+# OceanBase（MySQL模式）不支持 IF [NOT] EXISTS 的字段/索引DDL，执行前按 information_schema 判断
+_ADD_COLUMN = re.compile(r'^ALTER\s+TABLE\s+(\S+)\s+ADD\s+COLUMN\s+(\w+)', re.I)
+_CREATE_INDEX = re.compile(r'^CREATE\s+INDEX\s+(\w+)\s+ON\s+(\S+)', re.I)
+_DROP_INDEX = re.compile(r'^DROP\s+INDEX\s+(\w+)\s+ON\s+(\S+)', re.I)
+
+
+@dataclass
+class Migration:
+    """单个版本化迁移脚本"""
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    def statements(self, variables: Dict[str, str]) -> List[str]:
+        """替换变量后按语句拆分（以行尾分号为语句结束，去掉注释行）"""
+        sql = Template(self.path.read_text(encoding='utf-8')).substitute(variables)
+        statements, current = [], []
+        for line in sql.splitlines():
+            if line.strip().startswith('--'):
+                continue
+            current.append(line)
+            if line.rstrip().endswith(';'):
+                statements.append('\n'.join(current).strip().rstrip(';'))
+                current = []
+        if '\n'.join(current).strip():
+            statements.append('\n'.join(current).strip())
+        return [s for s in statements if s]
+
+
+class MigrationRunner:
+    """
+    版本化的数据库迁移
+    - 脚本位于 sql/migrations/<postgresql|oceanbase>/V<版本>__<说明>.sql，按 DATABASE_TYPE 选择目录
+    - 脚本中的 ${table} / ${table_name} / ${schema_prefix} 替换为 CRAWL_TABLE_NAME 对应的值
+    - 已执行的版本记录在与业务表同schema的 schema_migrations 表中，脚本内容被修改时给出警告
+    - PostgreSQL每个脚本在一个事务中执行；OceanBase的DDL会自动提交，脚本中途失败时已执行的DDL不会回滚
+    - OceanBase上字段已存在的 ADD COLUMN、索引已存在的 CREATE INDEX、索引不存在的 DROP INDEX 直接跳过，
+      已手工加过字段的库和中途失败的脚本可以直接重试；数据修改语句（UPDATE等）不做判断，失败时需人工处理
+    - 已按历史建表脚本建好的库先执行 baseline 1，从V002开始升级
+    """
+
+    def __init__(self, table_name: Optional[str] = None, migrations_dir: Optional[Path] = None):
+        table_name = table_name or settings.CRAWL_TABLE_NAME
+        schema, _, name = table_name.rpartition('.')
+        self.variables = {
+            'table': table_name,
+            'table_name': name,
+            'schema_prefix': f"{schema}." if schema else "",
+        }
+        self.dialect = 'oceanbase' if settings.DATABASE_TYPE.lower() == 'oceanbase' else 'postgresql'
+        self.migrations_dir = Path(migrations_dir or MIGRATIONS_DIR) / self.dialect
+        self.history_table = f"{self.variables['schema_prefix']}schema_migrations"
+
+    def discover(self) -> List[Migration]:
+        """按版本号排序的全部迁移脚本"""
+        migrations = []
+        for path in self.migrations_dir.glob('V*.sql'):
+            match = _FILE_PATTERN.match(path.name)
+            if match:
+                migrations.append(Migration(int(match.group(1)), match.group(2), path))
+        migrations.sort(key=lambda m: m.version)
+        versions = [m.version for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise ValueError(f"迁移脚本版本号重复: {self.migrations_dir}")
+        return migrations
+
+    def _ensure_history_table(self, conn):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {self.history_table} (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP NOT NULL
+            )
+        """))
+
+    def _record(self, conn, migration: Migration, checksum: Optional[str] = None):
+        conn.execute(text(f"""
+            INSERT INTO {self.history_table} (version, name, checksum, applied_at)
+            VALUES (:version, :name, :checksum, :applied_at)
+        """), {'version': migration.version, 'name': migration.name,
+               'checksum': checksum or migration.checksum, 'applied_at': datetime.datetime.utcnow()})
+
+    def applied(self) -> Dict[int, str]:
+        """已执行的版本及其checksum"""
+        with std_db._engine.begin() as conn:
+            self._ensure_history_table(conn)
+            rows = conn.execute(text(f"SELECT version, checksum FROM {self.history_table}")).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def pending(self) -> List[Migration]:
+        """尚未执行的迁移"""
+        applied = self.applied()
+        for migration in self.discover():
+            if migration.version in applied and applied[migration.version] != migration.checksum:
+                logger.warning(f"迁移脚本在执行后被修改: V{migration.version:03d} {migration.path.name}")
+        return [m for m in self.discover() if m.version not in applied]
+
+    def upgrade(self, target: Optional[int] = None) -> List[int]:
+        """
+        执行未执行的迁移
+        :param target: 最多升级到的版本号，默认全部
+        :return: 本次执行的版本号
+        """
+        done = []
+        for migration in self.pending():
+            if target is not None and migration.version > target:
+                break
+            logger.info(f"执行迁移 V{migration.version:03d} {migration.name} ({self.dialect})")
+            with std_db._engine.begin() as conn:
+                for statement in migration.statements(self.variables):
+                    if self._already_applied(conn, statement):
+                        logger.info(f"字段或索引已是目标状态, 跳过: {statement.splitlines()[0]}")
+                        continue
+                    conn.execute(text(statement))
+                self._record(conn, migration)
+            done.append(migration.version)
+        logger.info(f"迁移完成, 本次执行: {done or '无'}")
+        return done
+
+    def _already_applied(self, conn, statement: str) -> bool:
+        """OceanBase上该DDL要创建的字段/索引是否已存在（或要删除的索引已不存在）；PostgreSQL脚本自带 IF [NOT] EXISTS"""
+        if self.dialect != 'oceanbase':
+            return False
+        match = _ADD_COLUMN.match(statement)
+        if match:
+            return self._exists(conn, 'columns', 'column_name', match.group(1), match.group(2))
+        match = _CREATE_INDEX.match(statement)
+        if match:
+            return self._exists(conn, 'statistics', 'index_name', match.group(2), match.group(1))
+        match = _DROP_INDEX.match(statement)
+        if match:
+            return not self._exists(conn, 'statistics', 'index_name', match.group(2), match.group(1))
+        return False
+
+    @staticmethod
+    def _exists(conn, view: str, name_column: str, table: str, name: str) -> bool:
+        schema, _, table_name = table.rpartition('.')
+        return bool(conn.execute(text(f"""
+            SELECT COUNT(*) FROM information_schema.{view}
+            WHERE table_schema = COALESCE(:schema, DATABASE()) AND table_name = :table_name AND {name_column} = :name
+        """), {'schema': schema or None, 'table_name': table_name, 'name': name}).scalar())
+
+    def baseline(self, version: int) -> List[int]:
+        """把不高于version的迁移标记为已执行但不运行（用于已有库接入迁移）"""
+        done = []
+        with std_db._engine.begin() as conn:
+            for migration in self.pending():
+                if migration.version > version:
+                    break
+                self._record(conn, migration)
+                done.append(migration.version)
+        logger.info(f"已标记为已执行: {done or '无'}")
+        return done
+
+    def status(self) -> List[dict]:
+        """每个迁移脚本的执行状态"""
+        applied = self.applied()
+        return [{'version': m.version, 'name': m.name, 'applied': m.version in applied,
+                 'modified': m.version in applied and applied[m.version] != m.checksum}
+                for m in self.discover()]
+
+
+if __name__ == '__main__':
+    # 示例：python src/utils/migrations.py upgrade
+    parser = argparse.ArgumentParser(description='数据库版本化迁移')
+    parser.add_argument('command', choices=['status', 'upgrade', 'baseline'])
+    parser.add_argument('version', nargs='?', type=int, help='upgrade的目标版本 / baseline的版本')
+    args = parser.parse_args()
+
+    runner = MigrationRunner()
+    if args.command == 'upgrade':
+        runner.upgrade(args.version)
+    elif args.command == 'baseline':
+        if args.version is None:
+            parser.error('baseline 需要指定版本号')
+        runner.baseline(args.version)
+    for item in runner.status():
+        flag = '已执行' if item['applied'] else '未执行'
+        if item['modified']:
+            flag += '（脚本已修改）'
+        print(f"V{item['version']:03d} {item['name']}: {flag}")
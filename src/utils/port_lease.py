@@ -0,0 +1,111 @@
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+from loguru import logger
+
+from src.settings.config import settings
+
+
+def _os_assigned_port() -> int:
+    """绑定0端口，让操作系统分配一个当前空闲的端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PortLeaseRegistry:
+    """
+    跨进程的调试端口租约
+    - 端口由操作系统分配（bind 0），毫秒级返回，无需随机重试和休眠
+    - 每个租约是租约目录下的一个 <port>.lease 文件，用 O_EXCL 原子创建，
+      同一台机器上的所有worker进程共享，保证同一端口不会被重复分配
+    - 持有进程已退出或超过TTL的租约视为失效，会被自动清理
+    """
+
+    def __init__(self, lease_dir: Optional[str] = None, ttl: Optional[int] = None):
+        self.lease_dir = Path(lease_dir or settings.CHROMIUM_PORT_LEASE_DIR or
+                              os.path.join(tempfile.gettempdir(), 'chromium_port_leases'))
+        self.ttl = ttl or settings.CHROMIUM_PORT_LEASE_TTL
+        self._lock = Lock()
+        self.lease_dir.mkdir(parents=True, exist_ok=True)
+
+    def _lease_path(self, port: int) -> Path:
+        return self.lease_dir / f"{port}.lease"
+
+    def _is_stale(self, path: Path) -> bool:
+        """租约持有进程已不存在，或租约超过TTL"""
+        try:
+            pid = int(path.read_text().strip() or 0)
+            age = time.time() - path.stat().st_mtime
+        except (FileNotFoundError, ValueError):
+            return True
+        return not _pid_alive(pid) or age > self.ttl
+
+    def acquire(self, max_attempts: int = 20) -> int:
+        """申请一个保证空闲的端口并登记租约"""
+        with self._lock:
+            for _ in range(max_attempts):
+                port = _os_assigned_port()
+                path = self._lease_path(port)
+                if path.exists() and self._is_stale(path):
+                    path.unlink(missing_ok=True)
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                except FileExistsError:
+                    # 端口已被其他进程租用（浏览器尚未完成绑定），换一个
+                    continue
+                with os.fdopen(fd, 'w') as f:
+                    f.write(str(os.getpid()))
+                logger.info(f"端口租约已分配: {port}, pid: {os.getpid()}")
+                return port
+        raise RuntimeError(f"{max_attempts}次尝试后仍未获取到可用端口")
+
+    def release(self, port: int):
+        """释放端口租约（仅释放本进程持有的租约）"""
+        path = self._lease_path(port)
+        try:
+            if int(path.read_text().strip() or 0) == os.getpid():
+                path.unlink(missing_ok=True)
+                logger.info(f"端口租约已释放: {port}")
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def cleanup_stale(self) -> int:
+        """清理所有失效租约，返回清理数量"""
+        removed = 0
+        for path in self.lease_dir.glob("*.lease"):
+            if self._is_stale(path):
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"清理失效端口租约 {removed} 个")
+        return removed
+
+
+_registry = None
+_registry_lock = Lock()
+
+
+def get_port_registry() -> PortLeaseRegistry:
+    """进程内共享的租约登记器"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PortLeaseRegistry()
+    return _registry
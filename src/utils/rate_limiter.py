@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Dict, Mapping, Optional
+
+import redis
+from loguru import logger
+
+from src.settings.config import settings
+from src.utils.redis_tools import get_redis
+
+# 令牌桶：按时间补充令牌，速率在限流后减半，之后随时间线性恢复到配置速率
+# 返回需要等待的秒数（字符串，避免Redis把Lua小数截断为整数），0表示已拿到令牌
+_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local max_rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local recover_seconds = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local h = redis.call('HMGET', key, 'tokens', 'ts', 'rate', 'blocked_until')
+local rate = tonumber(h[3]) or max_rate
+local tokens = tonumber(h[1]) or burst
+local ts = tonumber(h[2]) or now
+local blocked_until = tonumber(h[4]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+
+local elapsed = math.max(0, now - ts)
+rate = math.min(max_rate, rate + elapsed * max_rate / recover_seconds)
+tokens = math.min(burst, tokens + elapsed * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+redis.call('EXPIRE', key, ttl)
+return tostring(wait)
+"""
+
+# 收到429/Retry-After：速率减半（不低于min_rate），清空令牌并在retry_after秒内禁止请求
+_PENALIZE_SCRIPT = """
+local key = KEYS[1]
+local max_rate = tonumber(ARGV[1])
+local min_rate = tonumber(ARGV[2])
+local retry_after = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local rate = tonumber(redis.call('HGET', key, 'rate')) or max_rate
+rate = math.max(min_rate, rate / 2)
+local blocked_until = math.max(tonumber(redis.call('HGET', key, 'blocked_until')) or 0, now + retry_after)
+redis.call('HSET', key, 'tokens', '0', 'ts', tostring(now), 'rate', tostring(rate),
+           'blocked_until', tostring(blocked_until))
+redis.call('EXPIRE', key, ttl)
+return tostring(rate)
+"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（秒数或HTTP日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def credential_key(prefix: str, credential: str) -> str:
+    """按API凭证限流时使用的key，不在Redis中保存凭证明文"""
+    return f"{prefix}:{hashlib.sha1((credential or '').encode()).hexdigest()[:12]}"
+
+
+class RateLimiter:
+    """
+    分布式令牌桶限流器（Redis + Lua，所有worker共享）
+    - 按域名或API凭证分桶，默认速率 RATE_LIMIT_DEFAULT_RPS，突发容量 RATE_LIMIT_BURST，
+      单独的速率通过 RATE_LIMIT_OVERRIDES 配置，例如 "mp.weixin.qq.com=0.2,llm=5"
+    - 调用方在每次请求前 acquire()，拿不到令牌时只等待到下一个令牌可用，不做固定时长休眠
+    - 请求返回429或带Retry-After时调用 observe()/penalize()：速率减半并按Retry-After暂停该桶，
+      之后在 RATE_LIMIT_RECOVER_SECONDS 秒内线性恢复到配置速率
+    - Redis不可用时不限流
+    """
+
+    def __init__(self, key_prefix: str = "crawler:ratelimit:"):
+        self.key_prefix = key_prefix
+        self.default_rate = settings.RATE_LIMIT_DEFAULT_RPS
+        self.burst = settings.RATE_LIMIT_BURST
+        self.recover_seconds = settings.RATE_LIMIT_RECOVER_SECONDS
+        self.default_penalty = settings.RATE_LIMIT_PENALTY_SECONDS
+        self.ttl = 86400
+        self.overrides = self._parse_overrides(settings.RATE_LIMIT_OVERRIDES)
+        self._client = get_redis()
+        self._acquire_script = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._penalize_script = self._client.register_script(_PENALIZE_SCRIPT)
+
+    @staticmethod
+    def _parse_overrides(raw: str) -> Dict[str, float]:
+        overrides = {}
+        for item in (raw or '').split(','):
+            if '=' not in item:
+                continue
+            name, rate = item.rsplit('=', 1)
+            try:
+                rate = float(rate)
+            except ValueError:
+                rate = None
+            # 速率为0或负数时令牌永远补不上，acquire()的等待时间为无穷大
+            if rate is None or not rate > 0:
+                logger.warning(f"忽略无效的限流配置: {item}")
+                continue
+            overrides[name.strip()] = rate
+        return overrides
+
+    def rate_for(self, key: str) -> float:
+        """桶的配置速率，按 key 或 key 的前缀（冒号之前的部分）匹配"""
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.overrides.get(key.split(':', 1)[0], self.default_rate)
+
+    def try_acquire(self, key: str) -> float:
+        """尝试拿一个令牌，返回还需等待的秒数（0表示已拿到）"""
+        rate = self.rate_for(key)
+        try:
+            return float(self._acquire_script(keys=[self.key_prefix + key],
+                                              args=[rate, max(1, self.burst), self.recover_seconds, self.ttl]))
+        except redis.RedisError as e:
+            logger.warning(f"限流器不可用, 不限流: {key}, {str(e)}")
+            return 0.0
+
+    def acquire(self, key: str, timeout: Optional[float] = None):
+        """阻塞直到拿到令牌，超过timeout抛出TimeoutError"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(key)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError(f"等待限流令牌超时: {key}")
+            time.sleep(wait)
+
+    async def acquire_async(self, key: str, timeout: Optional[float] = None):
+        """acquire的协程版本，等待期间不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            wait = await loop.run_in_executor(None, self.try_acquire, key)
+            if wait <= 0:
+                return
+            if deadline is not None and loop.time() + wait > deadline:
+                raise TimeoutError(f"等待限流令牌超时: {key}")
+            await asyncio.sleep(wait)
+
+    def penalize(self, key: str, retry_after: Optional[float] = None):
+        """被限流后降速，并在retry_after秒内暂停该桶"""
+        retry_after = self.default_penalty if retry_after is None else retry_after
+        try:
+            rate = float(self._penalize_script(keys=[self.key_prefix + key],
+                                               args=[self.rate_for(key), self.rate_for(key) / 32, retry_after, self.ttl]))
+            logger.warning(f"触发限流: {key}, 暂停 {retry_after:.1f} 秒, 速率降为 {rate:.3f}/秒")
+        except redis.RedisError as e:
+            logger.warning(f"限流器不可用, 无法降速: {key}, {str(e)}")
+
+    def observe(self, key: str, status: int, headers: Optional[Mapping[str, str]] = None) -> bool:
+        """根据响应状态码和Retry-After调整速率，返回是否被限流"""
+        retry_after = parse_retry_after((headers or {}).get('Retry-After'))
+        if status == 429 or (status == 503 and retry_after is not None):
+            self.penalize(key, retry_after)
+            return True
+        return False
+
+
+_limiter = None
+_limiter_lock = Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """进程内共享的限流器"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,28 @@
+import os
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from src.settings.config import settings
+
+_clients: Dict[Tuple[int, str], redis.Redis] = {}
+_clients_lock = Lock()
+
+
+def get_redis(url: Optional[str] = None) -> redis.Redis:
+    """
+    爬虫共享状态使用的Redis客户端（抓取策略、去重索引等）
+    - 地址默认取 CRAWLER_REDIS_URL，为空时使用 CELERY_RESULT_BACKEND
+    - 按进程缓存，fork后的子进程会重新建立连接池
+    """
+    url = url or settings.CRAWLER_REDIS_URL or settings.CELERY_RESULT_BACKEND
+    key = (os.getpid(), url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+                _clients[key] = client
+    return client
@@ -0,0 +1,112 @@
+import time
+from typing import Iterable, List
+
+import redis
+from loguru import logger
+from sqlalchemy import text
+
+from src.settings.config import settings
+from src.utils.db_tools import std_db
+from src.utils.redis_tools import get_redis
+
+
+class SeenIndex:
+    """
+    已入库文章索引（Redis set），抓取详情页之前先过滤掉已经入库的文章
+    - urls 集合记录 detail_url，列表页解析出链接后立即过滤，只抓取新文章
+    - ids 集合记录 article_id，入库前过滤，省去逐条 SELECT 判重
+    - 定时任务 rebuild_seen_index_task 每 SEEN_INDEX_REBUILD_INTERVAL 秒从数据表全量补齐一次，
+      覆盖其他途径写入的数据；抓取路径只查Redis，不做全表扫描；
+      补齐只增不删，被删除的高风险文章仍视为已见，不会被反复抓取
+    - Redis不可用时不过滤，由入库时的判重兜底
+    """
+
+    def __init__(self, table_name: str = None, key_prefix: str = "crawler:seen:"):
+        self.table_name = table_name or settings.CRAWL_TABLE_NAME
+        self.url_key = f"{key_prefix}{self.table_name}:urls"
+        self.id_key = f"{key_prefix}{self.table_name}:ids"
+        self.rebuilt_key = f"{key_prefix}{self.table_name}:rebuilt_at"
+        self.rebuild_interval = settings.SEEN_INDEX_REBUILD_INTERVAL
+        self.ttl = settings.SEEN_INDEX_TTL
+        self._client = get_redis()
+
+    def _members(self, key: str, values: List[str]) -> List[bool]:
+        if not values:
+            return []
+        return [bool(flag) for flag in self._client.smismember(key, values)]
+
+    def refresh(self) -> int:
+        """
+        定时补齐索引，多个worker同时触发时只有一个执行
+        标记的过期时间取重建间隔的一半，定时触发略有提前时不会跳过一轮
+        :return: 读取的行数，本轮由其他worker执行、Redis不可用或补齐失败时返回0
+        """
+        try:
+            if not self._client.set(self.rebuilt_key, int(time.time()), nx=True,
+                                    ex=max(1, self.rebuild_interval // 2)):
+                return 0
+        except redis.RedisError as e:
+            logger.warning(f"已见文章索引检查失败: {str(e)}")
+            return 0
+        try:
+            return self.rebuild()
+        except Exception as e:
+            logger.warning(f"已见文章索引补齐失败, 下次重试: {str(e)}")
+            try:
+                self._client.delete(self.rebuilt_key)
+            except redis.RedisError as e:
+                logger.warning(f"已见文章索引补齐标记清除失败: {str(e)}")
+            return 0
+
+    def rebuild(self, batch_size: int = 5000) -> int:
+        """从数据表补齐索引，返回读取的行数"""
+        count = 0
+        with std_db.read_session() as session:
+            # 服务端游标分批读取，不把整张表的结果一次性缓冲到worker内存
+            result = session.execute(text(f"SELECT detail_url, article_id FROM {self.table_name}"),
+                                     execution_options={"stream_results": True, "yield_per": batch_size})
+            for rows in result.partitions():
+                self._add([row[0] for row in rows], [row[1] for row in rows])
+                count += len(rows)
+        logger.info(f"已见文章索引补齐完成: {self.table_name}, {count} 行")
+        return count
+
+    def _add(self, urls: Iterable[str], article_ids: Iterable[str]):
+        urls = [u for u in urls if u]
+        article_ids = [i for i in article_ids if i]
+        pipe = self._client.pipeline(transaction=False)
+        if urls:
+            pipe.sadd(self.url_key, *urls)
+        if article_ids:
+            pipe.sadd(self.id_key, *article_ids)
+        pipe.expire(self.url_key, self.ttl)
+        pipe.expire(self.id_key, self.ttl)
+        pipe.execute()
+
+    def add(self, urls: Iterable[str] = (), article_ids: Iterable[str] = ()):
+        """登记已入库的文章"""
+        try:
+            self._add(urls, article_ids)
+        except redis.RedisError as e:
+            logger.warning(f"已见文章索引写入失败: {str(e)}")
+
+    def filter_new_urls(self, urls: Iterable[str]) -> List[str]:
+        """过滤掉已入库的详情页URL，保持原有顺序"""
+        urls = list(dict.fromkeys(urls))
+        try:
+            seen = self._members(self.url_key, urls)
+        except redis.RedisError as e:
+            logger.warning(f"已见文章索引查询失败, 不做过滤: {str(e)}")
+            return urls
+        new_urls = [u for u, s in zip(urls, seen) if not s]
+        logger.info(f"已见文章索引过滤: 共 {len(urls)} 个链接, 新链接 {len(new_urls)} 个")
+        return new_urls
+
+    def filter_new_items(self, items: List[dict]) -> List[dict]:
+        """过滤掉article_id已入库的数据"""
+        try:
+            seen = self._members(self.id_key, [item['article_id'] for item in items])
+        except redis.RedisError as e:
+            logger.warning(f"已见文章索引查询失败, 不做过滤: {str(e)}")
+            return items
+        return [item for item, s in zip(items, seen) if not s]
@@ -0,0 +1,89 @@
+import datetime
+from dataclasses import dataclass
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from lxml import etree
+
+from src.utils.extractor import ArticleExtractor, ArticleRecord, compile_xpath
+
+DEFAULT_IMG_URL = 'https://ai-doc.data.myvessel.cn/news/%E8%88%AA%E8%BF%90%E5%BF%AB%E8%AE%AF%E5%A4%B4%E5%9B%BE.jpg?OSSAccessKeyId=LTAI5t7nfdMfD7YeTFpAENJ4&Expires=2725518616&Signature=Tw08oPC0RL%2FKweHU1Q1NlJZhZHA%3D'
+
+
+@dataclass(frozen=True)
+class SiteSpec:
+    """
+    单个采集站点的声明式配置，新增站点只需在 src/settings/site_specs.py 中添加一项
+    :param name: 站点名，同时作为article_id前缀
+    :param listing_urls: 列表页URL
+    :param link_xpath: 列表页中文章链接的XPath（相对链接按列表页URL补全）
+    :param title_xpath / content_xpath / date_xpath / img_xpath: 详情页字段XPath
+    :param date_format: 详情页日期的strptime格式
+    :param utc_offset: 详情页日期所在时区（相对UTC的小时数）
+    :param language: 原文语言，zh写入 *_cn 字段，en写入原文字段，翻译任务据此补齐另一种语言
+    :param class_level_1 / class_level_2: 分类标签
+    :param max_articles: 每个列表页最多处理的文章数（按列表顺序取最新的）
+    :param batch_size: 每个详情页子任务抓取的文章数
+    """
+    name: str
+    listing_urls: Tuple[str, ...]
+    link_xpath: str
+    title_xpath: str
+    content_xpath: str
+    date_xpath: str
+    date_format: str
+    img_xpath: Optional[str] = None
+    utc_offset: int = 8
+    language: str = "zh"
+    class_level_1: str = ""
+    class_level_2: str = ""
+    max_articles: int = 15
+    batch_size: int = 5
+    default_img_url: str = DEFAULT_IMG_URL
+    enabled: bool = True
+    expected_xpaths: Tuple[str, ...] = ()
+
+    @cached_property
+    def extractor(self) -> ArticleExtractor:
+        """编译后的字段抽取器（每个进程每个站点只编译一次）"""
+        return ArticleExtractor(title=self.title_xpath, content=self.content_xpath, date=self.date_xpath,
+                                img=self.img_xpath, links=self.link_xpath)
+
+    @cached_property
+    def detail_expected_xpaths(self) -> List[etree.XPath]:
+        """判断详情页是否抓取完整的XPath（已编译），默认要求标题和正文都存在"""
+        if self.expected_xpaths:
+            return [compile_xpath(x) for x in self.expected_xpaths]
+        return [self.extractor.title, self.extractor.content]
+
+    def is_complete(self, record: ArticleRecord, tree) -> bool:
+        """
+        根据已抽取的字段判断详情页是否抓取完整：标题和正文都不为空；
+        配置了 expected_xpaths 时还需全部命中
+        """
+        if not record.title or not record.contents:
+            return False
+        return not self.expected_xpaths or all(xpath(tree) for xpath in self.detail_expected_xpaths)
+
+    def convert_date(self, value: str) -> Tuple[str, str]:
+        """把页面日期转换为 (YYYY-MM-DD, 带时区的时间字符串)"""
+        dt = datetime.datetime.strptime(value.strip(), self.date_format)
+        dt = dt.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=self.utc_offset)))
+        return dt.strftime("%Y-%m-%d"), dt.strftime("%Y-%m-%d %H:%M:%S%z")
+
+    def build_row(self, record: ArticleRecord) -> dict:
+        """把抽取结果转换为入库字段，缺少标题或日期时抛出ValueError"""
+        if record.title is None or record.date is None:
+            raise ValueError(f"详情页缺少标题或日期: {record.url}")
+        date_str, datetime_str = self.convert_date(record.date)
+        suffix = "_cn" if self.language == "zh" else ""
+        return {
+            "img_parse_url": record.img_url or self.default_img_url,
+            "detail_url": record.url,
+            f"detail_title{suffix}": record.title,
+            "detail_date": date_str,
+            "detail_timestamptz": datetime_str,
+            f"detail_contents{suffix}": record.contents,
+            "class_level_1": self.class_level_1,
+            "class_level_2": self.class_level_2,
+        }
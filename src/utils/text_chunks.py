@@ -0,0 +1,95 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+_PARAGRAPH = re.compile(r"\n\s*\n|\n")
+# 中文句末标点直接断句；英文句末标点后须有空白，避免把小数切开；句末空白留在前一句
+_SENTENCE = re.compile(r".+?(?:[。！？；]+|[.!?;]+(?:\s+|$))|.+", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：汉字及全角标点按1个，其余字符按4个字符1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class Chunk:
+    """待翻译的一段正文"""
+    text: str
+    # 与下一段之间在原文中的分隔：段落边界为换行，段落内按句子切开时为空
+    separator: str = "\n"
+
+
+def _split_long(text: str, max_tokens: int) -> List[str]:
+    """超长段落先按句子切分，单句仍超长时按字符硬切"""
+    pieces = []
+    for sentence in _SENTENCE.findall(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        step = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+        pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def split_chunks(text: str, max_tokens: int) -> List[Chunk]:
+    """
+    按段落边界把正文切成不超过max_tokens的若干段，超长段落在句子边界切开
+    各段按顺序拼接（含separator）即为原文去掉多余空行后的内容
+    """
+    chunks: List[Chunk] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def emit(separator: str):
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(Chunk("\n".join(current), separator))
+            current, current_tokens = [], 0
+
+    for paragraph in (p.strip() for p in _PARAGRAPH.split(text or "")):
+        if not paragraph:
+            continue
+        tokens = estimate_tokens(paragraph)
+        if tokens > max_tokens:
+            emit("\n")
+            pieces = _split_long(paragraph, max_tokens)
+            sentence_chunk, sentence_tokens = "", 0
+            for piece in pieces:
+                piece_tokens = estimate_tokens(piece)
+                if sentence_chunk and sentence_tokens + piece_tokens > max_tokens:
+                    chunks.append(Chunk(sentence_chunk, ""))
+                    sentence_chunk, sentence_tokens = "", 0
+                sentence_chunk += piece
+                sentence_tokens += piece_tokens
+            if sentence_chunk:
+                chunks.append(Chunk(sentence_chunk, "\n"))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            emit("\n")
+        current.append(paragraph)
+        current_tokens += tokens
+    emit("\n")
+    return chunks
+
+
+def tail(text: str, max_chars: int) -> str:
+    """取上一段末尾不超过max_chars的完整句子，作为翻译下一段时的上下文"""
+    if max_chars <= 0 or not text:
+        return ""
+    window = text[-max_chars:]
+    sentences = _SENTENCE.findall(window)
+    return "".join(sentences[1:]) if len(sentences) > 1 and len(window) < len(text) else window
+
+
+def join_chunks(chunks: List[Chunk], translations: List[str], target_lang: str) -> str:
+    """按原文顺序拼接各段译文，段落内切开的位置英文补空格、中文直接相连"""
+    parts = []
+    for chunk, translation in zip(chunks, translations):
+        parts.append(translation.strip())
+        parts.append(chunk.separator or (" " if target_lang == "en" else ""))
+    return "".join(parts[:-1])
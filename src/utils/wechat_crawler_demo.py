@@ -3,15 +3,20 @@
 import sys
 import os
 import time
-import random
 import re
 from datetime import datetime
 from bs4 import BeautifulSoup
 import requests
 import argparse
+import pathlib
 from fake_useragent import UserAgent
 import dotenv
 
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent.parent.resolve()
+sys.path.append(str(PROJECT_ROOT))
+from src.utils.fetch_strategy import get_domain
+from src.utils.rate_limiter import credential_key, get_rate_limiter
+
 # 加载环境变量
 dotenv.load_dotenv()
 
@@ -19,6 +24,9 @@ dotenv.load_dotenv()
 TOKEN = os.getenv('WECHAT_TOKEN')
 COOKIE = os.getenv('WECHAT_COOKIE')
 
+# 同一个token的所有请求共用一个限流桶（速率通过 RATE_LIMIT_OVERRIDES 的 mp.weixin.qq.com 配置）
+WECHAT_LIMITER_KEY = credential_key('mp.weixin.qq.com', TOKEN)
+
 # 初始化UserAgent对象
 user_agent = UserAgent()
 
@@ -105,13 +113,14 @@ def get_articles_list(fakeid, account_name, max_articles=10):
         }
 
         try:
-            time.sleep(random.uniform(3, 5))
+            get_rate_limiter().acquire(WECHAT_LIMITER_KEY)
             response = requests.get(url, headers=get_random_headers(), params=params)
             data = response.json()
             
             if 'base_resp' in data and data['base_resp'].get('error_msg'):
                 print(data['base_resp']['error_msg'])
-                time.sleep(60)
+                # 触发频率限制，降速并暂停该token的所有请求
+                get_rate_limiter().penalize(WECHAT_LIMITER_KEY)
                 continue
                 
             if 'app_msg_list' not in data or not data['app_msg_list']:
@@ -421,6 +430,8 @@ def main():
     # 获取并保存每篇文章
     for i, article in enumerate(articles, 1):
         print(f"获取第 {i}/{len(articles)} 篇: {article['title']}")
+        # 按文章域名限流，避免请求过快
+        get_rate_limiter().acquire(get_domain(article['link']))
         
         if args.structured:
             # 获取结构化数据
@@ -434,10 +445,6 @@ def main():
             article['content'] = get_article_content(article['link'])
             if save_single_article(article, account_name):
                 saved_count += 1
-        
-        # 添加延迟，避免请求过快
-        if i < len(articles):
-            time.sleep(random.uniform(2, 4))
     
     if args.structured:
         # 返回结构化数据